@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+building and saving the [ANNOTATION] table
+
+per-trial results are gathered column by column (plain lists) and the frame is
+built once per subject. besides the csv, the table can be written as parquet
+or feather (arrow ipc) so group analyses can memory-map annotations of
+hundreds of subjects instead of re-parsing csv text; both need pyarrow
+"""
+import pandas as pd
+
+ANNOTATION_COLUMNS = ['trialN', 'index', 'item', 'category', 'intrusion', 'confidence', 'onset', 'offset']
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+
+def new_columns(col_order=ANNOTATION_COLUMNS):
+    """
+    empty column store: dict of column name -> list
+    """
+    return dict((c, []) for c in col_order)
+
+
+def add_trial(columns, **trial_columns):
+    """
+    Help: add_trial(columns, trialN=1, index=[1, 2], item=['Tom Hanks', 'acorn'], ...)
+    extends every column with the values of one trial; scalar values
+    (e.g. trialN) are repeated to the length of the trial
+    """
+    n = None
+    for name in trial_columns:
+        value = trial_columns[name]
+        if not isinstance(value, (str, int, float)) and value is not None:
+            n = len(value)
+            break
+    if n is None:
+        n = 1
+    for name in columns:
+        value = trial_columns.get(name)
+        if isinstance(value, (str, int, float)) or value is None:
+            columns[name].extend([value] * n)
+        else:
+            columns[name].extend(list(value))
+
+
+def annotation_frame(columns, col_order=ANNOTATION_COLUMNS):
+    return pd.DataFrame(columns, columns=col_order)
+
+
+def write_annotation(df, stem, formats=('csv',)):
+    """
+    Help: write_annotation(df, 'subj[ANNOTATION]', formats=('csv', 'parquet'))
+    writes stem + extension for every requested format, returns the written paths
+    """
+    paths = []
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError('unknown annotation format: ' + str(fmt))
+        path = stem + FORMATS[fmt]
+        if fmt == 'csv':
+            df.to_csv(path, sep=',', index=False)
+        else:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError(fmt + ' output needs pyarrow (pip install pyarrow)')
+            if fmt == 'parquet':
+                df.to_parquet(path, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(path)
+        paths.append(path)
+    return paths
+
+
+def read_annotation(path):
+    """
+    reads an annotation written by write_annotation; feather files are memory-mapped
+    """
+    if path.endswith('.feather'):
+        import pyarrow.feather as feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, memory_map=True)
+    return pd.read_csv(path)
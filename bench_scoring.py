@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark of the recall scoring path on synthetic transcripts
+
+synthetic recognizer responses are generated from the real stim pool
+(cel_names.txt / loc_names.txt / obj_names.txt): every trial studies 27 pool
+names and 'recalls' a random number of them, with multi-word names, partial
+names (one word of a name), repeats, intrusions from other lists, fillers
+('um', 'uh') and a fraction of misheard words (one sound-alike or random
+letter edit, 'hanks' -> 'hanx'), so the fuzzy matcher is part of the run,
+split over several results with word timing like google's
+
+decode_all_wav.score_trial itself is run on 1, 100 and 10,000 trials, with
+its steps timed through its stage hook (PipelineStats.stage): parse
+(unpickle) -> timing (timing_arrays) -> match (score_tokens) -> category ->
+annotate (annotation table). results can be saved as a baseline json; later
+runs are compared against it and the script exits with status 1 if a stage
+got slower than --tolerance times the baseline
+
+usage:
+python bench_scoring.py --stim-dir ../stimuli --save-baseline
+python bench_scoring.py --stim-dir ../stimuli            # compare to the baseline
+"""
+import json
+import os
+import pickle
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from annotation_io import new_columns, add_trial, annotation_frame
+from decode_all_wav import score_trial
+from decode_state import plain_rows
+from pipeline_stats import PipelineStats
+from stim_table import get_pool
+
+SIZES = [1, 100, 10000]
+STAGES = ['parse', 'timing', 'match', 'category', 'annotate']
+FILLERS = ['um', 'uh', 'okay', 'hmm']
+# spellings a recognizer swaps for the same sound
+SOUND_ALIKE = [('ks', 'x'), ('ph', 'f'), ('ck', 'k'), ('c', 'k'), ('ee', 'ea'), ('er', 'a'), ('y', 'ie'),
+               ('ll', 'l'), ('s', 'z'), ('tt', 't')]
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+BASELINE_FILE = 'bench_baseline.json'
+
+
+def duration(seconds):
+    whole = int(seconds)
+    return {'seconds': whole, 'nanos': int(round((seconds - whole) * 1e9))}
+
+
+def misheard(word, rng):
+    """
+    word with one sound-alike spelling swapped, or else one random letter
+    substituted, dropped or inserted
+    """
+    swaps = [(a, b) for a, b in SOUND_ALIKE if a in word]
+    if swaps:
+        a, b = rng.choice(swaps)
+        k = rng.choice([i for i in range(len(word)) if word.startswith(a, i)])
+        return word[:k] + b + word[k + len(a):]
+    k = rng.randrange(len(word))
+    edit = rng.choice(['sub', 'del', 'ins'])
+    if edit == 'sub':
+        return word[:k] + rng.choice(LETTERS) + word[k + 1:]
+    if edit == 'del':
+        return word[:k] + word[k + 1:]
+    return word[:k] + rng.choice(LETTERS) + word[k:]
+
+
+def synthetic_trial(table, rng, list_len=27, max_recalls=20, p_repeat=0.1, p_intrusion=0.1,
+                    p_partial=0.15, p_filler=0.1, p_misheard=0.15, words_per_result=6):
+    """
+    (response dict, trial_stim) of one synthetic trial drawn from the stim pool
+    """
+    pool = table.total_list
+    trial_stim = rng.sample(pool, min(list_len, len(pool)))
+    others = [n for n in pool if n not in set(trial_stim)] or pool
+    spoken = []
+    said = []
+    for _ in range(rng.randint(0, max_recalls)):
+        r = rng.random()
+        if r < p_repeat and said:
+            name = rng.choice(said)
+        elif r < p_repeat + p_intrusion:
+            name = rng.choice(others)
+        elif r < p_repeat + p_intrusion + p_filler:
+            name = rng.choice(FILLERS)
+        else:
+            name = rng.choice(trial_stim)
+            said.append(name)
+        tokens = name.split()
+        if len(tokens) > 1 and rng.random() < p_partial:
+            tokens = [rng.choice(tokens)]
+        # words long enough for the fuzzy matcher to consider them
+        tokens = [misheard(w.lower(), rng) if len(w) >= 4 and rng.random() < p_misheard else w for w in tokens]
+        spoken.extend(tokens)
+
+    t = rng.uniform(0.5, 3.0)
+    words = []
+    for w in spoken:
+        length = rng.uniform(0.2, 0.6)
+        words.append({'word': w, 'start_time': duration(t), 'end_time': duration(t + length)})
+        t = t + length + rng.uniform(0.05, 4.0)
+    results = []
+    for k in range(0, len(words), words_per_result):
+        chunk = words[k:k + words_per_result]
+        results.append({'alternatives': [{'transcript': ' '.join(w['word'] for w in chunk),
+                                          'confidence': 0.9, 'words': chunk}]})
+    return {'results': results}, trial_stim
+
+
+def synthetic_trials(table, n, seed=0, **kwargs):
+    """
+    n synthetic trials as (pickled response bytes, trial_stim), like the .p files decode reads
+    """
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(n):
+        response, trial_stim = synthetic_trial(table, rng, **kwargs)
+        trials.append((pickle.dumps(response), trial_stim))
+    return trials
+
+
+def run_scoring(trials, table):
+    """
+    scores trials with decode_all_wav.score_trial as decode() does,
+    returns {stage: seconds}, the number of recognized words and the annotation frame
+    """
+    stats = PipelineStats()
+    n_words = 0
+    columns = new_columns()
+    for n, (blob, trial_stim) in enumerate(trials):
+        with stats.stage('parse'):
+            objects = [pickle.loads(blob)]
+        words, word_onset, word_offset, rows = score_trial(objects, trial_stim, table, stage=stats.stage)
+        n_words = n_words + len(words)
+        with stats.stage('annotate'):
+            add_trial(columns, trialN=n + 1, **plain_rows(rows))
+    with stats.stage('annotate'):
+        df = annotation_frame(columns)
+    seconds = dict((stage, 0.0) for stage in STAGES)
+    for name, _, sec in stats.records:
+        seconds[name] += sec
+    return seconds, n_words, df
+
+
+def benchmark(stim_dir, sizes=SIZES, repeat=3, seed=0, p_misheard=0.15):
+    """
+    Help: results = benchmark('../stimuli')
+    best-of-repeat seconds per stage for every trial count in sizes
+    """
+    table = get_pool(stim_dir).table
+    results = {}
+    for n in sizes:
+        trials = synthetic_trials(table, n, seed=seed, p_misheard=p_misheard)
+        best = None
+        for _ in range(repeat):
+            seconds, n_words, df = run_scoring(trials, table)
+            seconds['total'] = sum(seconds[s] for s in STAGES)
+            if best is None or seconds['total'] < best['total']:
+                best = seconds
+        best['trials_per_sec'] = n / best['total'] if best['total'] > 0 else float('inf')
+        best['n_items'] = int(len(df))
+        best['n_words'] = n_words
+        results[str(n)] = best
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'created': time.time(), 'seed': seed,
+            'p_misheard': p_misheard, 'results': results}
+
+
+def compare(current, baseline, tolerance=1.25, min_seconds=0.005):
+    """
+    list of (size, stage, baseline s, current s, ratio) for every stage slower than tolerance x baseline
+    stages that take less than min_seconds in the baseline are timer noise and not compared
+    """
+    slower = []
+    for size in current['results']:
+        base = baseline.get('results', {}).get(size)
+        if base is None:
+            continue
+        for stage in STAGES + ['total']:
+            if base.get(stage, 0) >= min_seconds:
+                ratio = current['results'][size][stage] / base[stage]
+                if ratio > tolerance:
+                    slower.append((size, stage, base[stage], current['results'][size][stage], ratio))
+    return slower
+
+
+def print_results(current, baseline=None):
+    print('%8s %10s' % ('trials', 'trials/s') + ''.join('%10s' % s for s in STAGES + ['total']))
+    for size in sorted(current['results'], key=int):
+        r = current['results'][size]
+        print('%8s %10.0f' % (size, r['trials_per_sec']) + ''.join('%10.4f' % r[s] for s in STAGES + ['total']))
+        if baseline is not None and size in baseline.get('results', {}):
+            b = baseline['results'][size]
+            print('%8s %10s' % ('', 'x base') +
+                  ''.join('%10.2f' % (r[s] / b[s]) if b.get(s, 0) > 0 else '%10s' % '-'
+                          for s in STAGES + ['total']))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='benchmark the recall scoring path on synthetic transcripts')
+    parser.add_argument('--stim-dir', default='../stimuli')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--misheard', type=float, default=0.15, help='fraction of misheard words (fuzzy matching)')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), BASELINE_FILE))
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='allowed slowdown vs the baseline')
+    args = parser.parse_args()
+
+    current = benchmark(args.stim_dir, sizes=args.sizes, repeat=args.repeat, seed=args.seed, p_misheard=args.misheard)
+    baseline = None
+    if not args.save_baseline and os.path.isfile(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('p_misheard', 0.0) != current['p_misheard']:
+            print('baseline was run with a misheard fraction of ' + str(baseline.get('p_misheard', 0.0)) +
+                  ', timings are not comparable')
+    print_results(current, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print('baseline saved to ' + args.baseline)
+    elif baseline is not None:
+        slower = compare(current, baseline, args.tolerance)
+        for size, stage, base, now, ratio in slower:
+            print('SLOWER: ' + stage + ' at ' + size + ' trials: ' + '%.4f' % base + 's -> ' + '%.4f' % now +
+                  's (x' + '%.2f' % ratio + ')')
+        if slower:
+            sys.exit(1)
+        print('no stage slower than x' + str(args.tolerance) + ' the baseline')
+    else:
+        print('no baseline at ' + args.baseline + ' (run with --save-baseline)')
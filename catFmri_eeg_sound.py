@@ -15,10 +15,14 @@
 
 from __future__ import absolute_import, division, print_function
 import os
-import random
 import pandas as pd
 from builtins import range
 from psychopy import visual, event, gui, core, logging, microphone, sound
+from event_log import EventWriter
+from stim_assets import StimAssets
+from frame_timing import FrameTiming, OnsetLog
+from flip_monitor import FlipMonitor
+from trial_schedule import compile_schedule, validate, save_schedule, flat_items
 
 ##########################################
 #         Experiment Parameters          #
@@ -26,6 +30,13 @@ from psychopy import visual, event, gui, core, logging, microphone, sound
 
 netstation = True
 recording  = True
+ns_sync_every = 5             # seconds between NetStation syncs (events are sent from a background thread)
+live_decode = False           # True: transcribe + score each free recall in the background (needs live_keypath)
+live_keypath = None           # google cloud key json for live_decode (None = default credentials)
+events_formats = ('csv',)     # events file(s): any of 'csv', 'arrow', 'parquet' (arrow/parquet need pyarrow)
+events_fsync = 1              # fsync events every n items (1 = every item, 0 = only at the end)
+asset_budget_mb = 256         # memory for preloaded stim images + sounds (rest is loaded as the list goes)
+schedule_seed = None          # seed of the compiled trial schedule (None = random, saved in <subj>_schedule.json)
 
 #-------------------------------------------------------------------------#
 # vars        | values     | default     | description                    #
@@ -80,16 +91,56 @@ subj_id = gui.data[0]
 # NetStation setup
 if netstation:
     import egi.simple as egi
+    from ns_dispatch import NSDispatcher
     ms_localtime = egi.ms_localtime
     ns = egi.Netstation()
     print("Imported PyNetstation")
 
+# get relative path
+stimDir = os.getcwd() + '/../'  # location of cdcatmr
+
+# read in condition and stimuli data
+fn1 = stimDir + 'stimuli/export_stim/' + subj_id + 'stimuli.csv'
+stim_file = pd.read_csv(fn1, None, engine='python')
+# stim_file = pd.read_csv(fn1,None, engine='python',skiprows=[19,20,21,22,23,24,25,26,27])
+
+# read in sound data
+soundDir = stimDir + 'stimuli/stimSound/'
+
+# read in math distraction data
+fn2 = stimDir + 'stimuli/math_dist.csv'
+math_csv = pd.read_csv(fn2, None, engine='python')
+
+# compile the whole session (isi, math problems and answers, stim paths, frame counts, NS codes)
+# before the window opens; the loop below only reads it (see trial_schedule)
+schedule_params = {'n_trials': n_trials, 'n_trains': n_trains, 'n_per_train': n_per_train,
+                   'dur_stim': dur_stim, 'dur_FR': dur_FR, 'dur_digit': dur_digit, 'dur_blank': dur_blank,
+                   'dur_question': dur_question, 'dur_finalmath': dur_finalmath,
+                   'isi_low': isi_low, 'isi_high': isi_high, 'isi_mean': isi_mean, 'first_item': i}
+def check_schedule(schedule):
+    schedule_problems = validate(schedule)
+    if schedule_problems:
+        print('SCHEDULE PROBLEMS!!! QUITTING...')
+        for problem in schedule_problems:
+            print(problem)
+        core.quit()
+
+
+schedule = compile_schedule(stim_file, math_csv, schedule_params, seed=schedule_seed, sound_dir=soundDir, subj=subj_id)
+check_schedule(schedule)
+
 # create window
 win = visual.Window([800, 800], fullscr=fullscreen, monitor='testMonitor2')
 # win = visual.Window([800,800], fullscr=False, winType='pygame', monitor='0')
 
-# get relative path
-stimDir = os.getcwd() + '/../'  # location of cdcatmr
+# durations below are converted to frames of the measured refresh rate (60 Hz if it can't be measured)
+timing = FrameTiming(win.getActualFrameRate())
+print('frame rate: ' + str(timing.rate) + ' Hz')
+if timing.rate != schedule['frame_rate']:
+    # same seed, so only the frame counts change
+    schedule = compile_schedule(stim_file, math_csv, schedule_params, frame_rate=timing.rate, seed=schedule['seed'],
+                                sound_dir=soundDir, subj=subj_id)
+    check_schedule(schedule)  # e.g. empty isi or sound window at a low rate
 
 # get current directory and create data file in /data > events, log, record
 filename = os.path.join(stimDir, 'data/' + subj_id)
@@ -104,22 +155,16 @@ if not os.path.isdir(filename):
     os.makedirs(evtDirName)
     os.makedirs(logDirName)
     os.makedirs(wavDirName)
+save_schedule(schedule, evtDirName + '/' + subj_id + '_schedule')
 
 # enable sound input/output:
 microphone.switchOn()
 mic = microphone.AdvAudioCapture(name=subj_id, saveDir=wavDirName, stereo=False)
 
-# read in condition and stimuli data
-fn1 = stimDir + 'stimuli/export_stim/' + subj_id + 'stimuli.csv'
-stim_file = pd.read_csv(fn1, None, engine='python')
-# stim_file = pd.read_csv(fn1,None, engine='python',skiprows=[19,20,21,22,23,24,25,26,27])
-
-# read in sound data
-soundDir = stimDir + 'stimuli/stimSound/'
-
-# read in math distraction data
-fn2 = stimDir + 'stimuli/math_dist.csv'
-math_csv = pd.read_csv(fn2, None, engine='python')
+# live transcription of free recall (provisional [ANNOTATION-LIVE] per list)
+if live_decode:
+    from live_recall import LiveRecallWorker
+    live = LiveRecallWorker(stimDir + 'stimuli', wavDirName, subj_id, keypath=live_keypath)
 
 # read text files
 genIntroText1="Thank you for participating in this study! We are interested in understanding how people judge and subsequently remember items from different categories. \n\nDuring the course of the study, you will see a list of images on the computer screen. Each image will come from one of three categories: \n\n1) Famous People \n2) Locations \n3) Objects \n\nWhen an image comes up, please press a button to indicate whether you \"like\" or \"dislike\" the person, location, or object. \n\nPress TRUE to indicate \"like\" \nPress FALSE to indicate \"dislike\" \nAt the end of the list, you will asked to recall these images. \n\n       * Press SPACE to continue *"
@@ -148,22 +193,20 @@ prepfrText = "Prepare to recall the list"
 recordingText = "*******"
 endingText = "You are done with the experiment. Thank you!"
 
-# randomize math distractions to iterate
-# (n numbers in problem and correct: incorrect ratio will be random)
-math_file = math_csv.sample(frac=1).reset_index(drop=True)
-math_head = list(math_file)
-
 # read in stimuli variables
-cond = stim_file['cond']
-cat = stim_file['cat']
-stimImg = stim_file['stimImg']
 stimName = stim_file['stimName']
 
 # for pandas dataframe
 col_names = ['type', 'item', 'resp', 'rt', 'trialtime', 'duration', 'runtime', 'isi']
 
-# create pandas dataframe
-events = pd.DataFrame(columns=col_names)
+# intended vs actual (flip) onsets of the scheduled events of every item
+onsets = OnsetLog(win, evtDirName + '/' + subj_id + '_onsets.csv', timing)
+# every win.flip is timed; frames longer than 1.5x the refresh interval are counted per routine and item
+flips = FlipMonitor(win, timing.frame_dur, evtDirName + '/' + subj_id + '_frames.csv',
+                    ['fixation', 'math', 'stim_pres', 'final_math']).install()
+
+# append-only events file (only the new rows are written after each item)
+events = EventWriter(evtDirName + '/' + subj_id + '_events', col_names, formats=events_formats, fsync_every=events_fsync)
 
 # text/visual component properties
 genIntText = visual.TextStim(
@@ -186,11 +229,18 @@ closeShape=False,
 lineColor="white",units='cm'
 )
 
-img = visual.ImageStim(
-win=win,
-image=stimImg[0],
-size = ([stim_width, stim_height]),units='cm'
-)
+def make_image(path):
+    return visual.ImageStim(win=win, image=path, size=([stim_width, stim_height]), units='cm')
+
+
+def make_sound(path):
+    vocal = sound.Sound(path)
+    vocal.setVolume(1)
+    return vocal
+
+
+# stim images + sounds are built ahead of their onset (see stim_assets)
+assets = StimAssets(make_image, make_sound, budget_mb=asset_budget_mb)
 
 stimText = visual.TextStim(
 win=win,
@@ -201,28 +251,12 @@ color="white",units='cm'
 
 mathText = visual.TextStim(
 win=win,
-text=math_file['num1'][0],
+text=schedule['math'][0]['nums'][0],
 color="white",
 )
 
 
 # helper funcs
-def pseudo_randomISI(low, high, k, n_items):
-    """
-    Creates n_items number of isi with range low and high with resulted numbers
-    averaging around mean k
-    """
-    assert k < high
-    rand_isi = [low] * n_items
-    to_add = (k - low) * n_items
-    for _ in range(to_add):
-        i = random.randint(0, n_items-1)
-        while rand_isi[i] == high:
-            i = random.randint(0, n_items-1)
-        rand_isi[i] += 1
-    return rand_isi
-
-
 def if_esc_quit():
     if event.getKeys(keyList=["escape"]):
         win.close()
@@ -234,9 +268,11 @@ def blank_screen(dur_blank):
     instrText.draw()
     win.flip()
     core.wait(dur_blank)
+    flips.pause()
 
 
 practiceTrial = True
+ns_codes = {}  # NetStation codes the schedule has for the current item and list -> frame from the item start
 def send_to_NS(code, trialnum, item, cond, category):
     """
     helper function to send signals with desired event tags, labels, cond for segmentation
@@ -247,18 +283,23 @@ def send_to_NS(code, trialnum, item, cond, category):
     item = s                | item index number (1-27)
     cond = [1, 2, 3]        | fixation, light, heavy distraction
     category = [1, 2, 3]    | 1 = celeb, 2 = location, 3 = objects
+    only codes in the compiled schedule are sent (practice lists have none)
     """
-    if not practiceTrial and netstation:
+    if code not in ns_codes:
+        if not practiceTrial:
+            logging.warning('NetStation code ' + str(code) + ' of trial ' + str(trialnum) + ' is not in the schedule, not sent')
+        return
+    if netstation:
         temp = 't' + str(trialnum)
-        ns.sync()
+        # stamped now, sent by the dispatcher thread (no tcp round trip in the frame loop)
+        ns_out.send(key=temp, label=str(code), table={'item': item, 'cond': cond, 'catg': category})
         logging.data('trial ' + str(trialnum) + ' | ' + str(code) + ' | cond: ' + str(cond) + ' | cat: ' + str(category))
-        ns.send_event(key=temp, label=str(code), timestamp=None, table={'item': item, 'cond': cond, 'catg': category}, pad=False)
 
 
 # mouse cursor visibility
 win.mouseVisible = mouse_visible
 
-math_cnt = 0  # keep track of overall math problems
+math_cnt = 0  # keep track of overall math problems (position in schedule['math'])
 total_event_cnt = 0  # all events over all trials # n.b this might suck
 
 # set up log to keep track of all events across trials
@@ -294,352 +335,385 @@ if netstation:
     if recording:
         ns.StartRecording()
         print("Recording ...")
+    ns_out = NSDispatcher(ns, sync_every=ns_sync_every, clock=ms_localtime)
 
 actualTrial = False
 #########################################
 #           Experiment Code             #
 #########################################
-for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
-    trial_timer.reset()
-    if t <= 2:
-        practiceTrial = True
-        n_items = 6  # practice round is fixed to 6 stim each
-    if t > 2:
-        practiceTrial = False
-        actualTrial = True
-        n_items = n_trains * n_per_train
-    isi_list = pseudo_randomISI(isi_low, isi_high, isi_mean, n_items)
-
-    if cond[i] == 0:  # fixation condition
-        i11 = trial_timer.getTime()
-        instrText.text = text_cond_0
-        instrText.draw()
-        win.logOnFlip('first instrText frame', level=logging.EXP)
-        win.flip()
-        instr_key = event.waitKeys(keyList=['1'], timeStamped=True, clearEvents=True)
-
-        type = list(['instruction'])
-        item = list(['instrText0'])
-        trialtime = list([i11])
-        duration = list([instr_key[0][1]])
-        resp = list(['NaN'])
-        rt = list(['NaN'])
-        runtime = list(['NaN'])
-        isi = list(['NaN'])
-
-    if cond[i] == 1:  # light distraction
-        i21 = trial_timer.getTime()
-        instr1_timer = core.Clock()
-        instrText.text = text_cond_1
-        instrText.draw()
-        win.logOnFlip('first instrText frame', level=logging.EXP)
-        win.flip()
-        instr_key = event.waitKeys(keyList=['2'], timeStamped=instr1_timer, clearEvents=True)
-        if_esc_quit()
+for cur_item in flat_items(schedule):  # every item of the session, list after list (3 practice lists first)
+    trial = schedule['trials'][cur_item['trial']]
+    t = trial['t']
+    s = cur_item['item'] - 1
+
+    if s == 0:  # first item of a list: set up the list and show its instructions
+        trial_timer.reset()
+        practiceTrial = trial['practice']
+        if not practiceTrial:
+            actualTrial = True
+        n_items = trial['n_items']
+        # frame schedule of the list: isi per item, stimulus and math durations
+        isi_list = [x['isi'] for x in trial['items']]
+        isi_frames = [x['isi_frames'] for x in trial['items']]
+        stim_frames = schedule['frames']['stim']
+        digit_frames = schedule['frames']['digit']
+        question_frames = schedule['frames']['question']
+        assets.queue([(x['index'], x['image'], x['sound']) for x in trial['items']])
+
+        if trial['cond'] == 0:  # fixation condition
+            i11 = trial_timer.getTime()
+            instrText.text = text_cond_0
+            instrText.draw()
+            win.logOnFlip('first instrText frame', level=logging.EXP)
+            win.flip()
+            assets.prefetch()  # build this list's images/sounds while the instructions are up
+            instr_key = event.waitKeys(keyList=['1'], timeStamped=True, clearEvents=True)
+            flips.pause()
+
+            type = list(['instruction'])
+            item = list(['instrText0'])
+            trialtime = list([i11])
+            duration = list([instr_key[0][1]])
+            resp = list(['NaN'])
+            rt = list(['NaN'])
+            runtime = list(['NaN'])
+            isi = list(['NaN'])
+
+        if trial['cond'] == 1:  # light distraction
+            i21 = trial_timer.getTime()
+            instr1_timer = core.Clock()
+            instrText.text = text_cond_1
+            instrText.draw()
+            win.logOnFlip('first instrText frame', level=logging.EXP)
+            win.flip()
+            assets.prefetch()  # build this list's images/sounds while the instructions are up
+            instr_key = event.waitKeys(keyList=['2'], timeStamped=instr1_timer, clearEvents=True)
+            flips.pause()
+            if_esc_quit()
 
-        type = list(['instruction'])
-        item = list(['instrText1'])
-        trialtime = list([i21])
-        duration = list([instr_key[0][1]])
-        resp = list(['NaN'])
-        rt = list(['NaN'])
-        runtime = list(['NaN'])
-        isi = list(['NaN'])
+            type = list(['instruction'])
+            item = list(['instrText1'])
+            trialtime = list([i21])
+            duration = list([instr_key[0][1]])
+            resp = list(['NaN'])
+            rt = list(['NaN'])
+            runtime = list(['NaN'])
+            isi = list(['NaN'])
+
+        if trial['cond'] == 2:  # heavy distraction (solve math problems)
+            i31 = trial_timer.getTime()
+            instr2_timer = core.Clock()
+            instrText.text = text_cond_2
+            instrText.draw()
+            win.logOnFlip('first instrText frame', level=logging.EXP)
+            win.flip()
+            assets.prefetch()  # build this list's images/sounds while the instructions are up
+            instr_key = event.waitKeys(keyList=['3'], timeStamped=instr2_timer, clearEvents=True)
+            flips.pause()
+            if_esc_quit()
 
-    if cond[i] == 2:  # heavy distraction (solve math problems)
-        i31 = trial_timer.getTime()
-        instr2_timer = core.Clock()
-        instrText.text = text_cond_2
-        instrText.draw()
-        win.logOnFlip('first instrText frame', level=logging.EXP)
-        win.flip()
-        instr_key = event.waitKeys(keyList=['3'], timeStamped=instr2_timer, clearEvents=True)
-        if_esc_quit()
+            type = list(['instruction'])
+            item = list(['instrText2'])
+            trialtime = list([i31])
+            duration = list([instr_key[0][1]])
+            resp = list(['NaN'])
+            rt = list(['NaN'])
+            runtime = list(['NaN'])
+            isi = list(['NaN'])
 
-        type = list(['instruction'])
-        item = list(['instrText2'])
-        trialtime = list([i31])
-        duration = list([instr_key[0][1]])
-        resp = list(['NaN'])
-        rt = list(['NaN'])
-        runtime = list(['NaN'])
-        isi = list(['NaN'])
+    item_isi = isi_list[s]
+    ns_codes = dict(cur_item['ns'])
+    ns_codes.update((code, None) for code in trial['ns'])
+    print('item ' + str(s+1) + ' of trial ' + str(t-2) + ' (isi:' + str(item_isi) + ' | task:' + str(cur_item['cond']+1) + ' | img:' + str(cur_item['name']) + ')')
 
-    for s in range(0, n_items):
-        item_isi = isi_list[s]
-        print('item ' + str(s+1) + ' of trial ' + str(t-2) + ' (isi:' + str(item_isi) + ' | task:' + str(cond[i]+1) + ' | img:' + str(stimName[i]) + ')')
+    # NetStation
+    send_to_NS(code='bgin', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=None)
+    item_label = 't' + str(t) + '_' + str(s+1)
+    onsets.start_trial(item_label)
+    onsets.mark_now('bgin', 0)
+
+    if s >= 1:  # if this isn't the first item in the trial, then init all lists
+        type = []
+        item = []
+        resp = []
+        rt = []
+        trialtime = []
+        duration = []
+        runtime = []
 
+    event_cnt = 0  # keep track of n events to save per item pres
+    mathTimeOut = False
+
+    if cur_item['cond'] == 0:  # keep flipping fixation
+        t11 = trial_timer.getTime()
+        flips.set_routine('fixation')
+        for frameN in range(isi_frames[s]):
+            fixation.draw()
+
+            if frameN == 0:
+                win.logOnFlip('first fixation frame', level=logging.EXP)
+                # NetStation
+                send_to_NS(code='disS', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+                onsets.mark('disS', 0, frameN)
+
+            elif frameN == isi_frames[s]-1:
+                win.logOnFlip('last fixation frame', level=logging.EXP)
+            win.flip()
+            if_esc_quit()
+            assets.prefetch(max_items=1)  # build the next queued image/sound right after a flip, one per frame
+
+        t12 = trial_timer.getTime()
+        t1_duration = t12 - t11
+
+        # log fixation event
+        type.append('fix_dist')
+        item.append('+')
+        trialtime.append(t11)
+        duration.append(t1_duration)
+        resp.append([])
+        rt.append([])
+        runtime.append([])
+        isi = list([])
+        event_cnt = event_cnt + 1
+
+    else:  # light and heavy distraction = same number presentation, but diff keyboard commands
+        math_timer = core.Clock()  # start timer to limit math distraction
+        flips.set_routine('math')
         # NetStation
-        send_to_NS(code='bgin', trialnum=t, item=s+1, cond=cond[i]+1, category=None)
-
-        if s >= 1:  # if this isn't the first item in the trial, then init all lists
-            type = []
-            item = []
-            resp = []
-            rt = []
-            trialtime = []
-            duration = []
-            runtime = []
-
-        event_cnt = 0  # keep track of n events to save per item pres
-        mathTimeOut = False
-
-        if cond[i] == 0:  # keep flipping fixation
-            t11 = trial_timer.getTime()
-            for frameN in range(int(item_isi*60)):
-                fixation.draw()
-
-                if frameN == 0:
-                    win.logOnFlip('first fixation frame', level=logging.EXP)
-                    # NetStation
-                    send_to_NS(code='disS', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
-
-                elif frameN == ((item_isi*60)-1):
-                    win.logOnFlip('last fixation frame', level=logging.EXP)
-                win.flip()
-                if_esc_quit()
-
-            t12 = trial_timer.getTime()
-            t1_duration = t12 - t11
-
-            # log fixation event
-            type.append('fix_dist')
-            item.append('+')
-            trialtime.append(t11)
-            duration.append(t1_duration)
-            resp.append([])
-            rt.append([])
-            runtime.append([])
-            isi = list([])
-            event_cnt = event_cnt + 1
+        send_to_NS(code='disS', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+        onsets.mark('disS', 0)
+        while math_timer.getTime() < item_isi:
+            # next problem of the session (the schedule's deck, in order)
+            cur_math = schedule['math'][math_cnt]
+            math_cnt = math_cnt + 1
 
-        else:  # light and heavy distraction = same number presentation, but diff keyboard commands
-            math_timer = core.Clock()  # start timer to limit math distraction
-            # NetStation
-            send_to_NS(code='disS', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
-            while math_timer.getTime() < item_isi:
-                # grab random row from math dist file
-                if math_cnt >= 90:
-                    math_cnt = 0
-                    math_file = math_csv.sample(frac=1).reset_index(drop=True)  # check
-                # iterate through pre-randomized file
-                cur_math = math_file.loc[[math_cnt]]
-
-                # check if 2 or 3 numbers being presented
-                if cur_math.iloc[0, 2] == 0:
-                    n_math = 2
-                else:
-                    n_math = 3
+            # 2 or 3 numbers being presented
+            n_math = len(cur_math['nums'])
+
+            # math number loop
+            for m in range(n_math):
+
+                # present numbers
+                cur_num = cur_math['nums'][m]
+                mathText.text = str(cur_num)
+
+                t21 = trial_timer.getTime()
+                for frameN in range(digit_frames):
+                    mathText.draw()
+
+                    if frameN == 0:
+                        win.logOnFlip('mathOnset, item %i' % m, level=logging.EXP)
+                        onsets.mark('mthS', None, frameN)
+                    win.flip()
+                    if_esc_quit()
+                    assets.prefetch(max_items=1)
 
-                # math number loop
-                for m in range(n_math):
-
-                    # present numbers
-                    cur_num = cur_math.iloc[0, m]
-                    mathText.text = str(cur_num)
-
-                    t21 = trial_timer.getTime()
-                    for frameN in range(int(dur_digit*60)):
-                        mathText.draw()
-
-                        if frameN == 0:
-                            win.logOnFlip('mathOnset, item %i' % m, level=logging.EXP)
-                        win.flip()
-                        if_esc_quit()
-
-                        if math_timer.getTime() > item_isi:
-                            mathTimeOut = True
-                            blank_screen(dur_blank)
-                            break
-                        event.clearEvents('keyboard')
-                    blank_screen(dur_blank)
-                    # if mathTimeOut or (math_timer.getTime() > item_isi):
                     if math_timer.getTime() > item_isi:
                         mathTimeOut = True
                         blank_screen(dur_blank)
                         break
-
-                    t22 = trial_timer.getTime()
-                    t2_duration = t22-t21
-
-                    # math_cnt = math_cnt + 1
-                    type.append('math_dist')
-                    item.append(cur_math.iloc[0, m])
-                    trialtime.append(t21)
-                    duration.append(t2_duration)
-                    resp.append([])
-                    rt.append([])
-                    runtime.append([])
-                    isi.append(item_isi)
-                    event_cnt = event_cnt + 1
-                event.clearEvents('keyboard')
-                if_esc_quit()
-                # final math number w/ question mark
-                # randomly selects correct or incorrect answer to present
-                if not mathTimeOut:
-                    ans = random.randint(3, 4)
-                    mathText.text = str(cur_math.iloc[0, ans]) + '?'
-                    mathText.draw()
+                    event.clearEvents('keyboard')
+                blank_screen(dur_blank)
+                # if mathTimeOut or (math_timer.getTime() > item_isi):
                 if math_timer.getTime() > item_isi:
                     mathTimeOut = True
                     blank_screen(dur_blank)
                     break
 
-                event.clearEvents('keyboard')
-                if cond[i] == 2 and not mathTimeOut:  # heavy math distraction
-                    t31 = trial_timer.getTime()
-                    questionClock = core.Clock()
-                    for frameN in range(dur_question*60):
-                        mathText.draw()
-                        if frameN == 0:
-                            win.logOnFlip('mathQOnset', level=logging.EXP)
-                        qDurClock = core.Clock()
-                        win.flip()
-                        if_esc_quit()
-                        math_keys = event.getKeys(keyList=['period','slash'],  modifiers=False, timeStamped=questionClock)
-                        if math_keys:
-                            blank_screen(dur_blank)
-                            break
-                        if not math_keys and qDurClock.getTime() > dur_question:
-                            blank_screen(dur_blank)
-                            break
-                        if math_timer.getTime() > item_isi:
-                            blank_screen(dur_blank)
-                            break
-
-                    t32 = trial_timer.getTime()
-                    t3_duration = t32-t31
-
-                if cond[i] == 1 and mathTimeOut == False:
-                    t31 = trial_timer.getTime()
-                    questionClock = core.Clock()
-                    for frameN in range(dur_question*60):
-                        mathText.draw()
-                        if frameN == 0:
-                            win.logOnFlip('first mathQ frame', level=logging.EXP)
-                        qDurClock = core.Clock()
-                        win.flip()
-                        if_esc_quit()
-                        math_keys = event.getKeys(keyList=['period'], modifiers=False, timeStamped=questionClock)
-
-                        if math_keys:
-                            blank_screen(dur_blank)
-                            break
-                        if not math_keys and qDurClock.getTime() > dur_question:
-                            blank_screen(dur_blank)
-                            break
-                        if math_timer.getTime() > item_isi:
-                            blank_screen(dur_blank)
-                            break
-
-
-                    t32 = trial_timer.getTime()
-                    t3_duration = t32-t31
-
-                type.append('math_ans')
-                item.append(str(cur_math.iloc[0, ans]) + '?')
-                trialtime.append(t31)
-                duration.append(t3_duration)
-                if math_keys:
-                    resp.append(math_keys[0][0])
-                    rt.append(math_keys[0][1])
-                else:
-                    resp.append('NaN')
-                    rt.append('NaN')
+                t22 = trial_timer.getTime()
+                t2_duration = t22-t21
+
+                type.append('math_dist')
+                item.append(cur_num)
+                trialtime.append(t21)
+                duration.append(t2_duration)
+                resp.append([])
+                rt.append([])
                 runtime.append([])
                 isi.append(item_isi)
-                math_cnt = math_cnt + 1
                 event_cnt = event_cnt + 1
-            # NetStation
-            send_to_NS(code='disE', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
+            event.clearEvents('keyboard')
+            if_esc_quit()
+            # final math number w/ question mark
+            # correct or incorrect answer drawn at compile time
+            if not mathTimeOut:
+                mathText.text = str(cur_math['shown']) + '?'
+                mathText.draw()
+            if math_timer.getTime() > item_isi:
+                mathTimeOut = True
+                blank_screen(dur_blank)
+                break
 
-        # stimulus image + text presentation and record keypress
-        img.image = stimImg[i]
-        stimText.text = stimName[i]
+            event.clearEvents('keyboard')
+            if cur_item['cond'] == 2 and not mathTimeOut:  # heavy math distraction
+                t31 = trial_timer.getTime()
+                questionClock = core.Clock()
+                for frameN in range(question_frames):
+                    mathText.draw()
+                    if frameN == 0:
+                        win.logOnFlip('mathQOnset', level=logging.EXP)
+                        onsets.mark('mthQ', None, frameN)
+                    qDurClock = core.Clock()
+                    win.flip()
+                    if_esc_quit()
+                    math_keys = event.getKeys(keyList=['period','slash'],  modifiers=False, timeStamped=questionClock)
+                    if math_keys:
+                        blank_screen(dur_blank)
+                        break
+                    if not math_keys and qDurClock.getTime() > dur_question:
+                        blank_screen(dur_blank)
+                        break
+                    if math_timer.getTime() > item_isi:
+                        blank_screen(dur_blank)
+                        break
+
+                t32 = trial_timer.getTime()
+                t3_duration = t32-t31
 
-        # set sound
-        stimSound = os.path.basename(stimImg[i])[:-4] # get just the stim name and {} ie. acorn{}
-        stimSound = soundDir + stimSound + '.wav'
-        vocal = sound.Sound(stimSound)
-        vocal.setVolume(1)
+            if cur_item['cond'] == 1 and mathTimeOut == False:
+                t31 = trial_timer.getTime()
+                questionClock = core.Clock()
+                for frameN in range(question_frames):
+                    mathText.draw()
+                    if frameN == 0:
+                        win.logOnFlip('first mathQ frame', level=logging.EXP)
+                        onsets.mark('mthQ', None, frameN)
+                    qDurClock = core.Clock()
+                    win.flip()
+                    if_esc_quit()
+                    math_keys = event.getKeys(keyList=['period'], modifiers=False, timeStamped=questionClock)
+
+                    if math_keys:
+                        blank_screen(dur_blank)
+                        break
+                    if not math_keys and qDurClock.getTime() > dur_question:
+                        blank_screen(dur_blank)
+                        break
+                    if math_timer.getTime() > item_isi:
+                        blank_screen(dur_blank)
+                        break
 
-        t41 = trial_timer.getTime()
-        stimClock = core.Clock() # incase we care about RT of stim resp
 
-        temp_stim_keys=[]
+                t32 = trial_timer.getTime()
+                t3_duration = t32-t31
 
-        soundDur = vocal.getDuration()
-        for frameN in range(int(dur_stim*60)):
-            img.draw()
-            # stimText.draw()
-            if frameN == 0:
-                # vocal.play() # play immediately with image shown
-                # NetStation
-                send_to_NS(code='imgS', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
-                keyResp = event.getKeys(keyList=['period','slash'], modifiers=False, timeStamped=stimClock)
-                win.logOnFlip('stimOnset', level=logging.EXP)
-            win.flip()
-            if_esc_quit()
-            if frameN == int((dur_stim/2 * 60)-(soundDur/2 * 60)):  # center align sound
-                vocal.play()
-                # NetStation
-                send_to_NS(code='sndS', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
-            if frameN == int((dur_stim/2 * 60)-(soundDur/2 * 60)+(soundDur * 60)):
-                # NetStation
-                send_to_NS(code='sndE', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
-            if keyResp:
-                stim_keys = keyResp
+            type.append('math_ans')
+            item.append(str(cur_math['shown']) + '?')
+            trialtime.append(t31)
+            duration.append(t3_duration)
+            if math_keys:
+                resp.append(math_keys[0][0])
+                rt.append(math_keys[0][1])
             else:
-                stim_keys = []
-            if stim_keys:
-                # NetStation
-                send_to_NS(code='imgK', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
-                resp.append(stim_keys[0][0])
-                rt.append(stim_keys[0][1])
-                t42 = trial_timer.getTime()
-                t4_duration = t42-t41
-                type.append('stim_pres')
-                item.append(stimName[i])
-                trialtime.append(t41)
-                duration.append(t4_duration)
-                runtime.append([])
-                temp_stim_keys=True
-            if frameN >= ((dur_stim*60)-1) and not temp_stim_keys:
-                # NetStation
-                send_to_NS(code='imgE', trialnum=t, item=s+1, cond=cond[i]+1, category=cat[i])
                 resp.append('NaN')
                 rt.append('NaN')
-                t42 = trial_timer.getTime()
-                t4_duration = t42-t41
-                type.append('stim_pres')
-                item.append(stimName[i])
-                trialtime.append(t41)
-                duration.append(t4_duration)
-                runtime.append([])
+            runtime.append([])
+            isi.append(item_isi)
+            event_cnt = event_cnt + 1
+        # NetStation
+        send_to_NS(code='disE', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+        onsets.mark_now('disE', isi_frames[s])
 
-        # checks when to end practice trial
-        if (practiceTrial == True) and (t == 2) and (s == n_items-1):
-            instrText.text = practiceText
-            instrText.draw()
-            win.flip()
-            practiceKeypress = event.waitKeys(keyList=['return','escape'], timeStamped=False, clearEvents=True)
-            if practiceKeypress == 'return':
-                practiceTrial = False
-            if practiceKeypress == 'escape':
-                core.quit()
-        event_cnt = event_cnt + 1
-        i = i+1  # update item count after each stimulus presentation
+    # stimulus image + text presentation and record keypress
+    img, vocal = assets.get(cur_item['index'])  # prebuilt image + sound
+    stimText.text = cur_item['name']
 
-        temp_df = pd.DataFrame()
-        temp_df['type'] = type; temp_df['item'] = item; temp_df['trialtime'] = trialtime; temp_df['duration'] = duration;
-        temp_df['resp'] = resp; temp_df['rt'] = rt; temp_df['runtime'] = runtime;
-        temp_df['isi'] = item_isi
-        # append to events dataframe
-        events = events.append(temp_df)
+    t41 = trial_timer.getTime()
+    stimClock = core.Clock() # incase we care about RT of stim resp
 
-        # save to machine (if scripts crashes we would lose 1 item max)
-        events.to_csv(stimDir + 'data/' + str(subj_id) + '/events/' + subj_id + '_events.csv', sep=',', index=False)
-        logging.flush()  # force flush of .log messages at end of each stim pres
+    temp_stim_keys=[]
+
+    sound_on = cur_item['sound_on']  # center aligned sound
+    flips.set_routine('stim_pres')
+    for frameN in range(stim_frames):
+        img.draw()
+        # stimText.draw()
+        item_frame = isi_frames[s] + frameN  # frame from the item start, as the schedule counts them
+        if item_frame == ns_codes.get('imgS'):
+            # NetStation
+            send_to_NS(code='imgS', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+        if frameN == 0:
+            # vocal.play() # play immediately with image shown
+            keyResp = event.getKeys(keyList=['period','slash'], modifiers=False, timeStamped=stimClock)
+            win.logOnFlip('stimOnset', level=logging.EXP)
+            onsets.mark('imgS', isi_frames[s])
+        if frameN == sound_on:
+            onsets.mark('sndS', isi_frames[s] + sound_on)  # played right after this flip
+        if frameN == cur_item['sound_off']:
+            onsets.mark('sndE', item_frame)
+        if frameN == stim_frames-1 and not temp_stim_keys:
+            onsets.mark('imgE', item_frame)  # last frame of the image, imgE is sent right after its flip
+        win.flip()
+        if_esc_quit()
+        if frameN == sound_on:
+            vocal.play()
+        if item_frame == ns_codes.get('sndS'):
+            # NetStation
+            send_to_NS(code='sndS', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+        if item_frame == ns_codes.get('sndE'):
+            # NetStation
+            send_to_NS(code='sndE', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+        if keyResp:
+            stim_keys = keyResp
+        else:
+            stim_keys = []
+        if stim_keys:
+            # NetStation
+            send_to_NS(code='imgK', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+            onsets.mark_now('imgK')
+            resp.append(stim_keys[0][0])
+            rt.append(stim_keys[0][1])
+            t42 = trial_timer.getTime()
+            t4_duration = t42-t41
+            type.append('stim_pres')
+            item.append(cur_item['name'])
+            trialtime.append(t41)
+            duration.append(t4_duration)
+            runtime.append([])
+            temp_stim_keys=True
+        if frameN >= stim_frames-1 and not temp_stim_keys:
+            if item_frame == ns_codes.get('imgE'):
+                # NetStation
+                send_to_NS(code='imgE', trialnum=t, item=s+1, cond=cur_item['cond']+1, category=cur_item['cat'])
+            resp.append('NaN')
+            rt.append('NaN')
+            t42 = trial_timer.getTime()
+            t4_duration = t42-t41
+            type.append('stim_pres')
+            item.append(cur_item['name'])
+            trialtime.append(t41)
+            duration.append(t4_duration)
+            runtime.append([])
+
+    onsets.end_trial()
+    flips.end_trial(item_label)
+    flips.set_routine('other')
+
+    # done with this item's image/sound; the next ones are built during the next fixation/math frames
+    assets.release(cur_item['index'])
+
+    # checks when to end practice trial
+    if (practiceTrial == True) and (t == 2) and (s == n_items-1):
+        instrText.text = practiceText
+        instrText.draw()
+        win.flip()
+        practiceKeypress = event.waitKeys(keyList=['return','escape'], timeStamped=False, clearEvents=True)
+        flips.pause()
+        if practiceKeypress == 'return':
+            practiceTrial = False
+        if practiceKeypress == 'escape':
+            core.quit()
+    event_cnt = event_cnt + 1
+    i = i+1  # update item count after each stimulus presentation
+
+    # append this item's rows to the events file (if scripts crashes we would lose 1 item max)
+    events.write(type=type, item=item, trialtime=trialtime, duration=duration,
+                 resp=resp, rt=rt, runtime=runtime, isi=item_isi)
+    logging.flush()  # force flush of .log messages at end of each stim pres
+
+
+    if s < n_items - 1:
+        continue
 
     #########################################
     #        Final Math Distraction         #
@@ -659,37 +733,36 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
         instrText.draw()
         win.flip()
         core.wait(instrWaitTime)
+        flips.pause()
+        flips.set_routine('final_math')
 
         math_timer_final = core.Clock()  # start timer to limit math distraction
 
         # NetStation
         send_to_NS(code='finS', trialnum=t, item=None, cond=None, category=None)
+        onsets.start_trial('t' + str(t) + '_final')
+        onsets.mark('finS', 0)  # first digit
         while math_timer_final.getTime() < dur_finalmath:
 
-            if math_cnt >= 90:  # catch end of math stim and reset
-                math_cnt = 0
-                math_file = math_csv.sample(frac=1).reset_index(drop=True)
-
-            # iterate through pre-randomized file
-            cur_math = math_file.loc[[math_cnt]]
-            # check if 2 or 3 numbers being presented
-            if cur_math.iloc[0, 2] == 0:
-                n_math = 2
-            else:
-                n_math = 3
+            # problems taken in order from the schedule
+            cur_math = schedule['math'][math_cnt]
+            math_cnt = math_cnt + 1
+            # 2 or 3 numbers being presented
+            n_math = len(cur_math['nums'])
 
                 # math number loop
             for m in range(n_math):
 
                 # present numbers
-                cur_num = cur_math.iloc[0, m]
+                cur_num = cur_math['nums'][m]
                 mathText.text = str(cur_num)
 
                 m11 = trial_timer.getTime()
-                for frameN in range(int(dur_digit*60)):
+                for frameN in range(digit_frames):
                     mathText.draw()
                     if frameN == 0:
                         win.logOnFlip('first mathF frame, item %i' % m, level=logging.EXP)
+                        onsets.mark('mthS', None, frameN)
                         # NetStation
                         # send_to_NS(code='mthS', trialnum=t, item=None, cond=None, category=None)
                     win.flip()
@@ -708,9 +781,8 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
                 m12 = trial_timer.getTime()
                 m1_duration = m12-m11
 
-                math_cnt = math_cnt + 1
                 type.append('math_dist')
-                item.append(cur_math.iloc[0, m])
+                item.append(cur_num)
                 trialtime.append(m11)
                 duration.append(m1_duration)
                 resp.append([])
@@ -720,10 +792,9 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
                 event_cnt = event_cnt + 1
             event.clearEvents('keyboard')
             # final math number w/ question mark
-            # randomly select correct or incorrect answer to present
+            # correct or incorrect answer drawn at compile time
             if not finalMathTimeOut:
-                ans = random.randint(3, 4)
-                mathText.text = str(cur_math.iloc[0, ans]) + '?'
+                mathText.text = str(cur_math['shown']) + '?'
                 mathText.draw()
             if math_timer_final.getTime() > dur_finalmath:
                 finalMathTimeOut = True
@@ -735,10 +806,11 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
             questionFinalClock = core.Clock()
 
             if not finalMathTimeOut:
-                for frameN in range(dur_question*60):
+                for frameN in range(question_frames):
                     mathText.draw()
                     if frameN == 0:
                         win.logOnFlip('first mathQF frame', level=logging.EXP)
+                        onsets.mark('mthQ', None, frameN)
                     qDurClock = core.Clock()
                     win.flip()
                     if_esc_quit()
@@ -747,6 +819,7 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
                     if math_keysF:
                         # NetStation
                         send_to_NS(code='finK', trialnum=t, item=None, cond=None, category=None)
+                        onsets.mark_now('finK')
                         blank_screen(dur_blank)
                         break
                     if not math_keysF and qDurClock.getTime() > dur_question:
@@ -760,7 +833,7 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
             m2_duration = m22-m21
 
             type.append('math_ans')
-            item.append(str(cur_math.iloc[0, ans]) + '?')
+            item.append(str(cur_math['shown']) + '?')
             trialtime.append(m21)
             duration.append(m2_duration)
             if math_keysF:
@@ -775,6 +848,11 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
 
     # NetStation
     send_to_NS(code='finE', trialnum=t, item=None, cond=None, category=None)
+    if actualTrial and not practiceTrial:
+        onsets.mark_now('finE', timing.frames(dur_finalmath))
+        onsets.end_trial()
+    flips.end_trial('t' + str(t) + '_final')
+    flips.set_routine('other')
     #########################################
     #         Free Recall & Break           #
     #########################################
@@ -786,11 +864,14 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
         win.logOnFlip('first instrFRText frame', level=logging.EXP)
         win.flip()
         core.wait(instrWaitTime)
+        flips.pause()
 
         # recording
         instrText.text = recordingText
         instrText.draw()
         win.logOnFlip('first recordtext frame', level=logging.EXP)
+        onsets.start_trial('t' + str(t) + '_recall')
+        onsets.mark('recS', 0)
         win.flip()
         if_esc_quit()
 
@@ -808,11 +889,21 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
         # NetStation
         send_to_NS(code='recS', trialnum=t, item=None, cond=None, category=None)
 
-        mic.record(sec=dur_FR, block=True)
+        if live_decode:
+            # same name pattern AdvAudioCapture uses, given up front so the worker can follow the file
+            fr_wav = os.path.abspath(os.path.join(wavDirName, subj_id + '-%.3f' % core.getTime() + '.wav'))
+            live.submit(t-2, fr_wav, list(stimName[i-n_items:i]))
+            mic.record(sec=dur_FR, filename=fr_wav, block=True)
+            live.recording_done(t-2)
+        else:
+            mic.record(sec=dur_FR, block=True)
+        flips.pause()
         win.logOnFlip('last recordtext frame', level=logging.EXP)
 
         # NetStation
         send_to_NS(code='recE', trialnum=t, item=None, cond=None, category=None)
+        onsets.mark_now('recE', timing.frames(dur_FR))
+        onsets.end_trial()
         win.flip()
 
         # finish if all trials
@@ -822,6 +913,20 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
             win.logOnFlip('end', level=logging.EXP)
             win.flip()
             core.wait(instrWaitTime)
+            if live_decode:
+                live.stop(timeout=60)
+            events.write(type=type, item=item, trialtime=trialtime, duration=duration,
+                         resp=resp, rt=rt, runtime=runtime, isi=item_isi)
+            events.close()
+            onsets.close()
+            frame_qc = flips.close()
+            print('dropped frames: ' + str(frame_qc))
+            logging.exp('dropped frames: ' + str(frame_qc))
+            if netstation:
+                ns_stats = ns_out.stop()
+                print('NetStation events: ' + str(ns_stats))
+                logging.exp('NetStation events: ' + str(ns_stats))
+                logging.flush()
             core.quit()
 
         # give break after each trial
@@ -829,19 +934,25 @@ for t in range(0, n_trials+3):  # n_trials+4 b/c 3 is used for 3 practice trials
         instrText.draw()
         win.logOnFlip('break', level=logging.EXP)
         win.flip()
+        if live_decode:
+            live_rows = live.result(t-2, timeout=5)
+            if live_rows is None:
+                print('live recall: list ' + str(t-2) + ' still decoding')
+            elif 'error' in live_rows:
+                print('live recall: list ' + str(t-2) + ' failed')
+            else:
+                n_recalled = sum(1 for x in live_rows['intrusion'] if x == 0)
+                n_intrusion = sum(1 for x in live_rows['intrusion'] if x == 1)
+                print('live recall: list ' + str(t-2) + ' recalled ' + str(n_recalled) + ' | intrusions ' + str(n_intrusion))
+                logging.exp('live recall list ' + str(t-2) + ': recalled ' + str(n_recalled) + ', intrusions ' + str(n_intrusion))
         breakKey = event.waitKeys(keyList=['space','escape'],  timeStamped=False, clearEvents=True)
+        flips.pause()
         if breakKey == 'escape':
             core.quit()
 
         # record end of trial data
         # both manual and system logs
-        temp_df = pd.DataFrame()
-        temp_df['type'] = type; temp_df['item'] = item; temp_df['trialtime'] = trialtime; temp_df['duration'] = duration;
-        temp_df['resp'] = resp; temp_df['rt'] = rt; temp_df['runtime'] = runtime;
-        temp_df['isi'] = item_isi
-        # append to events dataframe
-        events = events.append(temp_df)
-
-        # save to machine (if scripts crashes we would lose 1 item max)
-        events.to_csv(stimDir + 'data/' + str(subj_id) + '/events/' + subj_id + '_events.csv', sep=',', index=False)
+        # append this item's rows to the events file (if scripts crashes we would lose 1 item max)
+        events.write(type=type, item=item, trialtime=trialtime, duration=duration,
+                     resp=resp, rt=rt, runtime=runtime, isi=item_isi)
         logging.flush() # force flush of .log messages at end of each stim pres (backup data to disk)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+¯\_(ツ)_/¯
+cohort level batch decoding: decode + score every subject under a data root
+
+subjects are fanned out over a process pool (one subject per worker) and every
+file is addressed by absolute path, so the working directory is never changed.
+a run manifest (json) records status and wall time of every subject, the
+per-stage timings of every subject (record/<subj>[STATS].json) and their
+percentiles across the cohort; the per-subject stage totals also go to a csv
+next to the manifest
+
+usage:
+python cohort_decode.py path/to/data --subjects 'cdcatmr0*' --processes 8
+"""
+import fnmatch
+import json
+import os
+import time
+import traceback
+from multiprocessing import Pool, cpu_count
+
+from pipeline_stats import cohort_summary, write_cohort_csv
+
+
+def find_subjects(data_root, pattern='*'):
+    """
+    subject folders in data_root matching pattern that have a record folder
+    """
+    subjects = []
+    for name in sorted(os.listdir(data_root)):
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        if os.path.isdir(os.path.join(data_root, name, 'record')):
+            subjects.append(name)
+    return subjects
+
+
+def check_subject(data_root, stim_dir, subj):
+    """
+    why decode() would fail right away for subj (missing folders/files), or None
+    """
+    record_dir = os.path.join(data_root, subj, 'record')
+    if not os.path.isdir(record_dir):
+        return 'no record folder ' + record_dir
+    stim_file = os.path.join(stim_dir, 'export_stim', subj.lower() + 'stimuli.csv')
+    if not os.path.isfile(stim_file):
+        return 'no stimuli file ' + stim_file
+    return None
+
+
+def decode_subject(job):
+    """
+    worker: decodes one subject, never raises so one bad subject can't stop the batch
+    job = (subj, data_root, stim_dir, decode keyword arguments)
+    """
+    subj, data_root, stim_dir, decode_kwargs = job
+    entry = {'subj': subj, 'pid': os.getpid(), 'start': time.time()}
+    t0 = time.time()
+    try:
+        from decode_all_wav import decode
+        df = decode(subj, data_dir=data_root, stim_dir=stim_dir, **decode_kwargs)
+        entry['status'] = 'ok'
+        entry['n_trials'] = int(df['trialN'].nunique()) if len(df) else 0
+        entry['n_items'] = int(len(df))
+        stats_file = os.path.join(data_root, subj, 'record', subj.lower() + '[STATS].json')
+        if os.path.isfile(stats_file):
+            with open(stats_file, 'r') as f:
+                entry['stats'] = json.load(f)
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = repr(e)
+        entry['traceback'] = traceback.format_exc()
+    entry['seconds'] = time.time() - t0
+    return entry
+
+
+def decode_cohort(data_root, pattern='*', processes=None, stim_dir=None, manifest=None, **decode_kwargs):
+    """
+    Help: decode_cohort('path/to/data', pattern='cdcatmr*', processes=8)
+    data_root : folder with one folder per subject (the data folder)
+    pattern   : glob pattern for subject folder names
+    processes : number of worker processes (default: number of cores)
+    stim_dir  : stimuli folder (default: data_root/../stimuli)
+    manifest  : path of the run manifest json (default: data_root/cohort_manifest_<time>.json)
+    extra keyword arguments are passed on to decode_all_wav.decode
+    returns the manifest dict
+    """
+    data_root = os.path.abspath(data_root)
+    if stim_dir is None:
+        stim_dir = os.path.join(data_root, '..', 'stimuli')
+    stim_dir = os.path.abspath(stim_dir)
+    if processes is None:
+        processes = cpu_count()
+
+    subjects = find_subjects(data_root, pattern)
+    t0 = time.time()
+    results = []
+    jobs = []
+    for subj in subjects:
+        problem = check_subject(data_root, stim_dir, subj)
+        if problem is None:
+            jobs.append((subj, data_root, stim_dir, decode_kwargs))
+        else:
+            print(subj + ': skipped (' + problem + ')')
+            results.append({'subj': subj, 'status': 'skipped', 'error': problem, 'seconds': 0.0})
+    print('decoding ' + str(len(jobs)) + ' subjects with ' + str(processes) + ' processes')
+
+    if jobs:
+        pool = Pool(processes=max(1, min(processes, len(jobs))))
+        try:
+            for entry in pool.imap_unordered(decode_subject, jobs):
+                print(entry['subj'] + ': ' + entry['status'] + ' (' + '%.1f' % entry['seconds'] + 's)')
+                results.append(entry)
+        finally:
+            pool.close()
+            pool.join()
+    results.sort(key=lambda e: e['subj'])
+
+    run = {'data_root': data_root,
+           'stim_dir': stim_dir,
+           'pattern': pattern,
+           'processes': processes,
+           'started': t0,
+           'wall_seconds': time.time() - t0,
+           'n_ok': sum(1 for e in results if e['status'] == 'ok'),
+           'n_failed': sum(1 for e in results if e['status'] == 'failed'),
+           'n_skipped': sum(1 for e in results if e['status'] == 'skipped'),
+           'stats': cohort_summary([e.get('stats') for e in results]),
+           'subjects': results}
+    if manifest is None:
+        manifest = os.path.join(data_root, 'cohort_manifest_' + time.strftime('%Y%m%d-%H%M%S', time.localtime(t0)) + '.json')
+    with open(manifest, 'w') as f:
+        json.dump(run, f, indent=2, default=str)
+    write_cohort_csv([e.get('stats') for e in results], os.path.splitext(manifest)[0] + '_stats.csv')
+    print('manifest saved to ' + manifest)
+    return run
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='decode and score every subject under a data root')
+    parser.add_argument('data_root')
+    parser.add_argument('--subjects', default='*', help='glob pattern for subject folders')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--stim-dir', default=None)
+    parser.add_argument('--manifest', default=None)
+    parser.add_argument('--workers', type=int, default=4, help='concurrent wav decodes per subject')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--refresh', action='store_true')
+    parser.add_argument('--vad', action='store_true', help='only send the speech segments of each wav')
+    parser.add_argument('--backend', default='quail', help='decoder backend (see recall_decoders)')
+    parser.add_argument('--model', default=None, help='vosk model folder (--backend vosk)')
+    parser.add_argument('--fixtures', default=None, help='fixture folder (--backend fixture)')
+    args = parser.parse_args()
+    decode_cohort(args.data_root, pattern=args.subjects, processes=args.processes, stim_dir=args.stim_dir,
+                  manifest=args.manifest, max_workers=args.workers, cache=not args.no_cache,
+                  refresh=args.refresh, vad=args.vad, backend=args.backend, model_path=args.model,
+                  fixture_dir=args.fixtures)
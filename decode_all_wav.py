@@ -11,75 +11,126 @@ cdcatmr > data (pwd) > subj_folder names
 
 and ideally only trial wav files should be within the record folder
 """
-import pickle
 import os
-import sys
-import quail
-import csv
+import numpy as np
 import pandas as pd
-from collections import Counter
-
-if sys.version_info[0] < 3:
-    ls = os.listdir('.')
-else:
-    ls = os.listdir()
-ls.sort()
-print('Subject data file in pwd: \n ' + str(ls))
-print("TYPE: decode('subj name in strings')")
-
-dataDir = os.getcwd()
-stimDir = os.path.join(dataDir, '../stimuli')
-os.chdir(stimDir)
-
-# call in cdcatmr stim pool
-with open('cel_names.txt', 'r') as f:
-    cel_list = f.read().splitlines()
-with open('loc_names.txt', 'r') as f:
-    loc_list = f.read().splitlines()
-with open('obj_names.txt', 'r') as f:
-    obj_list = f.read().splitlines()
-
-total_list = cel_list + loc_list + obj_list
-
-# create flatten version of total list
-total_temp = total_list
-for i in range(0, len(total_temp)):
-    total_temp[i] = total_temp[i].split(" ")
-total_breakdown = []
-for sublist in total_temp:
-    for item in sublist:
-        total_breakdown.append(item)
-
-# create two lists for filtering
-uniqueWords = []
-stopWords = []
-a = Counter(total_breakdown)
-for i in range(0,len(a)):
-    if a.values()[i] >= 2:
-        stopWords.append(a.keys()[i].lower())
-    else:
-        uniqueWords.append(a.keys()[i].lower())
-
-os.chdir(dataDir)
-
-def decode(subj):
+from speech_pool import decode_pool
+from transcription_cache import TranscriptionCache, cached_decoder
+from recall_parse import timing_arrays, load_pickle
+from recall_decoders import BACKENDS, get_decoder
+from recall_vad import vad_decoder
+from recall_match import TrialIndex, score_tokens
+from stim_table import get_pool
+from decode_state import DecodeState, file_sha, json_sha, plain_rows
+from annotation_io import ANNOTATION_COLUMNS, new_columns, add_trial, annotation_frame, write_annotation
+from pipeline_stats import PipelineStats, no_stage
+
+# nothing is read at import: the stim pool of a stimuli folder is loaded on first
+# use (get_pool, memoized per folder) and every function takes explicit paths
+DEFAULT_STIM_DIR = '../stimuli'
+
+
+def __getattr__(name):
+    # old module level names (cel_list, total_list, ...) for interactive use,
+    # resolved lazily from ../stimuli relative to the current folder
+    legacy = {'stim_table': 'table', 'cel_list': 'cel_list', 'loc_list': 'loc_list',
+              'obj_list': 'obj_list', 'total_list': 'total_list',
+              'uniqueWords': 'unique_words', 'stopWords': 'stop_words'}
+    if name in legacy:
+        return getattr(get_pool(os.path.join(os.getcwd(), DEFAULT_STIM_DIR)), legacy[name])
+    raise AttributeError(name)
+
+
+# bump whenever the scoring rules change, so saved per-trial results are redone
+SCORING_VERSION = 2
+
+
+def score_trial(objects, trial_stim, table, stage=no_stage):
+    """
+    scores the unpickled response(s) of one trial against its stimulus list
+    returns words, word_onset, word_offset (every recognized word) and the
+    trial's annotation columns (index, item, category, intrusion, confidence, onset, offset)
+    stage: context manager factory wrapped around each step ('timing', 'match',
+    'category', 'annotate'), e.g. PipelineStats.stage (bench_scoring times them)
+    """
+    # word + onset/offset (float64 seconds) straight from the response objects
+    with stage('timing'):
+        words, word_onset, word_offset = timing_arrays(objects)
+
+    # compare recalled items to actual wordpool (repeats are marked -1)
+    with stage('match'):
+        trial_index = TrialIndex(trial_stim, table.index)
+        scored = score_tokens(words, trial_index)
+    final_list = [item[0] for item in scored]
+
+    # get category list array (1 = celeb, 2 = location, 3 = object, 0 = not in pool)
+    with stage('category'):
+        category_list = [table.category_of(item) for item in final_list]
+
+    with stage('annotate'):
+        intrusion_list = [item[1] for item in scored]
+        confidence_list = [item[4] for item in scored]
+        # pairing start/end time of each word
+        # onset of the item's first spoken word, offset of its last one
+        first = np.array([item[2] for item in scored], dtype=int)
+        last = np.array([item[3] for item in scored], dtype=int)
+        onset = word_onset[first]
+        offset = word_offset[last]
+
+        rows = {'index': list(range(1,len(final_list)+1)), 'item': final_list, 'category': category_list,
+                'intrusion': intrusion_list, 'confidence': confidence_list, 'onset': onset, 'offset': offset}
+    return words, word_onset, word_offset, rows
+
+
+def decode(subj, max_workers=4, retries=3, keypath='/Users/Jin/documents/matlab/research/recall-0fa1a5e0555b.json',
+           cache=True, refresh=False, cache_dir=None, debug=False, formats=('csv',),
+           data_dir=None, stim_dir=None, force=False, stream=False, chunk_sec=0.5, vad=False, profile=False,
+           backend='quail', model_path=None, fixture_dir=None):
     """
     Help: type decode('subj name in strings')
     decode_all_wav.py needs to be inside data folder
+    (or pass data_dir='path/to/data', stim_dir defaults to data_dir/../stimuli)
     decoding wav to pickle is based on quail's decode_speech.py
     You need Google Cloud account setup with key.json file + quail setup on your computer to run this
+    max_workers sets how many wav files are decoded at the same time
+    recognizer responses are cached in data/.transcripts (or cache_dir):
+    cache=False skips the cache, refresh=True re-decodes and overwrites the cache
+    debug=True also saves the full unpickled response as [FULL-TEXT].txt
+    formats: any of 'csv', 'parquet', 'feather' for the [ANNOTATION] table
+    all files are addressed by path, the working directory is never changed
+    only new/changed trials are decoded and scored again (state in record/subj[STATE].json),
+    force=True ignores the saved state
+    backend: 'quail' (google through quail), 'google-stream' (chunk_sec chunks to
+    google streaming recognition), 'vosk' (offline, model_path = vosk model folder)
+    or 'fixture' (deterministic test responses, fixture_dir); see recall_decoders
+    stream=True is the same as backend='google-stream'
+    vad=True only sends the speech segments of each wav (see recall_vad);
+    word times still refer to the original recording
+    stage timings and counters are saved as record/subj[STATS].json/.csv,
+    profile=True also saves a cProfile dump (record/subj[STATS].prof)
+    returns the annotation dataframe
     """
-    col_order = ['trialN','index','item','category','intrusion','onset','offset']
-    df = pd.DataFrame(columns=col_order)
+    col_order = ANNOTATION_COLUMNS
+    columns = new_columns(col_order)
 
+    # the subject folder keeps its name as given; the files in it and the
+    # export_stim file are named with the lowercase subj
+    subj_folder = subj
     subj = subj.lower()
+    stats = PipelineStats(subj, profile=profile)
 
     # get export_stim
-    dataDir = os.getcwd()
-    stimDir = os.path.join(dataDir, '../stimuli')
+    if data_dir is None:
+        data_dir = os.getcwd()
+    dataDir = os.path.abspath(data_dir)
+    if stim_dir is None:
+        stim_dir = os.path.join(dataDir, DEFAULT_STIM_DIR)
+    stimDir = os.path.abspath(stim_dir)
     export_stimDir = stimDir + '/export_stim/' + str(subj)
     print('identifying subject trial data at: ' + str(export_stimDir))
     export_stim = pd.read_csv(export_stimDir + 'stimuli.csv')
+    if cache_dir is None:
+        cache_dir = os.path.join(dataDir, '.transcripts')
     stim_temp = export_stim.stimName
 
     # remove random spaces in text if so
@@ -87,344 +138,180 @@ def decode(subj):
     for i in range(0,len(stim_temp)):
         stim[i] = ' '.join(stim_temp[i].split())
 
-    # correct trial set
-    stim_trial1 = stim[18:45]
-    stim_trial2 = stim[45:72]
-    stim_trial3 = stim[72:99]
-    stim_trial4 = stim[99:126]
-    stim_trial5 = stim[126:153]
-    stim_trial6 = stim[153:180]
-    stim_trial7 = stim[180:207]
-    stim_trial8 = stim[207:234]
-    stim_trial9 = stim[234:261]
-
-    # need flatten list for accurate comparison
-    def flatten_list(trial_list):
-        temp_flat = [0] * len(trial_list)
-        for i in range(0,len(trial_list)):
-            temp_flat[i] = trial_list[i].split(' ')
-        stim_flat = []
-        for sub in temp_flat:
-            for item in sub:
-                stim_flat.append(item)
-        for k in range(0,len(stim_flat)):
-            stim_flat[k] = stim_flat[k].lower()
-        return stim_flat
-
-    stim_trial_flat1 = flatten_list(stim_trial1)
-    stim_trial_flat2 = flatten_list(stim_trial2)
-    stim_trial_flat3 = flatten_list(stim_trial3)
-    stim_trial_flat4 = flatten_list(stim_trial4)
-    stim_trial_flat5 = flatten_list(stim_trial5)
-    stim_trial_flat6 = flatten_list(stim_trial6)
-    stim_trial_flat7 = flatten_list(stim_trial7)
-    stim_trial_flat8 = flatten_list(stim_trial8)
-    stim_trial_flat9 = flatten_list(stim_trial9)
-
-    # cd to subj/record path
-    pwdDir = os.getcwd()
-    filename = os.path.join(pwdDir, '' + str(subj))
-    if not os.path.isdir(filename):
+    # correct trial set (first 18 items are practice, then 9 trials x 27 items)
+    stim_trials = [stim[18+27*k:45+27*k] for k in range(0, 9)]
+
+    # category/token table + phrase index over the whole stim pool for matching recalls
+    with stats.stage('stim_table'):
+        table = get_pool(stimDir).table
+
+    # subj/record path
+    subjDir = os.path.join(dataDir, str(subj_folder))
+    if not os.path.isdir(subjDir):
+        subjDir = os.path.join(dataDir, str(subj))
+    if not os.path.isdir(subjDir):
         print('No such subject name/data file')
-    os.chdir(filename)
-    pwdDir = os.getcwd()
-    filename = os.path.join(pwdDir + '/record')
-    os.chdir(filename)
-
-    # check if python 2 or 3
-    if sys.version_info[0] < 3:
-        ls = os.listdir('.')
-    else:
-        ls = os.listdir()
+        raise IOError('No such subject name/data file: ' + subjDir)
+    recordDir = os.path.join(subjDir, 'record')
+    ls = sorted(os.listdir(recordDir))
     print(len(ls))
 
+    # per-subject state: which trials are already decoded/scored
+    state = DecodeState(os.path.join(recordDir, subj + '[STATE].json'))
+    if force:
+        state.trials = {}
+
     # use quail to decode wav to pickle
-    for i in range(0,len(ls)):
+    # every new/changed trial wav is sent at once through a bounded worker pool
+    # sorted so that wav N is paired with stim_trialN (same order as the pickles below)
+    wav_files = [os.path.join(recordDir, f) for f in ls if f[-4:] == '.wav']
+    wav_shas = {}
+    to_decode = []
+    speech_contexts = []
+    for i in range(0,len(wav_files)):
     # set trial_stim specific to that trial for speech_context
-        try:
-            trial_stim = eval('stim_trial%d'% (i+1))
-        except NameError:
-            pass
-
-        #double check if wav file
-        if ls[i][-4:] == '.wav':
-            recall_data = quail.decode_speech(ls[i], save=True,speech_context=trial_stim,keypath='/Users/Jin/documents/matlab/research/recall-0fa1a5e0555b.json')
-            # recall_data = quail.decode_speech(ls[i], save=True,speech_context=total_list,keypath='/Users/Jin/documents/matlab/research/recall-0fa1a5e0555b.json')
-            print(recall_data)
-            print('end of wav file ' + str(i+1))
+        if i < len(stim_trials):
+            trial_stim = stim_trials[i]
+        with stats.stage('hash', trial=i+1):
+            wav_shas[wav_files[i]] = file_sha(wav_files[i])
+        if refresh or state.needs_decode(wav_files[i], wav_shas[wav_files[i]]):
+            to_decode.append(wav_files[i])
+            speech_contexts.append(trial_stim)
+    print(str(len(to_decode)) + ' of ' + str(len(wav_files)) + ' wav files to decode')
+
+    if stream:
+        backend = 'google-stream'
+    # the backend is only set up (and imported) if there is something to decode,
+    # so scoring-only runs need none of them
+    transcript_cache = TranscriptionCache(cache_dir) if cache else None
+    decoder = None
+    if to_decode:
+        base_decoder = get_decoder(backend, keypath=keypath, chunk_sec=chunk_sec,
+                                   model_path=model_path, fixture_dir=fixture_dir)
+        # responses of different backends get their own cache entries
+        variant = {'quail': None, 'google-stream': 'stream'}.get(backend, backend)
+        if vad:
+            base_decoder = vad_decoder(base_decoder)
+            variant = 'vad' if variant is None else variant + '+vad'
+        decoder = cached_decoder(base_decoder, transcript_cache, refresh=refresh, variant=variant)
+
+    # time every recognizer call (worker threads) under its trial number
+    trial_of = dict((wav_files[i], i+1) for i in range(0, len(wav_files)))
+    # the cache key reuses the hash taken above instead of reading the wav again
+    def timed_decoder(wav_file, **kwargs):
+        with stats.stage('recognize', trial=trial_of[wav_file]):
+            return decoder(wav_file, sha=wav_shas[wav_file], **kwargs)
+
+    # every finished wav is marked and saved right away, so if one of them fails
+    # (raised after the others are done) the next run only redoes that one
+    def mark_decoded(i, result):
+        state.mark_decoded(to_decode[i], wav_shas[to_decode[i]])
+        state.save()
+        print(result)
+        print('end of wav file ' + os.path.basename(to_decode[i]))
+
+    with stats.stage('decode_pool'):
+        decode_pool(to_decode, speech_contexts, timed_decoder, max_workers=max_workers,
+                    retries=retries, on_done=mark_decoded, save=True, keypath=keypath)
+    stats.count('wavs', len(wav_files))
+    stats.count('wavs_decoded', len(to_decode))
+    if transcript_cache is not None:
+        stats.count('cache_hits', transcript_cache.hits)
+        stats.count('cache_misses', transcript_cache.misses)
 
 #######################################################
 ### Let's unpickle
 #######################################################
     # reinstate ls for newly created files
-    if sys.version_info[0] < 3:
-        ls = os.listdir('.')
-    else:
-        ls = os.listdir()
-
-    pickle_files = []
-    for i in range(0,len(ls)):
-    # pickle_files = lsit of all the pickle file names in str
-        if ls[i][-2:] == '.p':
-            pickle_files.append(str(ls[i]))
-    pickle_files.sort()
-    print('all that pickles! ~_@' + str(pickle_files))
+    pickle_files = sorted([os.path.join(recordDir, f) for f in os.listdir(recordDir) if f[-2:] == '.p'])
+    print('all that pickles! ~_@' + str([os.path.basename(f) for f in pickle_files]))
+    pool_key = json_sha(table.total_list)
 
     # now main loop part... going through each pickle
     for p in range(0,len(pickle_files)):
-        objects = []
         pickleFile = pickle_files[p]
-        with (open(pickleFile, 'rb')) as openfile:
-            while True:
-                try:
-                    objects.append(pickle.load(openfile))
-                except EOFError:
-                    break
-        print(len(pickle_files))
-        trial_stim = eval('stim_trial%d'% (p+1))
-        trial_stim_flat = eval('stim_trial_flat%d'% (p+1))
-
-    # save a text file with all the unpickle for backup
-        temp_text = pickleFile[:-6]
-        unpickled = temp_text + '_T' + str(p+1) + '[FULL-TEXT].txt'
-        f=open(unpickled,'w')
-        f.write(str(objects))
-        f.close()
-        with open(unpickled, 'r') as f:
-            unpickled_text = f.read().splitlines()
-            # unpickled_text = f.read().split(" ")
-
-    # initial filtering: extract out lines with 'transcript'
-        recalled_words = []
-        seconds = []
-        nanos = []
-        start_time = []
-        end_time = []
-        count = False
-        for i in range(0, len(unpickled_text)):
-            if 'transcript' in unpickled_text[i]:
-                recalled_words.append(unpickled_text[i])
-        # parse out timing
-            if 'start_time' in unpickled_text[i]:
-                if ('seconds' in unpickled_text[i+1]) or ('nanos' in unpickled_text[i+1]):
-                    start_time.append(unpickled_text[i+1])
-                if 'nanos' in unpickled_text[i+2]:
-                    start_time.append(unpickled_text[i+2])
-            if 'end_time' in unpickled_text[i]:
-                if ('seconds' in unpickled_text[i+1]) or ('nanos' in unpickled_text[i+1]):
-                    end_time.append(unpickled_text[i+1])
-                if 'nanos' in unpickled_text[i+2]:
-                    end_time.append(unpickled_text[i+2])
-
-#### Onset / Offset cleaning
-        # for extracting onset/offset time
-        # remove random spaces
-        for i in range(0,len(start_time)):
-            start_time[i] = ' '.join(start_time[i].split())
-        for i in range(0,len(end_time)):
-            end_time[i] = ' '.join(end_time[i].split())
-
-        # check if seconds/nanos are alternating and find missing spots
-        for i in range(0, len(start_time)):
-            try:
-                # set the starting
-                if 'nanos' in start_time[0]:
-                    start_time[0:0] = ['seconds: 0']
-                # if nanos is missing
-                if 'seconds' in start_time[i] and 'nanos' not in start_time[i+1]:
-                    start_time[i+1:i+1] = ['nanos: 0000']
-                # if seconds is missing
-                if 'nanos' in start_time[i] and 'seconds' not in start_time[i+1]:
-                    start_time[i+1:i+1] = ['seconds: 0']
-            except IndexError:
-                pass
-
-        # check the same for end_time
-        for i in range(0, len(end_time)):
-            try:
-                # set the starting
-                if 'nanos' in start_time[0]:
-                    end_time[0:0] = ['seconds: 0']
-                # if nanos is missing
-                if 'seconds' in end_time[i] and 'nanos' not in end_time[i+1]:
-                    end_time[i+1:i+1] = ['nanos: 0000']
-                # if seconds is missing
-                if 'nanos' in end_time[i] and 'seconds' not in end_time[i+1]:
-                    end_time[i+1:i+1] = ['seconds: 0']
-            except IndexError:
-                pass
-
-        # extract only the digits for start_time
-        for i in range(0,len(start_time)):
-            a = start_time[i].split()
-            start_time[i]=[str(s) for s in a if s.isdigit()]
-        # extract only the digits for end_time
-        for i in range(0,len(end_time)):
-            a = end_time[i].split()
-            end_time[i]=[str(s) for s in a if s.isdigit()]
-
-        # shorten the numbers if len exceeds 2
-        for i in range(0,len(start_time)):
-            if len(start_time[i][0]) >= 2:
-                start_time[i][0] = start_time[i][0][:2]
-        for i in range(0,len(end_time)):
-            if len(end_time[i][0]) >= 2:
-                end_time[i][0] = end_time[i][0][:2]
-
-        # merge seconds and nanos into one time format
-        flat_start = []
-        flat_end = []
-        numbers = range(0, len(start_time)+1)
-        evens = [n for n in numbers if n % 2 == 0]
-        for i in range(0,len(start_time)):
-            if i in evens:
-                try:
-                    temp= start_time[i][0] + '.' + start_time[i+1][0]
-                    flat_start.append(temp)
-                except IndexError:
-                    pass
-
-        numbers = range(0, len(end_time)+1)
-        evens = [n for n in numbers if n % 2 == 0]
-        for i in range(0,len(end_time)):
-            if i in evens:
-                try:
-                    temp= end_time[i][0] + '.' + end_time[i+1][0]
-                    flat_end.append(temp)
-                except IndexError:
-                    pass
-
-
-#### back to cleaning text file
-        for i in range(0, len(recalled_words)):
-            recalled_words[i] = recalled_words[i].split(" ")
-            recalled_words[i] = recalled_words[i][5:]
-
-    # flattens out the list to individual item index
-        flat_list = []
-        for sublist in recalled_words:
-            for item in sublist:
-                flat_list.append(item)
-
-    # cleaning text file
-    # remove '"' in front and end of items
-        while '"' in flat_list:
-            try:
-                for i in range(0, len(flat_list)):
-                    if flat_list[i] == '"':
-                        flat_list.remove(flat_list[i])
-            except IndexError:
-                pass
-        for i in range(0, len(flat_list)):
-            if flat_list[i][0] == '"':
-                flat_list[i] = flat_list[i][1:]
-        for i in range(0, len(flat_list)):
-            if flat_list[i][-1] == '"':
-                flat_list[i] = flat_list[i][:-1]
-
-    # zip the words to corresponding onset/offset timing
-        timing = list(zip(flat_list,flat_start,flat_end))
-
-        # check for repeats & mark them
-        uniq = []
-        reps = []
-        for i in range(0, len(flat_list)):
-            if flat_list[i] in uniq:
-                reps.append(flat_list[i])
-                flat_list[i] = flat_list[i] + '_repeat'
-            if flat_list[i] not in uniq:
-                uniq.append(flat_list[i])
-
-    # compare recalled items to actual wordpool
-        final_list = []
-        intrusion_list = []
-
-        for j in range(0, len(flat_list)):
-            for k in range(0, len(trial_stim)):
-
-            # ADD EXCEPTION CASES ---------------------------------------------
-            # 'white' and 'house' are both common words
-                if (flat_list[j].lower() == 'white') and (flat_list[j+1].lower() == 'house') and ('White House' in trial_stim):
-                    final_list.append('White House')
-                    intrusion_list.append(0)
-                    break
-
-            # ######################---------------------------------------------
-            # compare list to stim trial and check if it's correct
-                if flat_list[j].lower() in uniqueWords:
-                    if (flat_list[j].lower() in trial_stim[k].lower()) and (trial_stim[k] not in final_list):
-                        final_list.append(trial_stim[k])
-                        intrusion_list.append(0)
-                        break
-
-            # checks for intrusion/unidentified words
-                if flat_list[j].lower() not in trial_stim_flat:
-                    final_list.append(flat_list[j])
-                    intrusion_list.append(1)
-                    break
-
-    # get category list array
-        category_list = [0] * len(final_list)
-
-        for i in range(0,len(final_list)):
-            if final_list[i] in cel_list:
-                category_list[i] = 1
-            if final_list[i] in loc_list:
-                category_list[i] = 2
-            if final_list[i] in obj_list:
-                category_list[i] = 3
-
-    # pairing start/end time of each word
-        onset = [0] * len(final_list)
-        offset = [0] * len(final_list)
-
-        for i in range(0,len(final_list)):
-            # if length of final list item is exactly 1 word
-            if len(final_list[i].split()) == 1:
-                for j in range(0, len(timing)):
-                    if timing[j][0].lower() == final_list[i].split()[0].lower():
-                        onset[i] = timing[j][1]
-                        offset[i] = timing[j][2]
-            # if length of final list item is more than 1 word
-            if len(final_list[i].split()) >= 2:
-                for j in range(0, len(timing)):
-                    if timing[j][0].lower() == final_list[i].split()[0].lower():
-                        onset[i] = timing[j][1]
-                    if timing[j][0].lower() == final_list[i].split()[-1].lower():
-                        offset[i] = timing[j][2]
-
-        # remove '_repeat' tags
-        for i in range(0,len(final_list)):
-            if '_repeat' in final_list[i]:
-                final_list[i] = final_list[i][:-7]
-                intrusion_list[i] = -1
+        wavFile = pickleFile[:-2]
+        trial_stim = stim_trials[p]
+        with stats.stage('hash', trial=p+1):
+            pickle_sha = file_sha(pickleFile)
+        stim_key = json_sha([pool_key, trial_stim])
+
+    # reuse the stored rows if nothing about this trial changed
+        rows = state.cached_rows(wavFile, pickle_sha, stim_key, SCORING_VERSION)
+        if rows is not None:
+            add_trial(columns, trialN=p+1, **rows)
+            stats.count('trials_unchanged')
+            print('TRIAL ' + str(p+1) + ' (unchanged)', rows['item'])
+            continue
+
+        with stats.stage('unpickle', trial=p+1):
+            objects = load_pickle(pickleFile)
+
+    # optional: save a text file with all the unpickle for debugging
+        if debug:
+            temp_text = pickleFile[:-6]
+            unpickled = temp_text + '_T' + str(p+1) + '[FULL-TEXT].txt'
+            with open(unpickled, 'w') as f:
+                f.write(str(objects))
+
+        with stats.stage('score', trial=p+1):
+            words, word_onset, word_offset, rows = score_trial(objects, trial_stim, table)
+        stats.count('trials_scored')
+        stats.count('words', len(words))
+        stats.count('items', len(rows['item']))
 
     # save to pandas dataframe & save as csv
-        index = range(1,len(final_list)+1)
-        recall_data = {'trialN': p+1, 'index': index, 'item': final_list, 'category': category_list, 'intrusion': intrusion_list, 'onset':onset, 'offset':offset}
-
-        temp_df = pd.DataFrame(data=recall_data)
-        temp_df = temp_df.reindex(columns=col_order)
-        df = df.append(temp_df)
+        rows = plain_rows(rows)
+        add_trial(columns, trialN=p+1, **rows)
+        state.store_rows(wavFile, pickle_sha, stim_key, SCORING_VERSION, rows)
 
-    # delete the erroroneous .txt file created from quail
+    # delete the erroroneous .txt file created from quail (older runs only)
         temp_text = pickleFile[:-2]
-        os.remove(temp_text + '.txt')
+        if os.path.isfile(temp_text + '.txt'):
+            os.remove(temp_text + '.txt')
 
     # create easy-to-read textfile
         temp_text = pickleFile[:-6]
         timingTxt = temp_text + '_T' + str(p+1) + '[EASY-READ].txt'
-        with open(timingTxt, 'w') as f:
-            for item in timing:
-                f.write("%s\n" % (item,))
+        with stats.stage('write', trial=p+1):
+            with open(timingTxt, 'w') as f:
+                for j in range(0, len(words)):
+                    f.write("%s\n" % ((words[j], float(word_onset[j]), float(word_offset[j])),))
 
     # print summary of trial recalled items
-        print('TRIAL ' + str(p+1) ,final_list)
-
-    df = df.reindex(columns=col_order)
-
-    df.to_csv(subj + '[ANNOTATION].csv', sep=',',index = False)
-
-## go back to original file
-    filename = os.path.join(pwdDir + '/..')
-    os.chdir(filename)
+        print('TRIAL ' + str(p+1) ,rows['item'])
+    state.save()
+
+    # frame is built once from the gathered columns
+    with stats.stage('annotation'):
+        df = annotation_frame(columns, col_order)
+        write_annotation(df, os.path.join(recordDir, subj + '[ANNOTATION]'), formats=formats)
+    stats.count('trials', len(pickle_files))
+    stats.save(os.path.join(recordDir, subj + '[STATS]'))
+    print('decoded ' + subj + ' in ' + '%.1f' % stats.finished + 's')
+    return df
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='decode and score all recall wav files of a subject')
+    parser.add_argument('subj')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--no-cache', action='store_true', help='always call the recognizer')
+    parser.add_argument('--refresh', action='store_true', help='re-decode and overwrite cached responses')
+    parser.add_argument('--debug', action='store_true', help='save [FULL-TEXT].txt of every response')
+    parser.add_argument('--force', action='store_true', help='ignore saved state, redo every trial')
+    parser.add_argument('--backend', default='quail', choices=BACKENDS)
+    parser.add_argument('--model', default=None, help='vosk model folder (--backend vosk)')
+    parser.add_argument('--fixtures', default=None, help='fixture folder (--backend fixture)')
+    parser.add_argument('--stream', action='store_true', help='same as --backend google-stream')
+    parser.add_argument('--chunk-sec', type=float, default=0.5)
+    parser.add_argument('--vad', action='store_true', help='only send the speech segments of each wav')
+    parser.add_argument('--profile', action='store_true', help='save a cProfile dump of the run')
+    parser.add_argument('--format', action='append', choices=['csv', 'parquet', 'feather'],
+                        help='annotation output format(s), default csv')
+    args = parser.parse_args()
+    decode(args.subj, max_workers=args.workers, cache=not args.no_cache, refresh=args.refresh,
+           debug=args.debug, formats=tuple(args.format or ['csv']), force=args.force,
+           stream=args.stream, chunk_sec=args.chunk_sec, vad=args.vad,
+           profile=args.profile, backend=args.backend, model_path=args.model, fixture_dir=args.fixtures)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+per-subject decode state for incremental / resumable runs
+
+record/<subj>[STATE].json keeps, for every trial wav:
+    wav_sha         : sha256 of the wav bytes when it was decoded
+    pickle          : response pickle written for it
+    pickle_sha      : sha256 of that pickle when it was scored
+    stim_key        : hash of the trial's stimulus list
+    scoring_version : version of the scoring code that produced the rows
+    rows            : the trial's annotation columns
+    rows_sha        : checksum of rows
+decode() only re-decodes wavs that are new or changed (or lost their pickle)
+and only re-scores trials whose pickle, stimuli or scoring version changed;
+the [ANNOTATION] table is rebuilt from the stored rows
+"""
+import hashlib
+import json
+import os
+
+from transcription_cache import wav_sha
+
+STATE_VERSION = 1
+
+
+def file_sha(path):
+    return wav_sha(path)
+
+
+def json_sha(obj):
+    blob = json.dumps(obj, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(blob).hexdigest()
+
+
+def plain_rows(columns):
+    """
+    annotation columns as json friendly lists (numpy values -> python values)
+    """
+    rows = {}
+    for name in columns:
+        values = columns[name]
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        rows[name] = [v.item() if hasattr(v, 'item') else v for v in values]
+    return rows
+
+
+class DecodeState(object):
+    """
+    Help: state = DecodeState('record/subj[STATE].json')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    saved = json.load(f)
+                if saved.get('version') == STATE_VERSION:
+                    self.trials = saved.get('trials', {})
+            except ValueError:
+                print('unreadable state file ' + path + ', starting over')
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': STATE_VERSION, 'trials': self.trials}, f)
+        os.replace(tmp, self.path)
+
+    def needs_decode(self, wav_file, sha):
+        """
+        True if wav_file is new, changed since it was decoded, or its pickle is gone
+        """
+        entry = self.trials.get(os.path.basename(wav_file))
+        if entry is None or entry.get('wav_sha') != sha:
+            return True
+        return not os.path.isfile(wav_file + '.p')
+
+    def mark_decoded(self, wav_file, sha):
+        entry = self.trials.setdefault(os.path.basename(wav_file), {})
+        if entry.get('wav_sha') != sha:
+            # new audio, stored rows no longer apply
+            entry.pop('rows', None)
+        entry['wav_sha'] = sha
+        entry['pickle'] = os.path.basename(wav_file) + '.p'
+
+    def cached_rows(self, wav_file, pickle_sha, stim_key, scoring_version):
+        """
+        stored annotation columns of a trial, or None if it has to be scored again
+        """
+        entry = self.trials.get(os.path.basename(wav_file))
+        if entry is None or 'rows' not in entry:
+            return None
+        if (entry.get('pickle_sha') != pickle_sha or entry.get('stim_key') != stim_key or
+                entry.get('scoring_version') != scoring_version):
+            return None
+        if json_sha(entry['rows']) != entry.get('rows_sha'):
+            return None
+        return entry['rows']
+
+    def store_rows(self, wav_file, pickle_sha, stim_key, scoring_version, rows):
+        entry = self.trials.setdefault(os.path.basename(wav_file), {})
+        entry['pickle_sha'] = pickle_sha
+        entry['stim_key'] = stim_key
+        entry['scoring_version'] = scoring_version
+        entry['rows'] = rows
+        entry['rows_sha'] = json_sha(rows)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+append-only events file for the presentation scripts
+
+the experiment used to rebuild the whole events dataframe and rewrite the
+csv after every item, so the write got slower as the session went on and ran
+inside the isi. EventWriter keeps the file open and writes only the rows of
+the item that just finished, then flushes (a crash loses at most the item
+being shown, like before) and fsyncs according to the policy:
+
+    fsync_every=1  fsync after every write (also survives power loss)
+    fsync_every=n  fsync every n writes
+    fsync_every=0  only on sync()/close()
+
+formats (any combination, same rows in each):
+    csv     : same columns/text as the old events.to_csv
+    arrow   : arrow ipc stream, one record batch per write; readable up to the
+              last complete batch after a crash (pyarrow.ipc.open_stream)
+    parquet : one row group per write; the footer is only written by close(),
+              so keep csv or arrow next to it for crash safety
+arrow/parquet need pyarrow (imported only when asked for)
+"""
+import csv
+import os
+
+FORMATS = {'csv': '.csv', 'arrow': '.arrow', 'parquet': '.parquet'}
+NUMERIC_COLUMNS = ['trialtime', 'duration', 'rt', 'isi']
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value):
+    if value is None:
+        return None
+    return str(value)
+
+
+class EventWriter(object):
+    """
+    Help: events = EventWriter('data/s1/events/s1_events', col_names, formats=('csv',))
+    events.write(type=[...], item=[...], trialtime=[...], isi=5)   # one item's rows
+    events.close()
+    columns are written in the order of col_names; scalar values are repeated
+    to the length of the other columns (as in a pandas column assignment)
+    """
+
+    def __init__(self, stem, col_names, formats=('csv',), fsync_every=1, numeric=NUMERIC_COLUMNS):
+        for fmt in formats:
+            if fmt not in FORMATS:
+                raise ValueError('unknown events format: ' + str(fmt))
+        self.col_names = list(col_names)
+        self.fsync_every = fsync_every
+        self.numeric = set(numeric)
+        self.n_writes = 0
+        self.n_rows = 0
+        self.paths = [stem + FORMATS[fmt] for fmt in formats]
+        self._files = []
+        self._csv = None
+        self._arrow = None
+        self._parquet = None
+
+        if 'csv' in formats:
+            f = open(stem + FORMATS['csv'], 'w', newline='')
+            self._csv = csv.writer(f)
+            self._csv.writerow(self.col_names)
+            f.flush()
+            self._files.append(f)
+        if 'arrow' in formats or 'parquet' in formats:
+            try:
+                import pyarrow as pa
+            except ImportError:
+                raise ImportError('arrow/parquet events need pyarrow (pip install pyarrow)')
+            self._pa = pa
+            self.schema = pa.schema([(c, pa.float64() if c in self.numeric else pa.string())
+                                     for c in self.col_names])
+            if 'arrow' in formats:
+                f = open(stem + FORMATS['arrow'], 'wb')
+                self._arrow = pa.ipc.new_stream(f, self.schema)
+                self._files.append(f)
+            if 'parquet' in formats:
+                import pyarrow.parquet as pq
+                f = open(stem + FORMATS['parquet'], 'wb')
+                self._parquet = pq.ParquetWriter(f, self.schema)
+                self._files.append(f)
+
+    def _columns(self, values):
+        n = None
+        for name in self.col_names:
+            value = values.get(name)
+            if isinstance(value, (list, tuple)):
+                n = len(value)
+                break
+        if n is None:
+            n = 1
+        columns = []
+        for name in self.col_names:
+            value = values.get(name)
+            if isinstance(value, (list, tuple)):
+                if len(value) != n:
+                    raise ValueError('events column ' + name + ' has ' + str(len(value)) +
+                                     ' values, expected ' + str(n))
+                columns.append(list(value))
+            else:
+                columns.append([value] * n)
+        return n, columns
+
+    def write(self, **values):
+        """
+        appends the rows of one item (or trial) and flushes; returns the number of rows
+        """
+        n, columns = self._columns(values)
+        if n == 0:
+            return 0
+        if self._csv is not None:
+            self._csv.writerows(zip(*columns))
+        if self._arrow is not None or self._parquet is not None:
+            arrays = [self._pa.array([_number(v) for v in col], type=self._pa.float64())
+                      if name in self.numeric else self._pa.array([_text(v) for v in col], type=self._pa.string())
+                      for name, col in zip(self.col_names, columns)]
+            batch = self._pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+            if self._arrow is not None:
+                self._arrow.write_batch(batch)
+            if self._parquet is not None:
+                self._parquet.write_table(self._pa.Table.from_batches([batch]))
+        self.n_writes = self.n_writes + 1
+        self.n_rows = self.n_rows + n
+        self.flush(fsync=self.fsync_every > 0 and self.n_writes % self.fsync_every == 0)
+        return n
+
+    def flush(self, fsync=False):
+        for f in self._files:
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def sync(self):
+        self.flush(fsync=True)
+
+    def close(self):
+        if self._arrow is not None:
+            self._arrow.close()
+            self._arrow = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        for f in self._files:
+            if not f.closed:
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+        self._csv = None
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+dropped-frame / flip jitter monitor for the presentation loops
+
+FlipMonitor.install() wraps win.flip so every flip of the script is recorded
+without touching the call sites: the flip time goes into a preallocated
+numpy ring buffer (the last `capacity` flips, for looking at a bad stretch
+after the fact) and the interval to the previous flip is added to the
+counters of the current routine (set_routine('fixation') when a routine
+starts). an interval longer than threshold x the nominal frame duration
+counts as a dropped frame. all buffers and counters are allocated up front,
+so the per-flip work is a few array stores (no list or dict grows per frame)
+
+pause() before a deliberate gap between flips (core.wait, waitKeys, the
+recording) keeps that gap from being counted as a drop. end_trial() writes
+one row per routine of the trial to the QC table (trial, routine, frames,
+dropped, max/mean interval) and resets the trial counters
+"""
+import csv
+import time
+
+import numpy as np
+
+QC_COLUMNS = ['trial', 'routine', 'n_frames', 'n_dropped', 'max_interval_ms', 'mean_interval_ms']
+
+
+class FlipMonitor(object):
+    """
+    Help: flips = FlipMonitor(win, timing.frame_dur, 'data/s1_frames.csv', ['fixation', 'math', 'stim_pres'])
+    flips.install()                 # every win.flip() is recorded from now on
+    flips.set_routine('fixation')   # at the start of a routine
+    flips.pause()                   # before a deliberate wait between flips
+    flips.end_trial('t3_1')         # QC rows of the trial
+    flips.close()                   # -> session summary per routine
+    """
+
+    def __init__(self, win, frame_dur, path, routines, threshold=1.5, capacity=8192, clock=time.perf_counter):
+        self.win = win
+        self.clock = clock
+        self.frame_dur = frame_dur
+        self.limit = threshold * frame_dur
+        self.routines = ['other'] + [r for r in routines if r != 'other']
+        self.routine_ids = dict((r, k) for k, r in enumerate(self.routines))
+        size = 1
+        while size < capacity:
+            size = size * 2
+        self.mask = size - 1
+        self.times = np.zeros(size, dtype=np.float64)
+        self.flip_routine = np.zeros(size, dtype=np.int16)
+        self.n_flips = 0
+        n = len(self.routines)
+        self.n_frames = np.zeros(n, dtype=np.int64)
+        self.n_dropped = np.zeros(n, dtype=np.int64)
+        self.max_interval = np.zeros(n, dtype=np.float64)
+        self.sum_interval = np.zeros(n, dtype=np.float64)
+        self.total_frames = np.zeros(n, dtype=np.int64)
+        self.total_dropped = np.zeros(n, dtype=np.int64)
+        self.total_max = np.zeros(n, dtype=np.float64)
+        self._rid = 0
+        self._last = None
+        self._flip = None
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(QC_COLUMNS)
+        self._file.flush()
+
+    def install(self):
+        flip = self.win.flip
+        record = self.record
+        clock = self.clock
+
+        def monitored_flip(clearBuffer=True):
+            t = flip(clearBuffer)
+            record(t if t is not None else clock())
+            return t
+        self._flip = flip
+        self.win.flip = monitored_flip
+        return self
+
+    def uninstall(self):
+        if self._flip is not None:
+            self.win.flip = self._flip
+            self._flip = None
+
+    def set_routine(self, name):
+        self._rid = self.routine_ids.get(name, 0)
+
+    def pause(self):
+        self._last = None
+
+    def record(self, t):
+        k = self.n_flips & self.mask
+        self.times[k] = t
+        rid = self._rid
+        self.flip_routine[k] = rid
+        self.n_flips = self.n_flips + 1
+        if self._last is not None:
+            dt = t - self._last
+            self.n_frames[rid] += 1
+            self.sum_interval[rid] += dt
+            if dt > self.limit:
+                self.n_dropped[rid] += 1
+            if dt > self.max_interval[rid]:
+                self.max_interval[rid] = dt
+        self._last = t
+
+    def recent(self, n=None):
+        """
+        (flip times, routine names) of the last n recorded flips, oldest first
+        """
+        n = min(self.n_flips, self.mask + 1) if n is None else min(n, self.n_flips, self.mask + 1)
+        idx = (np.arange(self.n_flips - n, self.n_flips) & self.mask)
+        return self.times[idx].copy(), [self.routines[r] for r in self.flip_routine[idx]]
+
+    def end_trial(self, trial):
+        for rid in np.nonzero(self.n_frames)[0]:
+            n = self.n_frames[rid]
+            self._writer.writerow([trial, self.routines[rid], n, self.n_dropped[rid],
+                                   '%.2f' % (1000 * self.max_interval[rid]),
+                                   '%.2f' % (1000 * self.sum_interval[rid] / n)])
+        self._file.flush()
+        self.total_frames += self.n_frames
+        self.total_dropped += self.n_dropped
+        np.maximum(self.total_max, self.max_interval, out=self.total_max)
+        self.n_frames[:] = 0
+        self.n_dropped[:] = 0
+        self.max_interval[:] = 0
+        self.sum_interval[:] = 0
+
+    def summary(self):
+        return dict((r, {'frames': int(self.total_frames[k]), 'dropped': int(self.total_dropped[k]),
+                         'max_interval_ms': round(1000 * float(self.total_max[k]), 2)})
+                    for k, r in enumerate(self.routines) if self.total_frames[k])
+
+    def close(self, trial='end'):
+        """
+        writes what's left as a last trial, restores win.flip and returns summary()
+        """
+        if self.n_frames.any():
+            self.end_trial(trial)
+        self.uninstall()
+        self._file.close()
+        return self.summary()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+durations in frames of the measured refresh rate, and an onset log
+
+the presentation loops count frames, and the counts were written for a
+60 Hz monitor (dur*60, +30/+60/+150 ...), so on a 120 or 144 Hz monitor every
+interval came out 2-2.4x too short. FrameTiming converts the durations in
+seconds to frame counts of the rate measured with win.getActualFrameRate()
+(60 Hz if it couldn't be measured), and schedule() lays out the segments of
+a routine as start frames:
+
+    timing = FrameTiming(win.getActualFrameRate())
+    start = timing.schedule([('buffer', 1.0), ('fixation', 1.0), ('target', 0.5)])
+    # {'buffer': 0, 'fixation': 60, 'target': 120, 'end': 150} at 60 Hz
+
+OnsetLog writes the intended and the actual (flip time) onset of every
+event next to the data: one row per event with both in frames and seconds
+from the start of the trial, and the difference in ms. events that only
+last as long as the subject takes (math problems, answers) have no intended
+onset and are logged with the actual one only
+"""
+import csv
+import time
+from collections import OrderedDict
+
+ONSET_COLUMNS = ['trial', 'event', 'intended_frame', 'actual_frame', 'intended_onset', 'actual_onset', 'error_ms']
+
+
+class FrameTiming(object):
+    """
+    Help: timing = FrameTiming(expInfo['frameRate']); timing.frames(2.5) -> 150 at 60 Hz, 300 at 120 Hz
+    """
+
+    def __init__(self, frame_rate=None, default_rate=60.0):
+        self.measured = frame_rate
+        self.rate = float(frame_rate) if frame_rate else float(default_rate)
+        self.frame_dur = 1.0 / self.rate
+
+    def frames(self, seconds, truncate=False):
+        """
+        number of frames closest to seconds (at least 1 for a positive duration, 0 otherwise)
+        truncate=True: whole frames before seconds, like the old int(sec*60) frame indices
+        """
+        if seconds <= 0:
+            return 0
+        if truncate:
+            return int(seconds * self.rate)
+        return max(1, int(round(seconds * self.rate)))
+
+    def seconds(self, n_frames):
+        return n_frames * self.frame_dur
+
+    def schedule(self, segments, start=0):
+        """
+        start frame of each (name, seconds) segment played back to back, plus 'end'
+        """
+        starts = OrderedDict()
+        frame = start
+        for name, seconds in segments:
+            starts[name] = frame
+            frame = frame + self.frames(seconds)
+        starts['end'] = frame
+        return starts
+
+
+class OnsetLog(object):
+    """
+    Help: onsets = OnsetLog(win, 'data/s1_onsets.csv', timing)
+    onsets.start_trial('t001')                # before the first flip of the trial
+    onsets.mark('fixS', intended_frame, frameN)  # before the flip that shows the event
+    onsets.mark_now('finK')                   # event between flips (key press, code sent after a flip)
+    onsets.end_trial()                        # writes the trial's rows
+    actual onsets are the flip times (win.callOnFlip), relative to the trial's first flip;
+    intended_frame None: no intended onset
+    """
+
+    def __init__(self, win, path, timing, clock=time.perf_counter):
+        self.win = win
+        self.timing = timing
+        self.clock = clock
+        self.trial = None
+        self._t0 = None
+        self._rows = []
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(ONSET_COLUMNS)
+        self._file.flush()
+
+    def _trial_flip(self):
+        self._t0 = self.clock()
+
+    def _event_flip(self, row):
+        row[4] = self.clock()
+
+    def start_trial(self, trial):
+        if self._rows:
+            self.end_trial()
+        self.trial = trial
+        self._t0 = None
+        self.win.callOnFlip(self._trial_flip)
+
+    def mark(self, event, intended_frame, actual_frame=None):
+        """
+        event shown on the next flip; intended_frame counted from the trial's first flip
+        (actual_frame None: taken from the flip time)
+        """
+        row = [self.trial, event, intended_frame, actual_frame, None]
+        self._rows.append(row)
+        self.win.callOnFlip(self._event_flip, row)
+
+    def mark_now(self, event, intended_frame=None):
+        """
+        event that happened just now, not on a flip
+        """
+        self._rows.append([self.trial, event, intended_frame, None, self.clock()])
+
+    def end_trial(self):
+        for trial, event, intended, frame, flip in self._rows:
+            actual = flip - self._t0 if flip is not None and self._t0 is not None else None
+            if frame is None and actual is not None:
+                frame = int(round(actual * self.timing.rate))
+            intended_sec = self.timing.seconds(intended) if intended is not None else None
+            self._writer.writerow(['' if x is None else x for x in [trial, event, intended, frame]] +
+                                  ['' if intended_sec is None else '%.4f' % intended_sec,
+                                   '' if actual is None else '%.4f' % actual,
+                                   '' if actual is None or intended_sec is None else
+                                   '%.1f' % (1000 * (actual - intended_sec))])
+        self._rows = []
+        self._file.flush()
+
+    def close(self):
+        if self._rows:
+            self.end_trial()
+        self._file.close()
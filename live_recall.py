@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+live (in-session) transcription of the free recall period
+
+a background thread follows the wav file AdvAudioCapture is writing while the
+participant is still recalling, streams the new audio to a recognizer as it
+lands on disk, then scores the trial and writes a provisional annotation
+(record/<subj>_T<n>[ANNOTATION-LIVE].csv) by the time the break screen is up.
+the experiment thread only hands over paths and reads back the counts
+
+the post-session decode_all_wav.decode run stays the reference annotation;
+the live one is for the experimenter between lists
+"""
+import os
+import threading
+import time
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+from annotation_io import new_columns, add_trial, annotation_frame, write_annotation
+from decode_state import plain_rows
+from recall_parse import plain_result
+from recall_stream import google_stream_recognizer, final_results
+from stim_table import get_pool
+from wav_mmap import parse_header
+
+
+def follow_wav(wav_file, done, chunk_sec=1.0, poll=0.05, timeout=10.0):
+    """
+    Help: chunks = follow_wav(path, done_event)
+    generator over a wav file that is still being written: yields PCM chunks
+    (about chunk_sec long) as soon as they are on disk and stops once done is
+    set and the file stops growing. the first item yielded is the WavHeader,
+    so the caller knows the sample rate before the audio starts
+    """
+    t0 = time.time()
+    while not os.path.isfile(wav_file):
+        if done.is_set() or time.time() - t0 > timeout:
+            return
+        time.sleep(poll)
+    with open(wav_file, 'rb') as f:
+        header = None
+        while header is None:
+            finished = done.is_set()  # read before parsing, so a header written just before done isn't missed
+            f.seek(0)
+            header = parse_header(f.read(4096))
+            if header is None:
+                if finished or time.time() - t0 > timeout:
+                    return
+                time.sleep(poll)
+        yield header
+        frame = header.n_channels * header.sample_width
+        chunk_bytes = max(frame, int(chunk_sec * header.sample_rate) * frame)
+        f.seek(header.data_offset)
+        pending = b''
+        while True:
+            data = f.read(chunk_bytes - len(pending))
+            if data:
+                pending = pending + data
+                if len(pending) >= chunk_bytes:
+                    yield pending
+                    pending = b''
+                continue
+            if done.is_set():
+                # recorder is finished: flush what's left (whole frames only)
+                rest = f.read()
+                pending = pending + rest
+                pending = pending[:len(pending) - len(pending) % frame]
+                if pending:
+                    yield pending
+                return
+            time.sleep(poll)
+
+
+class LiveRecallWorker(object):
+    """
+    Help: live = LiveRecallWorker(stim_dir, wav_dir, subj_id, keypath='key.json')
+    live.submit(trialN, wav_file, trial_stim)  # right before mic.record(...)
+    live.recording_done(trialN)                # right after mic.record(...)
+    live.result(trialN)                        # annotation rows or None if not ready
+    live.stop()                                # waits for queued trials
+    recognizer: streaming recognizer (see recall_stream), google by default
+    """
+
+    def __init__(self, stim_dir, wav_dir, subj_id, recognizer=None, keypath=None, chunk_sec=1.0):
+        self.table = get_pool(stim_dir).table
+        self.wav_dir = wav_dir
+        self.subj_id = subj_id
+        self.recognizer = recognizer or google_stream_recognizer(keypath)
+        self.chunk_sec = chunk_sec
+        self._jobs = queue.Queue()
+        self._done = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='live-recall')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, trialN, wav_file, trial_stim):
+        done = threading.Event()
+        with self._lock:
+            self._done[trialN] = done
+        self._jobs.put((trialN, wav_file, list(trial_stim), done))
+
+    def recording_done(self, trialN):
+        with self._lock:
+            done = self._done.get(trialN)
+        if done is not None:
+            done.set()
+
+    def result(self, trialN, timeout=0):
+        """
+        annotation rows of trialN (dict of columns, or {'error': ...} if it
+        failed), waiting up to timeout seconds; None if not done yet
+        """
+        t0 = time.time()
+        while True:
+            with self._lock:
+                if trialN in self._results:
+                    return self._results[trialN]
+            if time.time() - t0 >= timeout:
+                return None
+            time.sleep(0.05)
+
+    def stop(self, timeout=None):
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            trialN, wav_file, trial_stim, done = job
+            try:
+                rows = self._transcribe(trialN, wav_file, trial_stim, done)
+            except Exception as e:
+                print('live recall: trial ' + str(trialN) + ' failed (' + repr(e) + ')')
+                rows = {'error': repr(e)}
+            with self._lock:
+                self._results[trialN] = rows
+
+    def _transcribe(self, trialN, wav_file, trial_stim, done):
+        from decode_all_wav import score_trial
+        chunks = follow_wav(wav_file, done, chunk_sec=self.chunk_sec)
+        header = next(chunks, None)
+        if header is None:
+            raise IOError('no recording at ' + wav_file)
+        results = []
+        for response in self.recognizer(chunks, sample_rate=header.sample_rate, speech_context=trial_stim):
+            results.extend([plain_result(r) for r in final_results(response)])
+
+        words, word_onset, word_offset, rows = score_trial({'results': results}, trial_stim, self.table)
+        rows = plain_rows(rows)
+        columns = new_columns()
+        add_trial(columns, trialN=trialN, **rows)
+        stem = os.path.join(self.wav_dir, self.subj_id + '_T' + str(trialN) + '[ANNOTATION-LIVE]')
+        write_annotation(annotation_frame(columns), stem)
+        return rows
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+non-blocking NetStation event sending for the presentation scripts
+
+egi's Netstation.sync() and send_event() each wait for the amplifier's reply
+over tcp, so calling them inside the frame loop delays win.flip() by the
+round trip. NSDispatcher takes the event timestamp at the call site (same
+ms_localtime clock egi syncs with, so NetStation places the event at the
+moment it was sent from the loop, not when it left the queue), appends it to
+a deque (append/popleft are atomic, no lock is taken in the frame loop) and
+a sender thread does the network part: a sync every sync_every seconds
+(not before every event) and the send_event calls. queue depth and
+call-to-acknowledge latency are kept for the end-of-session report
+
+NetStationStandIn is a local tcp server speaking the egi simple protocol
+(session, attention, time, recording and event messages, each answered like
+NetStation does), for trying the dispatcher without an amplifier:
+
+python ns_dispatch.py --events 500 --delay 0.005
+(uses egi if it imports, else the small ProtocolClient below)
+"""
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from pipeline_stats import percentiles
+
+
+def ms_clock():
+    # same scheme as egi.ms_localtime (ms, modulo 1e6 s) without the wraparound check
+    return int((time.time() % 1000000) * 1000)
+
+
+class NSDispatcher(object):
+    """
+    Help: ns_out = NSDispatcher(ns, clock=egi.ms_localtime)
+    ns_out.send('imgS', label='3', table={'item': 4})   # returns immediately
+    ns_out.stop()  ->  stats dict (sent, failed, syncs, queue_max, latency_ms)
+    ns is a connected egi.simple.Netstation (session begun)
+    """
+
+    def __init__(self, ns, sync_every=5.0, clock=ms_clock, pad=False, max_errors=20):
+        self.ns = ns
+        self.sync_every = sync_every
+        self.clock = clock
+        self.pad = pad
+        self.queue = deque()
+        self.queue_max = 0
+        self.sent = 0
+        self.failed = 0
+        self.syncs = 0
+        self.errors = deque(maxlen=max_errors)
+        self.latency = []
+        self._last_sync = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='ns-dispatch')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, key, label=None, table=None, timestamp=None):
+        """
+        queues an event stamped now (or at timestamp, in clock ms)
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        self.queue.append((time.perf_counter(), timestamp, key, label, table))
+        depth = len(self.queue)
+        if depth > self.queue_max:
+            self.queue_max = depth
+        self._wake.set()
+
+    def _sync(self):
+        self.ns.sync()
+        self.syncs = self.syncs + 1
+        self._last_sync = time.perf_counter()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.sync_every)
+            self._wake.clear()
+            try:
+                if self._last_sync is None or time.perf_counter() - self._last_sync >= self.sync_every:
+                    self._sync()
+            except Exception as e:  # keep the thread alive, the experiment goes on
+                self.errors.append('sync: ' + repr(e))
+                self._last_sync = None
+            while self.queue:
+                queued, timestamp, key, label, table = self.queue.popleft()
+                try:
+                    self.ns.send_event(key=key, label=label, timestamp=timestamp, table=table, pad=self.pad)
+                    self.sent = self.sent + 1
+                except Exception as e:
+                    self.failed = self.failed + 1
+                    self.errors.append(str(key) + ': ' + repr(e))
+                self.latency.append(time.perf_counter() - queued)
+            if self._stopping and not self.queue:
+                return
+
+    def pending(self):
+        return len(self.queue)
+
+    def stats(self):
+        return {'sent': self.sent, 'failed': self.failed, 'syncs': self.syncs,
+                'queue_depth': len(self.queue), 'queue_max': self.queue_max,
+                'latency_ms': percentiles([1000.0 * s for s in self.latency]),
+                'errors': list(self.errors)}
+
+    def stop(self, timeout=10):
+        """
+        sends what is still queued, ends the thread and returns stats()
+        """
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        return self.stats()
+
+
+class NetStationStandIn(object):
+    """
+    Help: server = NetStationStandIn(delay=0.005); ns.connect('127.0.0.1', server.port)
+    answers like NetStation: 'Q'+4 bytes -> 'I'+version, 'T'+4 bytes -> 'Z',
+    'D'+uint16 size+payload -> 'Z', single byte commands (A, B, E, X) -> 'Z'
+    every reply waits delay seconds (a slow link); received events are kept
+    in .events as (key, timestamp ms, label) and .counts per message type
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, version=1):
+        self.delay = delay
+        self.version = version
+        self.events = []
+        self.counts = {}
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.host, self.port = self.server.getsockname()
+        self._thread = threading.Thread(target=self._serve, name='ns-standin')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def _read(conn, n):
+        data = b''
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise EOFError
+            data = data + chunk
+        return data
+
+    def _reply(self, conn, data):
+        if self.delay:
+            time.sleep(self.delay)
+        conn.sendall(data)
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                while True:
+                    code = self._read(conn, 1)
+                    self.counts[code] = self.counts.get(code, 0) + 1
+                    if code == b'Q':
+                        self._read(conn, 4)
+                        self._reply(conn, b'I' + struct.pack('=B', self.version))
+                    elif code == b'T':
+                        self._read(conn, 4)
+                        self._reply(conn, b'Z')
+                    elif code == b'D':
+                        size = struct.unpack('=H', self._read(conn, 2))[0]
+                        payload = self._read(conn, size)
+                        timestamp, _, key = struct.unpack('=2L4s', payload[:12])
+                        n_label = payload[12] if len(payload) > 12 else 0
+                        label = payload[13:13 + n_label]
+                        self.events.append((key.decode('latin-1'), timestamp, label.decode('latin-1')))
+                        self._reply(conn, b'Z')
+                    else:
+                        self._reply(conn, b'Z')
+                        if code == b'X':
+                            break
+            except (EOFError, OSError):
+                pass
+            finally:
+                conn.close()
+
+    def close(self):
+        self.server.close()
+
+
+class ProtocolClient(object):
+    """
+    minimal egi-compatible client (sync + send_event with key/label only) for
+    exercising the dispatcher against the stand-in where egi isn't installed
+    """
+
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _ask(self, message):
+        self.sock.sendall(message)
+        code = NetStationStandIn._read(self.sock, 1)
+        if code == b'I':
+            return NetStationStandIn._read(self.sock, 1)
+        if code != b'Z':
+            raise IOError('unexpected reply ' + repr(code))
+        return True
+
+    def BeginSession(self):
+        return self._ask(b'Q' + b'NTEL')
+
+    def EndSession(self):
+        return self._ask(b'X')
+
+    def sync(self, timestamp=None):
+        self._ask(b'A')
+        return self._ask(b'T' + struct.pack('=L', ms_clock() if timestamp is None else timestamp))
+
+    def send_event(self, key, timestamp=None, label=None, description=None, table=None, pad=False):
+        label = (label or '').encode('latin-1')[:255]
+        description = (description or '').encode('latin-1')[:255]
+        rest = struct.pack('=B', len(label)) + label + struct.pack('=B', len(description)) + description + b'\x00'
+        header = struct.pack('=2L4s', ms_clock() if timestamp is None else timestamp, 1,
+                             key.encode('latin-1')[:4].ljust(4))
+        return self._ask(b'D' + struct.pack('=H', len(header) + len(rest)) + header + rest)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='send events through NSDispatcher to a local NetStation stand-in')
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--delay', type=float, default=0.005, help='stand-in reply delay (s)')
+    parser.add_argument('--interval', type=float, default=1 / 60.0, help='time between events (s, one frame)')
+    parser.add_argument('--sync-every', type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = NetStationStandIn(delay=args.delay)
+    try:
+        import egi.simple as egi
+        ns = egi.Netstation()
+        ns.connect(server.host, server.port)
+    except (ImportError, SyntaxError):  # egi missing (or its python 2 only release)
+        ns = ProtocolClient(server.host, server.port)
+    ns.BeginSession()
+    ns_out = NSDispatcher(ns, sync_every=args.sync_every)
+    call = []
+    for n in range(args.events):
+        t0 = time.perf_counter()
+        ns_out.send('ev%02d' % (n % 100), label='test')
+        call.append(1000.0 * (time.perf_counter() - t0))
+        time.sleep(args.interval)
+    stats = ns_out.stop()
+    stats['call_ms'] = percentiles(call)
+    stats['received'] = len(server.events)
+    ns.EndSession()
+    server.close()
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+per-stage timing and counters for the decode pipeline
+
+decode() wraps each stage (hashing, recognizer calls, unpickling, scoring,
+writing) in a stage timer and counts words, trials and cache hits; at the end
+the run is written as record/<subj>[STATS].json (summary) and [STATS].csv
+(one row per timed stage call). cohort_decode collects the per-subject
+summaries and adds percentiles across subjects to its manifest
+
+decode(profile=True) additionally runs the decode under cProfile and saves
+record/<subj>[STATS].prof (open with pstats or snakeviz); cProfile only sees
+the main thread, recognizer calls in the worker threads show up as waits
+"""
+import contextlib
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+PERCENTILES = [50, 90, 99]
+
+
+def percentiles(values, q=PERCENTILES):
+    """
+    {'p50': .., 'p90': .., 'p99': .., 'mean': .., 'max': .., 'n': ..} of values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {'n': 0}
+    summary = dict(('p' + str(p), float(v)) for p, v in zip(q, np.percentile(values, q)))
+    summary['mean'] = float(values.mean())
+    summary['max'] = float(values.max())
+    summary['n'] = int(len(values))
+    return summary
+
+
+@contextlib.contextmanager
+def no_stage(name, trial=None):
+    # stand-in for PipelineStats.stage where nothing is timed
+    yield
+
+
+class PipelineStats(object):
+    """
+    Help: stats = PipelineStats('cdcatmr011')
+    with stats.stage('score', trial=3): ...
+    stats.count('words', 12)
+    stats.summary()            -> dict (wall time, per stage, per trial, counters)
+    stats.save('record/subj[STATS]') writes .json + .csv (+ .prof)
+    profile=True runs cProfile from here until save()
+    safe to use from the decode worker threads
+    """
+
+    def __init__(self, subj=None, profile=False):
+        self.subj = subj
+        self.started = time.time()
+        self.finished = None
+        self.records = []
+        self.counters = {}
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name, trial=None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            with self._lock:
+                self.records.append((name, trial, seconds))
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stop(self):
+        if self.finished is None:
+            self.finished = time.perf_counter() - self._t0
+            if self.profiler is not None:
+                self.profiler.disable()
+        return self.finished
+
+    def summary(self):
+        wall = self.finished if self.finished is not None else time.perf_counter() - self._t0
+        stages = {}
+        trials = {}
+        for name, trial, seconds in self.records:
+            stages.setdefault(name, []).append(seconds)
+            if trial is not None:
+                trials[trial] = trials.get(trial, 0.0) + seconds
+        return {'subj': self.subj,
+                'started': self.started,
+                'wall_seconds': wall,
+                'stages': dict((name, dict(percentiles(v), total=float(sum(v))))
+                               for name, v in stages.items()),
+                'trial_seconds': dict((str(t), trials[t]) for t in sorted(trials)),
+                'counters': dict(self.counters)}
+
+    def save(self, stem):
+        """
+        writes stem.json (summary) and stem.csv (every timed stage call)
+        and stem.prof when profiling; returns the written paths
+        """
+        self.stop()
+        paths = [stem + '.json', stem + '.csv']
+        with open(stem + '.json', 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(stem + '.csv', 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['subj', 'stage', 'trial', 'seconds'])
+            for name, trial, seconds in self.records:
+                writer.writerow([self.subj, name, '' if trial is None else trial, '%.6f' % seconds])
+        if self.profiler is not None:
+            self.profiler.dump_stats(stem + '.prof')
+            paths.append(stem + '.prof')
+        return paths
+
+
+def cohort_summary(summaries):
+    """
+    percentiles across subjects of the per-subject summaries (PipelineStats.summary())
+    wall time, total time of every stage, per trial time and every counter
+    """
+    summaries = [s for s in summaries if s]
+    stage_totals = {}
+    counters = {}
+    trial_seconds = []
+    for s in summaries:
+        for name in s.get('stages', {}):
+            stage_totals.setdefault(name, []).append(s['stages'][name]['total'])
+        for name in s.get('counters', {}):
+            counters.setdefault(name, []).append(s['counters'][name])
+        trial_seconds.extend(s.get('trial_seconds', {}).values())
+    return {'n_subjects': len(summaries),
+            'wall_seconds': percentiles([s['wall_seconds'] for s in summaries]),
+            'trial_seconds': percentiles(trial_seconds),
+            'stage_seconds': dict((name, percentiles(v)) for name, v in stage_totals.items()),
+            'counters': dict((name, dict(percentiles(v), total=float(sum(v)))) for name, v in counters.items())}
+
+
+def write_cohort_csv(summaries, path):
+    """
+    one row per subject: wall time, total seconds per stage and counters
+    """
+    summaries = [s for s in summaries if s]
+    stages = sorted(set(name for s in summaries for name in s.get('stages', {})))
+    counters = sorted(set(name for s in summaries for name in s.get('counters', {})))
+    with open(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['subj', 'wall_seconds'] + [n + '_seconds' for n in stages] + counters)
+        for s in summaries:
+            writer.writerow([s['subj'], '%.6f' % s['wall_seconds']] +
+                            ['%.6f' % s['stages'][n]['total'] if n in s['stages'] else '' for n in stages] +
+                            [s['counters'].get(n, '') for n in counters])
+    return path
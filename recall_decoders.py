@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+swappable speech decoding backends
+
+every backend is a quail.decode_speech-like callable
+    decoder(wav_file, speech_context=None, save=False, sample_rate=44100,
+            language_code='en-US', **kwargs)
+that returns a google speech shaped response (results -> alternatives ->
+words with start_time/end_time), so the cache, vad wrapper, pickles and the
+scoring stage work the same whatever produced the transcript, and
+decode_words() gives the same WordTiming records for all of them
+
+backends (get_decoder(name, ...)):
+    quail         : google cloud speech through quail (needs a key + network)
+    google-stream : google streaming recognition in chunks (see recall_stream)
+    vosk          : local offline CPU model (pip install vosk + a downloaded model
+                    folder); no network, no per-trial cost, runs on every core
+    fixture       : deterministic responses for tests: <wav name>.json from a
+                    fixture folder, or words drawn from the speech context
+                    seeded by the wav name
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+
+import numpy as np
+
+from recall_parse import parse_response
+from recall_stream import streaming_decoder, google_stream_recognizer
+from wav_mmap import WavFile
+
+BACKENDS = ['quail', 'google-stream', 'vosk', 'fixture']
+
+
+def seconds_field(seconds):
+    whole = int(seconds)
+    return {'seconds': whole, 'nanos': int(round((seconds - whole) * 1e9))}
+
+
+def timed_response(utterances):
+    """
+    Help: timed_response([[('tom', 1.2, 1.5, 0.9), ('hanks', 1.5, 1.9, 0.8)]])
+    google shaped response dict from utterances, each a list of
+    (word, onset, offset[, confidence]) tuples; one result per utterance
+    """
+    results = []
+    for words in utterances:
+        if not words:
+            continue
+        confs = [w[3] for w in words if len(w) > 3 and w[3] is not None]
+        results.append({'alternatives': [{
+            'transcript': ' '.join(w[0] for w in words),
+            'confidence': float(np.mean(confs)) if confs else None,
+            'words': [{'word': w[0], 'start_time': seconds_field(w[1]), 'end_time': seconds_field(w[2])}
+                      for w in words]}]})
+    return {'results': results}
+
+
+def decode_words(decoder, wav_file, speech_context=None, **kwargs):
+    """
+    Help: words = decode_words(get_decoder('vosk', model_path='model'), 'subj-0.wav')
+    list of WordTiming(word, onset, offset) from any backend
+    """
+    kwargs['return_raw'] = True
+    return list(parse_response(decoder(wav_file, speech_context=speech_context, **kwargs)))
+
+
+def quail_decoder():
+    import quail  # only imported when this backend is used
+    return quail.decode_speech
+
+
+def pcm16_mono(frames):
+    """
+    frames of any sample type/channel count as mono 16 bit PCM bytes
+    """
+    if frames.dtype == np.int16 and frames.shape[1] == 1:
+        return frames.tobytes()
+    x = frames.astype(np.float64)
+    if frames.dtype == np.uint8:
+        x = (x - 128.0) * 256
+    elif frames.dtype == np.int32:
+        x = x / 65536
+    elif frames.dtype.kind == 'f':
+        x = x * 32767
+    return np.clip(x.mean(axis=1), -32768, 32767).astype(np.int16).tobytes()
+
+
+_vosk_models = {}
+_vosk_lock = threading.Lock()
+
+
+def _vosk_model(model_path):
+    # a model is loaded once per process and shared by all threads
+    with _vosk_lock:
+        if model_path not in _vosk_models:
+            from vosk import Model, SetLogLevel
+            SetLogLevel(-1)
+            _vosk_models[model_path] = Model(model_path)
+        return _vosk_models[model_path]
+
+
+def vosk_decoder(model_path, chunk_frames=4000, use_grammar=False):
+    """
+    Help: decoder = vosk_decoder('models/vosk-model-en-us-0.22')
+    offline CPU recognition with vosk (imported on first use)
+    use_grammar=True restricts recognition to the speech context words
+    (only for models with a dynamic graph, e.g. the small ones)
+    """
+    def decode_vosk(wav_file, speech_context=None, save=False, **kwargs):
+        from vosk import KaldiRecognizer
+        wav = WavFile(wav_file)
+        model = _vosk_model(model_path)
+        if use_grammar and speech_context:
+            phrases = [' '.join(name.lower().split()) for name in speech_context] + ['[unk]']
+            recognizer = KaldiRecognizer(model, wav.sample_rate, json.dumps(phrases))
+        else:
+            recognizer = KaldiRecognizer(model, wav.sample_rate)
+        recognizer.SetWords(True)
+
+        utterances = []
+
+        def add(result):
+            words = json.loads(result).get('result', [])
+            utterances.append([(w['word'], w['start'], w['end'], w.get('conf')) for w in words])
+
+        for start in range(0, wav.n_frames, chunk_frames):
+            if recognizer.AcceptWaveform(pcm16_mono(wav.frame_slice(start, start + chunk_frames))):
+                add(recognizer.Result())
+        add(recognizer.FinalResult())
+        return timed_response(utterances)
+    return decode_vosk
+
+
+def fixture_decoder(fixture_dir=None, seed=0, max_words=15):
+    """
+    Help: decoder = fixture_decoder('tests/fixtures')
+    deterministic backend for tests and dry runs, never touches the network
+    <fixture_dir>/<wav file name>.json is returned if it exists; it holds
+    either a google shaped response or a list of [word, onset, offset]
+    otherwise names from speech_context are 'recalled' in an order seeded by
+    the wav file name, spread over the length of the recording
+    """
+    def decode_fixture(wav_file, speech_context=None, save=False, **kwargs):
+        name = os.path.basename(wav_file)
+        if fixture_dir is not None:
+            path = os.path.join(fixture_dir, name + '.json')
+            if os.path.isfile(path):
+                with open(path, 'r') as f:
+                    fixture = json.load(f)
+                if isinstance(fixture, dict):
+                    return fixture
+                return timed_response([[tuple(w) for w in fixture]])
+
+        key = hashlib.sha256((str(seed) + ':' + name).encode('utf-8')).hexdigest()
+        rng = random.Random(int(key[:16], 16))
+        try:
+            length = WavFile(wav_file).duration
+        except (IOError, OSError, ValueError):
+            length = 90.0
+        names = list(speech_context or [])
+        rng.shuffle(names)
+        tokens = []
+        for stim in names[:rng.randint(0, min(max_words, len(names)))]:
+            tokens.extend(stim.split())
+        words = []
+        t = 0.0
+        step = length / (len(tokens) + 1) if tokens else length
+        for token in tokens:
+            t = t + step * rng.uniform(0.5, 1.0)
+            words.append((token, t, t + min(0.4, step / 2), 1.0))
+        return timed_response([words])
+    return decode_fixture
+
+
+def get_decoder(backend='quail', keypath=None, chunk_sec=0.5, model_path=None, fixture_dir=None):
+    """
+    Help: decoder = get_decoder('vosk', model_path='models/vosk-model-en-us-0.22')
+    decoder callable of the named backend (see BACKENDS)
+    """
+    if backend == 'quail':
+        return quail_decoder()
+    if backend == 'google-stream':
+        return streaming_decoder(google_stream_recognizer(keypath), chunk_sec=chunk_sec)
+    if backend == 'vosk':
+        if model_path is None:
+            raise ValueError('the vosk backend needs model_path (a downloaded vosk model folder)')
+        return vosk_decoder(os.path.abspath(model_path))
+    if backend == 'fixture':
+        return fixture_decoder(fixture_dir)
+    raise ValueError('unknown decoder backend: ' + str(backend) + ' (one of ' + ', '.join(BACKENDS) + ')')
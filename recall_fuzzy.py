@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+approximate matching of misrecognized recalls to the stim pool
+
+when a transcript token is not a word of any stimulus name ('hanx', 'acorns',
+'golden gait'), the window of tokens starting there is compared to the pool
+names by edit distance (BK-tree, so only names within the allowed distance
+are visited) and by a soundex key per token (same-sounding spellings). the
+best candidate above min_confidence is returned with a confidence of
+1 - distance / length, and score_tokens scores it like an exact match
+
+only windows holding at least one unknown token are tried, so exactly
+recognized transcripts cost nothing extra
+"""
+
+SOUNDEX_CODES = dict((c, str(d)) for d, letters in enumerate(
+    ['aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r']) for c in letters)
+
+
+def levenshtein(a, b, max_dist=None):
+    """
+    edit distance between a and b; with max_dist, anything farther returns max_dist + 1 early
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if max_dist is not None and len(a) - len(b) > max_dist:
+        return max_dist + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        ca = a[i - 1]
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+        if max_dist is not None and min(current) > max_dist:
+            return max_dist + 1
+        previous = current
+    return previous[-1]
+
+
+def soundex(word):
+    """
+    american soundex code of word ('hanks' -> 'h520'), '' for words without letters
+    """
+    letters = [c for c in word.lower() if c.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0]
+    last = SOUNDEX_CODES.get(letters[0], '')
+    for c in letters[1:]:
+        d = SOUNDEX_CODES.get(c, '')
+        if d and d != '0' and d != last:
+            code = code + d
+        if c not in 'hw':
+            last = d
+    return (code + '000')[:4]
+
+
+def phonetic_key(tokens):
+    return ' '.join(soundex(t) for t in tokens)
+
+
+def max_distance(text):
+    """
+    edit distance allowed for a string of this length
+    """
+    if len(text) < 4:
+        return 0
+    if len(text) < 8:
+        return 1
+    if len(text) < 14:
+        return 2
+    return 3
+
+
+def similarity(a, b, dist=None):
+    if dist is None:
+        dist = levenshtein(a, b)
+    return 1.0 - dist / float(max(len(a), len(b), 1))
+
+
+class BKTree(object):
+    """
+    Help: tree = BKTree(['tom hanks', 'acorn']); tree.search('acorns', 1) -> [('acorn', 1)]
+    """
+
+    def __init__(self, words=()):
+        self.root = None
+        for w in words:
+            self.add(w)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            d = levenshtein(word, node[0])
+            if d == 0:
+                return
+            if d not in node[1]:
+                node[1][d] = (word, {})
+                return
+            node = node[1][d]
+
+    def search(self, word, max_dist):
+        """
+        (word, distance) of every entry within max_dist of word
+        """
+        found = []
+        if self.root is None:
+            return found
+        stack = [self.root]
+        while stack:
+            entry, children = stack.pop()
+            d = levenshtein(word, entry)
+            if d <= max_dist:
+                found.append((entry, d))
+            for k in children:
+                if d - max_dist <= k <= d + max_dist:
+                    stack.append(children[k])
+        return found
+
+
+class FuzzyIndex(object):
+    """
+    Help: fuzzy = FuzzyIndex(pool_index.names, pool_index.unique)
+    fuzzy.match(tokens, start, studied) -> (normalized name, index of last token, confidence) or None
+    names  : normalized name -> stimulus name (keys are space-joined tokens)
+    unique : token found in exactly one name -> that name
+    """
+
+    def __init__(self, names, unique, min_confidence=0.6):
+        self.min_confidence = min_confidence
+        self.vocab = set()
+        self.max_tokens = 1
+        self.name_phonetic = {}
+        for key in names:
+            tokens = key.split()
+            self.vocab.update(tokens)
+            self.max_tokens = max(self.max_tokens, len(tokens))
+            self.name_phonetic.setdefault(phonetic_key(tokens), []).append(key)
+        self.names_tree = BKTree(sorted(names))
+        self.unique = dict(unique)
+        self.token_phonetic = {}
+        for t in unique:
+            self.token_phonetic.setdefault(soundex(t), []).append(t)
+        self.tokens_tree = BKTree(sorted(unique))
+        self._memo = {}
+
+    def _candidates(self, text, tree, phonetic, key):
+        if len(text) < 4:
+            # too short to tell a misspelling from another word
+            return {}
+        candidates = dict(tree.search(text, max_distance(text)))
+        for c in phonetic.get(key, []):
+            if c not in candidates:
+                candidates[c] = levenshtein(text, c)
+        return candidates
+
+    def _window_candidates(self, window):
+        """
+        [(name, distance, matched text)] for a token window, memoized (fillers
+        and misrecognitions repeat a lot across trials)
+        """
+        window = tuple(window)
+        if window in self._memo:
+            return self._memo[window]
+        text = ' '.join(window)
+        found = []
+        for key, dist in self._candidates(text, self.names_tree, self.name_phonetic, phonetic_key(window)).items():
+            name_tokens = key.split()
+            if len(name_tokens) != len(window) and key[0] != text[0]:
+                # split/merged words ('tooth brush') must still start alike,
+                # so a filler in front ('um white house') isn't pulled into the name
+                continue
+            if len(name_tokens) == len(window) and not all(
+                    levenshtein(a, b, max(1, max_distance(b))) <= max(1, max_distance(b)) or soundex(a) == soundex(b)
+                    for a, b in zip(window, name_tokens)):
+                continue
+            found.append((key, dist, key))
+        if len(window) == 1:
+            # one word of a multi-word name ('hanx' -> hanks -> Tom Hanks)
+            for t, dist in self._candidates(text, self.tokens_tree, self.token_phonetic, soundex(text)).items():
+                found.append((self.unique[t], dist, t))
+        if len(self._memo) > 100000:
+            self._memo.clear()
+        self._memo[window] = found
+        return found
+
+    def match(self, tokens, start, studied=()):
+        """
+        best approximate pool name for the tokens starting at start; names on the
+        studied list win ties (and near ties) over names from other lists
+        """
+        best = None
+        n_max = min(self.max_tokens, len(tokens) - start)
+        for n in range(n_max, 0, -1):
+            window = tokens[start:start + n]
+            if not all(window) or all(t in self.vocab for t in window):
+                continue
+            text = ' '.join(window)
+            for key, dist, target in self._window_candidates(window):
+                confidence = similarity(text, target, dist)
+                if confidence < self.min_confidence:
+                    continue
+                rank = (confidence + (0.05 if key in studied else 0), n)
+                if best is None or rank > best[0]:
+                    best = (rank, key, start + n - 1, confidence)
+        if best is None:
+            return None
+        return best[1], best[2], best[3]
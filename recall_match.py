@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+recall-to-wordpool matcher
+
+StimIndex is built once from the whole stimulus pool (total_list):
+    phrase trie : normalized token sequence of every stimulus name -> stimulus,
+                  so any multi-word name (White House, Tom Hanks, ...) is matched
+                  as one item no matter how common its words are
+    unique map  : tokens that occur in exactly one stimulus name -> that stimulus
+    fuzzy index : BK-trees + soundex keys over names and unique tokens, for
+                  misrecognized words (see recall_fuzzy)
+TrialIndex adds the per-trial lookups (which stimuli were studied on the list)
+
+score_tokens walks the transcript once, so scoring is linear in transcript length
+"""
+from collections import Counter
+
+from recall_fuzzy import FuzzyIndex
+
+PUNCTUATION = '.,!?;:"\''
+
+RECALL = 0
+INTRUSION = 1
+REPEAT = -1
+
+
+def normalize(token):
+    """
+    lower case and strip surrounding punctuation of a recognized token
+    """
+    return token.lower().strip(PUNCTUATION)
+
+
+def name_tokens(name):
+    return [normalize(t) for t in name.split() if normalize(t)]
+
+
+class StimIndex(object):
+    """
+    Help: pool_index = StimIndex(cel_list + loc_list + obj_list)
+    """
+
+    def __init__(self, stim_names):
+        self.names = {}      # normalized name -> stimulus name as written in the pool
+        self.trie = {}       # token -> {token -> {... None: normalized name}}
+        token_counts = Counter()
+        token_owner = {}
+        for name in stim_names:
+            tokens = name_tokens(name)
+            if not tokens:
+                continue
+            key = ' '.join(tokens)
+            self.names[key] = ' '.join(name.split())
+            node = self.trie
+            for t in tokens:
+                node = node.setdefault(t, {})
+            node[None] = key
+            for t in set(tokens):
+                token_counts[t] += 1
+                token_owner[t] = key
+        self.unique = dict((t, token_owner[t]) for t in token_counts if token_counts[t] == 1)
+        self.fuzzy = FuzzyIndex(self.names, self.unique)
+
+    def longest_match(self, tokens, start):
+        """
+        longest stimulus name starting at tokens[start]
+        returns (normalized name, index of last token) or (None, start)
+        """
+        node = self.trie
+        match = (None, start)
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if None in node:
+                match = (node[None], i)
+        return match
+
+
+class TrialIndex(object):
+    """
+    Help: trial_index = TrialIndex(trial_stim, pool_index)
+    """
+
+    def __init__(self, trial_stim, pool_index):
+        self.pool = pool_index
+        self.studied = {}    # normalized name -> stimulus name as shown on the trial
+        self.tokens = set()  # every token of every studied name
+        for name in trial_stim:
+            tokens = name_tokens(name)
+            if not tokens:
+                continue
+            self.studied[' '.join(tokens)] = ' '.join(name.split())
+            self.tokens.update(tokens)
+
+    def display(self, key):
+        if key in self.studied:
+            return self.studied[key]
+        return self.pool.names.get(key, key)
+
+
+def score_tokens(words, trial_index, fuzzy=True):
+    """
+    Help: items = score_tokens(words, TrialIndex(trial_stim, pool_index))
+    words : recognized words in spoken order
+    returns a list of (item, intrusion, first, last, confidence), one per scored item:
+        intrusion is 0 (correct recall), 1 (intrusion) or -1 (repeat)
+        first/last are indexes into words of the tokens that made up the item
+        confidence is 1.0 for exact decisions, the similarity for fuzzy matches
+    rules:
+        full stimulus name (any number of words) on the list -> recall, repeat if said before
+        full stimulus name from another list                 -> intrusion
+        word unique to one studied stimulus                  -> recall of that stimulus
+                                                                (dropped if already recalled)
+        shared word of a studied name (e.g. 'the')           -> dropped
+        misrecognized name or unique word (fuzzy=True)       -> as the name it matches
+        anything else                                        -> intrusion, repeat if said before
+    """
+    tokens = [normalize(w) for w in words]
+    recalled = set()
+    intruded = set()
+    items = []
+
+    def add_name(key, first, last, confidence):
+        if key in trial_index.studied:
+            items.append((trial_index.display(key), REPEAT if key in recalled else RECALL, first, last, confidence))
+            recalled.add(key)
+        else:
+            items.append((trial_index.display(key), REPEAT if key in intruded else INTRUSION, first, last, confidence))
+            intruded.add(key)
+
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if not t:
+            i = i + 1
+            continue
+
+        key, last = trial_index.pool.longest_match(tokens, i)
+        if key is not None:
+            add_name(key, i, last, 1.0)
+            i = last + 1
+            continue
+
+        # exact word lookups before any fuzzy matching
+        key = trial_index.pool.unique.get(t)
+        if key is not None and key in trial_index.studied:
+            if key not in recalled:
+                items.append((trial_index.display(key), RECALL, i, i, 1.0))
+                recalled.add(key)
+            i = i + 1
+            continue
+        if t in trial_index.tokens:
+            i = i + 1
+            continue
+
+        if fuzzy:
+            match = trial_index.pool.fuzzy.match(tokens, i, trial_index.studied)
+            if match is not None:
+                key, last, confidence = match
+                # a (misheard) single word of an already recalled name is dropped, like exact ones
+                if not (last == i and key in recalled and len(key.split()) > 1):
+                    add_name(key, i, last, confidence)
+                i = last + 1
+                continue
+
+        items.append((words[i], REPEAT if t in intruded else INTRUSION, i, i, 1.0))
+        intruded.add(t)
+        i = i + 1
+    return items
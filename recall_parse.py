@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+structural parser for recognizer responses
+
+walks the unpickled google speech response objects (or the same structure as
+plain dicts) and yields one WordTiming(word, onset, offset) per recognized
+word, with onset/offset in seconds as floats. replaces dumping str(objects)
+to a text file and scraping 'transcript'/'seconds'/'nanos' lines back out
+
+missing seconds or nanos fields (protobuf leaves zero values out) count as 0
+"""
+from collections import namedtuple
+import datetime
+import pickle
+import numpy as np
+
+WordTiming = namedtuple('WordTiming', ['word', 'onset', 'offset'])
+
+
+def get_field(obj, name, default=None):
+    # dicts (json/cached responses) and response objects look the same from here
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def duration_parts(value):
+    """
+    splits a start_time/end_time field into integer (seconds, nanos)
+    handles protobuf Duration (seconds + nanos), datetime.timedelta,
+    dicts with seconds/nanos, '1.500s' strings and plain numbers
+    """
+    if value is None:
+        return 0, 0
+    if isinstance(value, datetime.timedelta):
+        return value.days * 86400 + value.seconds, value.microseconds * 1000
+    if isinstance(value, str):
+        # decimal string, e.g. '101.25s', parsed without going through float
+        whole, _, frac = value.rstrip('s').partition('.')
+        return int(whole or 0), int((frac + '000000000')[:9])
+    if isinstance(value, (int, float)):
+        seconds = int(value)
+        return seconds, int(round((value - seconds) * 1e9))
+    seconds = get_field(value, 'seconds', 0) or 0
+    nanos = get_field(value, 'nanos', 0) or 0
+    return int(seconds), int(nanos)
+
+
+def duration_seconds(value):
+    """
+    converts a single start_time/end_time field to seconds
+    """
+    seconds, nanos = duration_parts(value)
+    return seconds + nanos / 1e9
+
+
+def iter_results(response):
+    """
+    yields every result in response
+    response can be a single response, or a list of them (one pickle may hold several)
+    """
+    if isinstance(response, (list, tuple)):
+        for r in response:
+            for result in iter_results(r):
+                yield result
+        return
+    for result in get_field(response, 'results', None) or []:
+        yield result
+
+
+def iter_alternatives(response):
+    """
+    yields the top alternative of every result in response
+    """
+    for result in iter_results(response):
+        alternatives = get_field(result, 'alternatives', None) or []
+        if len(alternatives) > 0:
+            yield alternatives[0]
+
+
+def timing_arrays(response):
+    """
+    Help: words, onset, offset = timing_arrays(load_pickle('subj-0.wav.p'))
+    one pass over the response word list; seconds and nanos are gathered as
+    int64 and converted once to float64 onset/offset arrays in seconds (full
+    nanosecond precision, no limit on recording length)
+    alternatives without word timing fall back to the transcript tokens with nan timing
+    """
+    words = []
+    parts = []
+    timed = []
+    for alt in iter_alternatives(response):
+        alt_words = get_field(alt, 'words', None) or []
+        if len(alt_words) == 0:
+            transcript = get_field(alt, 'transcript', '') or ''
+            for token in transcript.split():
+                words.append(token)
+                parts.append((0, 0, 0, 0))
+                timed.append(False)
+            continue
+        for w in alt_words:
+            words.append(get_field(w, 'word', ''))
+            parts.append(duration_parts(get_field(w, 'start_time', None)) +
+                         duration_parts(get_field(w, 'end_time', None)))
+            timed.append(True)
+
+    parts = np.array(parts, dtype=np.int64).reshape(-1, 4)
+    onset = parts[:, 0].astype(np.float64) + parts[:, 1].astype(np.float64) / 1e9
+    offset = parts[:, 2].astype(np.float64) + parts[:, 3].astype(np.float64) / 1e9
+    untimed = ~np.array(timed, dtype=bool)
+    onset[untimed] = np.nan
+    offset[untimed] = np.nan
+    return words, onset, offset
+
+
+def plain_result(result, remap=None):
+    """
+    a result (top alternative only) as plain dicts, so it pickles/caches/parses
+    like any response; remap(seconds, nanos) -> (seconds, nanos) moves word times
+    (e.g. from a cut-down wav back to the original recording)
+    """
+    def plain_duration(value):
+        seconds, nanos = duration_parts(value)
+        if remap is not None:
+            seconds, nanos = remap(seconds, nanos)
+        return {'seconds': seconds, 'nanos': nanos}
+
+    alternatives = []
+    for alt in (get_field(result, 'alternatives', None) or [])[:1]:
+        words = [{'word': get_field(w, 'word', ''),
+                  'start_time': plain_duration(get_field(w, 'start_time', None)),
+                  'end_time': plain_duration(get_field(w, 'end_time', None))}
+                 for w in (get_field(alt, 'words', None) or [])]
+        alternatives.append({'transcript': get_field(alt, 'transcript', ''),
+                             'confidence': get_field(alt, 'confidence', None),
+                             'words': words})
+    return {'alternatives': alternatives}
+
+
+def parse_response(response):
+    """
+    Help: records = list(parse_response(load_pickle('subj-0.wav.p')))
+    yields WordTiming(word, onset, offset) for every word in the response,
+    in the order they were spoken
+    """
+    words, onset, offset = timing_arrays(response)
+    for i in range(0, len(words)):
+        yield WordTiming(words[i], float(onset[i]), float(offset[i]))
+
+
+def load_pickle(pickle_file):
+    """
+    returns every object stored in pickle_file as a list
+    """
+    objects = []
+    with open(pickle_file, 'rb') as openfile:
+        while True:
+            try:
+                objects.append(pickle.load(openfile))
+            except EOFError:
+                break
+    return objects
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+streaming (chunked) recognition of free recall recordings
+
+instead of uploading a whole 90 s wav and waiting for the full result, the wav
+is read in fixed-size frames by a generator and pushed to a streaming
+recognizer chunk by chunk; every final result that comes back is turned into
+WordTiming records right away. only one chunk is held in memory, and the first
+words arrive after roughly one chunk of audio instead of after the whole file
+
+a streaming recognizer is any callable
+    recognizer(chunks, sample_rate=..., speech_context=..., language_code=...)
+that takes an iterator of raw PCM byte chunks and yields response objects (or
+dicts) shaped like google speech streaming responses: results with
+alternatives/words and an is_final flag
+"""
+import time
+
+from recall_parse import WordTiming, timing_arrays, get_field, plain_result
+from wav_mmap import WavFile
+
+
+def wav_info(wav_file):
+    """
+    (sample_rate, n_channels, sample_width in bytes, n_frames) of a wav file
+    """
+    wav = WavFile(wav_file)
+    return wav.sample_rate, wav.n_channels, wav.sample_width, wav.n_frames
+
+
+def wav_chunks(wav_file, chunk_sec=0.5):
+    """
+    Help: for chunk in wav_chunks('subj-0.wav', 0.5): ...
+    yields the PCM payload of wav_file in chunks of chunk_sec seconds
+    (read from the memory-mapped file, one chunk at a time)
+    """
+    wav = WavFile(wav_file)
+    n = max(1, int(round(chunk_sec * wav.sample_rate)))
+    for start in range(0, wav.n_frames, n):
+        yield wav.bytes(start, start + n)
+
+
+def final_results(response):
+    """
+    results of a streaming response that are final (interim guesses are skipped)
+    """
+    return [r for r in (get_field(response, 'results', None) or []) if get_field(r, 'is_final', True)]
+
+
+def stream_decode(wav_file, recognizer, chunk_sec=0.5, speech_context=None, language_code='en-US'):
+    """
+    Help: for w in stream_decode('subj-0.wav', recognizer, chunk_sec=0.5): print(w)
+    streams wav_file to recognizer and yields WordTiming(word, onset, offset)
+    records as soon as each final result comes back
+    """
+    sample_rate = wav_info(wav_file)[0]
+    responses = recognizer(wav_chunks(wav_file, chunk_sec), sample_rate=sample_rate,
+                           speech_context=speech_context, language_code=language_code)
+    for response in responses:
+        finals = final_results(response)
+        if not finals:
+            continue
+        words, onset, offset = timing_arrays({'results': finals})
+        for i in range(0, len(words)):
+            yield WordTiming(words[i], float(onset[i]), float(offset[i]))
+
+
+def streaming_decoder(recognizer, chunk_sec=0.5):
+    """
+    Help: decoder = streaming_decoder(google_stream_recognizer(keypath))
+    wraps a streaming recognizer into a quail.decode_speech-like decoder that
+    returns one response dict with all final results, so it plugs into
+    decode_pool / cached_decoder and the normal unpickle stage
+    """
+    def decode_streaming(wav_file, speech_context=None, save=False, language_code='en-US', **kwargs):
+        sample_rate = wav_info(wav_file)[0]
+        results = []
+        for response in recognizer(wav_chunks(wav_file, chunk_sec), sample_rate=sample_rate,
+                                   speech_context=speech_context, language_code=language_code):
+            results.extend([plain_result(r) for r in final_results(response)])
+        return {'results': results}
+    return decode_streaming
+
+
+def google_stream_recognizer(keypath=None, max_alternatives=1):
+    """
+    Help: recognizer = google_stream_recognizer('key.json')
+    streaming recognizer backed by google cloud speech streaming_recognize
+    (google-cloud-speech is imported on first use)
+    """
+    def recognize(chunks, sample_rate=44100, speech_context=None, language_code='en-US'):
+        from google.cloud import speech
+        if keypath is not None:
+            client = speech.SpeechClient.from_service_account_file(keypath)
+        else:
+            client = speech.SpeechClient()
+        contexts = [speech.SpeechContext(phrases=list(speech_context))] if speech_context else []
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=int(sample_rate), language_code=language_code,
+            max_alternatives=max_alternatives, enable_word_time_offsets=True,
+            speech_contexts=contexts)
+        streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=False)
+        requests = (speech.StreamingRecognizeRequest(audio_content=chunk) for chunk in chunks)
+        for response in client.streaming_recognize(config=streaming_config, requests=requests):
+            yield response
+    return recognize
+
+
+class StandInStreamRecognizer(object):
+    """
+    Help: recognizer = StandInStreamRecognizer([('tom', 1.2, 1.5), ('hanks', 1.5, 1.9)])
+    local stand-in for a streaming recognizer: consumes the audio chunks and
+    emits each canned word as a final result once the audio pushed so far has
+    passed the word's offset. delay (s) is slept per chunk to mimic network time
+    """
+
+    def __init__(self, words, delay=0.0, sample_width=2, n_channels=1):
+        self.words = sorted(words, key=lambda w: w[2])
+        self.delay = delay
+        self.bytes_per_frame = sample_width * n_channels
+
+    def _result(self, word):
+        return {'is_final': True,
+                'alternatives': [{'transcript': word[0],
+                                  'words': [{'word': word[0], 'start_time': word[1], 'end_time': word[2]}]}]}
+
+    def __call__(self, chunks, sample_rate=44100, speech_context=None, language_code='en-US'):
+        pushed = 0.0
+        k = 0
+        for chunk in chunks:
+            if self.delay:
+                time.sleep(self.delay)
+            pushed = pushed + len(chunk) / float(self.bytes_per_frame * sample_rate)
+            ready = []
+            while k < len(self.words) and self.words[k][2] <= pushed:
+                ready.append(self._result(self.words[k]))
+                k = k + 1
+            if ready:
+                yield {'results': ready}
+        if k < len(self.words):
+            yield {'results': [self._result(w) for w in self.words[k:]]}
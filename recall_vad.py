@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+energy based voice activity segmentation of free recall recordings
+
+most of a 90 s recall wav is silence between items. the samples are cut in
+short frames, frames louder than the noise floor + margin_db count as speech,
+short blips are dropped, every speech run is padded and runs closer than
+min_gap_sec are merged. only those segments (joined with a short silence gap)
+are sent to the recognizer, and the word times that come back are mapped to
+offsets in the original file, so onset/offset in [ANNOTATION] stay correct
+"""
+import os
+import tempfile
+import wave
+
+import numpy as np
+
+from recall_parse import iter_results, plain_result
+from wav_mmap import WavFile
+
+
+def write_wav(wav_file, frames, sample_rate, sample_width):
+    if frames.dtype.kind == 'f':
+        # float wavs are written as 16 bit PCM (wave only writes integer PCM)
+        frames = (np.clip(frames, -1, 1) * 32767).astype(np.int16)
+        sample_width = 2
+    w = wave.open(wav_file, 'wb')
+    try:
+        w.setnchannels(frames.shape[1])
+        w.setsampwidth(sample_width)
+        w.setframerate(sample_rate)
+        w.writeframes(np.ascontiguousarray(frames).tobytes())
+    finally:
+        w.close()
+
+
+def frame_energy(frames, frame_len, block=500):
+    """
+    energy (dB) of consecutive frame_len sample frames, channels averaged
+    frames (e.g. a WavFile memmap) are converted block frames at a time, so
+    the whole recording is never held as floats
+    """
+    n = len(frames) // frame_len
+    energy = np.empty(n, dtype=np.float64)
+    for b in range(0, n, block):
+        e = min(n, b + block)
+        x = frames[b * frame_len:e * frame_len].astype(np.float64)
+        if frames.dtype == np.uint8:
+            x = x - 128.0
+        x = x.mean(axis=1).reshape(e - b, frame_len)
+        energy[b:e] = np.mean(x * x, axis=1)
+    return 10 * np.log10(energy + 1e-10)
+
+
+def speech_segments(frames, sample_rate, frame_sec=0.02, margin_db=12.0, threshold_db=None,
+                    min_speech_sec=0.1, pad_sec=0.3, min_gap_sec=0.6):
+    """
+    Help: segments = speech_segments(frames, 44100)
+    (n, 2) int array of [start, end) sample indices of the speech in frames
+    threshold_db : fixed energy threshold (default: 10th percentile of the
+                   frame energies, i.e. the noise floor, + margin_db)
+    """
+    frame_len = max(1, int(round(frame_sec * sample_rate)))
+    energy = frame_energy(frames, frame_len)
+    if len(energy) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    if threshold_db is None:
+        threshold_db = np.percentile(energy, 10) + margin_db
+
+    # runs of loud frames -> [start, end) frame indices
+    loud = np.concatenate([[0], (energy > threshold_db).astype(np.int8), [0]])
+    edges = np.diff(loud)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts) * frame_len >= min_speech_sec * sample_rate
+    starts = starts[keep] * frame_len
+    ends = ends[keep] * frame_len
+    if len(starts) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    # pad, then merge segments that (nearly) touch
+    pad = int(round(pad_sec * sample_rate))
+    starts = np.maximum(starts - pad, 0)
+    ends = np.minimum(ends + pad, len(frames))
+    gap = int(round(min_gap_sec * sample_rate))
+    new_run = np.concatenate([[True], starts[1:] - ends[:-1] >= gap])
+    merged_starts = starts[new_run]
+    merged_ends = np.maximum.reduceat(ends, np.flatnonzero(new_run))
+    return np.stack([merged_starts, merged_ends], axis=1).astype(np.int64)
+
+
+def segment_map(segments, sample_rate, gap_sec=0.3):
+    """
+    Help: remap = segment_map(segments, 44100)
+    segments are joined in one wav with gap_sec of silence between them;
+    returns remap(seconds, nanos) that turns a time in that joined wav into
+    the time in the original file (integer nanoseconds, no rounding drift)
+    """
+    gap = int(round(gap_sec * sample_rate))
+    lengths = segments[:, 1] - segments[:, 0]
+    joined_starts = np.concatenate([[0], np.cumsum(lengths + gap)[:-1]]).astype(np.int64)
+    joined_ns = joined_starts * 10 ** 9 // sample_rate
+    original_ns = segments[:, 0] * 10 ** 9 // sample_rate
+
+    def remap(seconds, nanos):
+        t = seconds * 10 ** 9 + nanos
+        k = max(0, int(np.searchsorted(joined_ns, t, side='right')) - 1)
+        t = t - int(joined_ns[k]) + int(original_ns[k])
+        return t // 10 ** 9, t % 10 ** 9
+    return remap
+
+
+def vad_decoder(decoder, gap_sec=0.3, tmp_dir=None, **vad_kwargs):
+    """
+    Help: decoder = vad_decoder(quail.decode_speech)
+    wraps a quail.decode_speech-like decoder: the speech segments of each wav
+    are decoded as one shortened wav and the response comes back as a
+    {'results': [...]} dict with word times of the original recording.
+    a wav without speech is not sent at all. vad_kwargs go to speech_segments
+    """
+    def decode_segments(wav_file, speech_context=None, save=False, **kwargs):
+        wav = WavFile(wav_file)
+        frames, sample_rate, width = wav.frames, wav.sample_rate, wav.sample_width
+        segments = speech_segments(frames, sample_rate, **vad_kwargs)
+        if len(segments) == 0:
+            return {'results': []}
+
+        silence = np.zeros((int(round(gap_sec * sample_rate)), frames.shape[1]), dtype=frames.dtype)
+        if frames.dtype == np.uint8:
+            silence[:] = 128
+        parts = []
+        for start, end in segments:
+            parts.append(frames[start:end])
+            parts.append(silence)
+        fd, joined = tempfile.mkstemp(suffix='.wav', dir=tmp_dir)
+        os.close(fd)
+        try:
+            write_wav(joined, np.concatenate(parts[:-1]), sample_rate, width)
+            kwargs['return_raw'] = True
+            response = decoder(joined, speech_context=speech_context, save=False, **kwargs)
+        finally:
+            os.remove(joined)
+        remap = segment_map(segments, sample_rate, gap_sec)
+        return {'results': [plain_result(r, remap) for r in iter_results(response)]}
+    return decode_segments
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+¯\_(ツ)_/¯
+response summary of the sfv_eeg1 (semantic feature verification) sessions
+
+reads the psychopy wide-text csv of every session in the data folder
+(data/<participant>_sfv_eeg1_<date>.csv) in one go, keeps the rows of the
+main trial loop (trials_3) and computes responseSummary.csv with grouped
+pandas operations (one groupby per block of columns, no loop over rows):
+
+    stim_period / stim_slash / stim_nan : trials answered '.' / '/' / not at all
+    stim_total                          : all main trials
+    stim_period%                        : '.' answers in % of all answers
+    total_response%                     : answered trials in % of stim_total
+    avg_rt                              : mean rt of the answered trials (s)
+    cN_resp / cN_total                  : answered / all trials of cond N
+    c1%                                 : c1_resp in % of c1_total
+    c2_resp%                            : c2_resp / c2_total (fraction)
+    c2_overall_accuracy                 : % correct of all cond 2 trials
+    cN_qb / cN_qbtrialN                 : accuracy (fraction correct) in quartile
+                                          bin b (0-3) of the trialN column within
+                                          cond N, and the lowest trialN of the bin
+    summary_version                     : SUMMARY_VERSION the row was computed with
+
+the quartile bins replace the cN_b / cN_btrialN columns of the old script
+(rows without a summary_version): those were binned differently (the
+first bin started at trialN -1), so the new ones got new names and old
+rows keep their own columns instead of being mixed into the new ones.
+
+subjects already in the summary are kept; only sessions of new subjects are
+read and appended. a summary with rows of another SUMMARY_VERSION is not
+updated while those subjects still have session files, until it is
+rebuilt (rebuild=True / --rebuild), which recomputes every subject with
+session files and keeps the rows of subjects that have none as they are
+
+usage:
+python response_check.py data --summary responseSummary.csv
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+EXP_NAME = 'sfv_eeg1'
+SIDE_TABLES = ('_onsets.csv', '_frames.csv')  # timing qc written next to each session
+LOOP = 'trials_3'
+KEYS = 'trial_keyResp.keys'
+CORR = 'trial_keyResp.corr'
+RT = 'trial_keyResp.rt'
+COND = 'cond'
+BIN_COL = 'trialN'
+N_BINS = 4
+CONDS = [1, 2]
+# bump when the definition of a column changes (rows without it are version 1)
+SUMMARY_VERSION = 2
+
+SUMMARY_COLUMNS = (['subj', 'stim_period', 'stim_slash', 'stim_nan', 'stim_total', 'stim_period%',
+                    'total_response%', 'avg_rt',
+                    'c1_resp', 'c1_total', 'c1%'] +
+                   [c for b in range(N_BINS) for c in ('c1_q' + str(b), 'c1_q' + str(b) + 'trialN')] +
+                   ['c2_resp', 'c2_total', 'c2_resp%', 'c2_overall_accuracy'] +
+                   [c for b in range(N_BINS) for c in ('c2_q' + str(b), 'c2_q' + str(b) + 'trialN')] +
+                   ['summary_version'])
+
+
+def session_files(data_dir):
+    """
+    {subj: [wide-text csv files]} of every sfv_eeg1 session in data_dir
+    """
+    sessions = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, '*_' + EXP_NAME + '_*.csv'))):
+        if path.endswith(SIDE_TABLES):
+            continue
+        subj = os.path.basename(path).split('_' + EXP_NAME + '_')[0]
+        sessions.setdefault(subj, []).append(path)
+    return sessions
+
+
+def load_trials(sessions):
+    """
+    main-loop trial rows of all sessions as one frame with a subj column
+    (only the columns the summary needs are parsed)
+    """
+    needed = set([LOOP + '.thisN', KEYS, CORR, RT, COND, BIN_COL])
+    frames = []
+    for subj in sessions:
+        for path in sessions[subj]:
+            df = pd.read_csv(path, usecols=lambda c: c in needed)
+            if LOOP + '.thisN' not in df:
+                continue
+            df = df[df[LOOP + '.thisN'].notna()]
+            df.insert(0, 'subj', subj)
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=['subj'] + sorted(needed))
+    trials = pd.concat(frames, ignore_index=True)
+    for col in needed:
+        if col not in trials:
+            trials[col] = np.nan
+    return trials
+
+
+def summarize(trials):
+    """
+    responseSummary rows (one per subject) from the trial rows of load_trials
+    """
+    keys = trials[KEYS].astype(str).str.strip("[]' ").str.lower()
+    answered = keys.isin(['period', 'slash'])
+    t = pd.DataFrame({'subj': trials['subj'],
+                      'period': keys == 'period',
+                      'slash': keys == 'slash',
+                      'answered': answered,
+                      'rt': pd.to_numeric(trials[RT], errors='coerce').where(answered),
+                      'corr': pd.to_numeric(trials[CORR], errors='coerce'),
+                      'cond': pd.to_numeric(trials[COND], errors='coerce'),
+                      'bin_value': pd.to_numeric(trials[BIN_COL], errors='coerce')})
+
+    by_subj = t.groupby('subj')
+    out = pd.DataFrame({'stim_period': by_subj['period'].sum(),
+                        'stim_slash': by_subj['slash'].sum(),
+                        'stim_total': by_subj.size()})
+    out['stim_nan'] = out['stim_total'] - out['stim_period'] - out['stim_slash']
+    n_answered = out['stim_period'] + out['stim_slash']
+    out['stim_period%'] = (100.0 * out['stim_period'] / n_answered.replace(0, np.nan)).round(2)
+    out['total_response%'] = (100.0 * n_answered / out['stim_total']).round(2)
+    out['avg_rt'] = by_subj['rt'].mean().round(2)
+
+    # per condition counts
+    by_cond = t.groupby(['subj', 'cond'])
+    resp = by_cond['answered'].sum().unstack('cond')
+    total = by_cond.size().unstack('cond')
+    accuracy = by_cond['corr'].mean().unstack('cond')
+
+    # quartile bins of trialN within subject x cond (rank based, so ties split evenly)
+    pct = t.groupby(['subj', 'cond'])['bin_value'].rank(method='first', pct=True)
+    t['bin'] = np.clip(np.ceil(pct * N_BINS) - 1, 0, N_BINS - 1)
+    by_bin = t.dropna(subset=['bin']).groupby(['subj', 'cond', 'bin'])
+    bin_acc = by_bin['corr'].mean().round(2).unstack(['cond', 'bin'])
+    bin_low = by_bin['bin_value'].min().unstack(['cond', 'bin'])
+
+    for c in CONDS:
+        prefix = 'c' + str(c)
+        out[prefix + '_resp'] = resp[c] if c in resp else 0
+        out[prefix + '_total'] = total[c] if c in total else 0
+        for b in range(N_BINS):
+            key = (c, float(b))
+            out[prefix + '_q' + str(b)] = bin_acc[key] if key in bin_acc else np.nan
+            out[prefix + '_q' + str(b) + 'trialN'] = bin_low[key] if key in bin_low else np.nan
+    out['c1%'] = (100.0 * out['c1_resp'] / out['c1_total'].replace(0, np.nan)).round(2)
+    out['c2_resp%'] = (out['c2_resp'] / out['c2_total'].replace(0, np.nan)).round(2)
+    out['c2_overall_accuracy'] = (100.0 * accuracy[2]).round(2) if 2 in accuracy else np.nan
+    out['summary_version'] = SUMMARY_VERSION
+
+    out = out.reset_index()
+    for c in SUMMARY_COLUMNS:
+        if c not in out:
+            out[c] = np.nan
+    return out[SUMMARY_COLUMNS]
+
+
+def update_summary(data_dir, summary_file='responseSummary.csv', rebuild=False):
+    """
+    Help: update_summary('data', 'responseSummary.csv')
+    adds every subject of data_dir that isn't in summary_file yet (with
+    rebuild=True every subject that has sessions is recomputed), writes the
+    file and returns the summary frame. raises ValueError if summary_file
+    has rows of another SUMMARY_VERSION for subjects with sessions and
+    rebuild is False
+    """
+    sessions = session_files(data_dir)
+    old = None
+    if os.path.isfile(summary_file):
+        old = pd.read_csv(summary_file, dtype={'subj': str})
+        if 'summary_version' not in old:
+            old['summary_version'] = 1
+        # old rows of subjects without sessions can't be recomputed and keep their own columns
+        stale = (old['summary_version'] != SUMMARY_VERSION) & old['subj'].isin(sessions)
+        if stale.any() and not rebuild:
+            raise ValueError(summary_file + ' has rows of another summary version (' +
+                             ', '.join(old['subj'][stale]) + '), rebuild it to recompute them')
+    if old is not None and rebuild:
+        # subjects without session files can't be recomputed: their rows stay as they are
+        old = old[~old['subj'].isin(sessions)]
+        if len(old):
+            print('no sessions for ' + ', '.join(old['subj']) + ', keeping their rows')
+    elif old is not None:
+        sessions = dict((s, sessions[s]) for s in sessions if s not in set(old['subj']))
+    print(str(len(sessions)) + ' subject(s) to summarize')
+
+    new = summarize(load_trials(sessions)) if sessions else pd.DataFrame(columns=SUMMARY_COLUMNS)
+    summary = new if old is None else pd.concat([old, new], ignore_index=True)
+    columns = SUMMARY_COLUMNS + [c for c in summary if c not in SUMMARY_COLUMNS]
+    summary = summary[columns].sort_values('subj').reset_index(drop=True)
+    summary.to_csv(summary_file, index=False)
+    return summary
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='summarize sfv_eeg1 responses into responseSummary.csv')
+    parser.add_argument('data_dir', nargs='?', default='data')
+    parser.add_argument('--summary', default='responseSummary.csv')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every subject that has sessions')
+    args = parser.parse_args()
+    try:
+        update_summary(args.data_dir, args.summary, rebuild=args.rebuild)
+    except ValueError as err:
+        parser.error(str(err))
@@ -20,6 +20,8 @@ from numpy import (sin, cos, tan, log, log10, pi, average,
                    sqrt, std, deg2rad, rad2deg, linspace, asarray)
 from numpy.random import random, randint, normal, shuffle
 import os  # handy system and path functions
+from frame_timing import FrameTiming, OnsetLog
+from flip_monitor import FlipMonitor
 import sys  # to get file system encoding
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -28,6 +30,7 @@ import sys  # to get file system encoding
 
 netstation  = True       #False to run the file locally without connecting to NetStation
 recording   = True       #True starts recording NetStation automatically
+ns_sync_every = 5        #seconds between NetStation syncs (events are sent from a background thread)
 photocell   = True        #True allows use of photocell device
 
 
@@ -38,12 +41,26 @@ square_height=0.5     #default: 0.5 cm
 square_pos=(14.9,11.2)#default: (14.9,11.2)
 square_opac=0.9       #default: 0.9 (range from 0-1)
 
+# Durations (in seconds) #converted to frames of the measured frame rate (frame_timing)
+dur_n400_fix   = 2.0  #fixation before the n400 sentence
+dur_n400_word  = 0.5  #each word of the n400 sentence
+dur_n400_buf   = 4.0  #blank after the n400 sentence
+dur_buffer     = 1.0  #blank at the start of a trial
+dur_fixation   = 1.0  #fixation cross
+dur_target     = 0.5  #concept word
+dur_split      = 0.5  #blank between concept and feature
+dur_word       = 0.5  #each word of the feature
+dur_resp       = 2.5  #response prompt (and response window)
+dur_feedback   = 1.0  #feedback text
+dur_pause      = 5.0  #forced part of the pause screen
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 #                    Initialize Components                        #
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 # NetStation setup
 if netstation:
     import egi.simple as egi
+    from ns_dispatch import NSDispatcher
     ms_localtime = egi.ms_localtime
     ns = egi.Netstation()
     print("Imported PyNetstation")
@@ -91,6 +108,16 @@ if expInfo['frameRate'] != None:
     frameDur = 1.0 / round(expInfo['frameRate'])
 else:
     frameDur = 1.0 / 60.0  # could not measure, so guess
+# all frame counts below come from the measured rate (60 Hz if it couldn't be measured)
+timing = FrameTiming(expInfo['frameRate'])
+logging.exp('frame rate: ' + str(timing.rate) + ' Hz')
+# intended vs actual (flip) onset of every event, next to the data file
+onsets = OnsetLog(win, filename + '_onsets.csv', timing)
+# every win.flip is timed; frames longer than 1.5x the refresh interval are counted per component and trial
+flips = FlipMonitor(win, timing.frame_dur, filename + '_frames.csv',
+                    ['fixation_n400', 'sentence_n400', 'buffer_n400',
+                     'bufferPractice', 'fixationPractice', 'targetPractice', 'splitPractice', 'featurePractice', 'respPractice',
+                     'bufferTrial', 'fixationTrial', 'targetTrial', 'splitTrial', 'featureTrial', 'respTrial']).install()
 
 if photocell:
     whitesquare = visual.Rect(
@@ -271,12 +298,12 @@ def send_to_NS(tag, type, cond):
     dev note. # bufs = codes. label = label, key code= table 'abke' is 1, 2, etc
     """
     if netstation:
-        ns.sync()
-        logging.data(str(tag) + ' in ' + str(type))
+        # stamped now, sent by the dispatcher thread (no tcp round trip in the frame loop)
         if str(type) == 'n400':
-            ns.send_event(key=str(tag),label=str(type),timestamp=None,pad=False)
+            ns_out.send(key=str(tag),label=str(type))
         if str(type) == 'prac' or str(type) == 'tral':
-            ns.send_event(key=str(tag),label=str(type), timestamp=None,table={'cond':cond},pad=False)
+            ns_out.send(key=str(tag),label=str(type),table={'cond':cond})
+        logging.data(str(tag) + ' in ' + str(type))
 
 # def send_to_NS(tag): #version 1
 #     """
@@ -323,6 +350,7 @@ if netstation:
     if recording:
         ns.StartRecording()
         print("Recording ...")
+    ns_out = NSDispatcher(ns, sync_every=ns_sync_every, clock=ms_localtime)
 
 
 # -------Start Routine "intro"-------
@@ -417,9 +445,13 @@ for thisN400_stim in n400_stim:
     i = 0
     frameCounter = 0
 
-    fixationDuration = 120
-    totalDuration = numWords * 30 #frames
-    bufferStart = fixationDuration + totalDuration
+    # frame schedule of this trial (the sentence is a whole number of word durations)
+    wordFrames = timing.frames(dur_n400_word)
+    n400_frames = timing.schedule([('fixation', dur_n400_fix), ('sentence', timing.seconds(numWords * wordFrames)),
+                                   ('buffer', dur_n400_buf)])
+    fixationDuration = n400_frames['sentence']
+    totalDuration = n400_frames['buffer'] - n400_frames['sentence'] #frames
+    bufferStart = n400_frames['buffer']
 
     sentence_n400.setText('')
     # keep track of which components have finished
@@ -438,6 +470,7 @@ for thisN400_stim in n400_stim:
         n400trial = 'n0' + str(curr_trial)
 
     send_to_NS(n400trial,'n400',cond=None) # per trial
+    onsets.start_trial(n400trial)
     # -------Start Routine "n400"-------
     while continueRoutine:
         # get current time
@@ -449,7 +482,7 @@ for thisN400_stim in n400_stim:
                 show_photocell()
             if (frameN == 1) or (frameN == fixationDuration+1) or (frameN == bufferStart+1):
                 whitesquare.setAutoDraw(False)
-            frameCount = 30
+            frameCount = wordFrames
             if frameN > fixationDuration:
                 if frameCounter != frameCount:
                     whitesquare.setAutoDraw(False)
@@ -461,6 +494,8 @@ for thisN400_stim in n400_stim:
             fixation_n400.frameNStart = frameN  # exact frame index
             fixation_n400.setAutoDraw(True)
             send_to_NS('fixS','n400',cond=None)
+            onsets.mark('fixS', n400_frames['fixation'], frameN)
+            flips.set_routine('fixation_n400')
 
         if fixation_n400.status == STARTED and frameN >= (fixation_n400.frameNStart + fixationDuration):
             fixation_n400.setAutoDraw(False)
@@ -470,10 +505,11 @@ for thisN400_stim in n400_stim:
         if frameN >= fixationDuration:
             if i<= len(words)-1:
                 sentence_n400.setText(words[i])
-                frameCount = 30
+                frameCount = wordFrames
                 frameCounter += 1
                 if frameCounter == frameCount:
                     send_to_NS('wd+1','n400',cond=None)
+                    onsets.mark('wd+1', fixationDuration + (i + 1) * wordFrames - 1, frameN)
                     show_photocell()
                     i+=1
                     frameCounter = 0
@@ -485,6 +521,8 @@ for thisN400_stim in n400_stim:
             sentence_n400.frameNStart = frameN  # exact frame index
             sentence_n400.setAutoDraw(True)
             send_to_NS('senS','n400',cond=None)
+            onsets.mark('senS', n400_frames['sentence'], frameN)
+            flips.set_routine('sentence_n400')
 
         if sentence_n400.status == STARTED and frameN >= (sentence_n400.frameNStart + totalDuration):
             sentence_n400.setAutoDraw(False)
@@ -497,8 +535,10 @@ for thisN400_stim in n400_stim:
             buffer_n400.frameNStart = frameN  # exact frame index
             buffer_n400.setAutoDraw(True)
             send_to_NS('bufS','n400',cond=None)
+            onsets.mark('bufS', n400_frames['buffer'], frameN)
+            flips.set_routine('buffer_n400')
 
-        if buffer_n400.status == STARTED and frameN >= (buffer_n400.frameNStart + 240):
+        if buffer_n400.status == STARTED and frameN >= (buffer_n400.frameNStart + timing.frames(dur_n400_buf)):
             buffer_n400.setAutoDraw(False)
             send_to_NS('bufE','n400',cond=None)
 
@@ -524,6 +564,8 @@ for thisN400_stim in n400_stim:
         if hasattr(thisComponent, "setAutoDraw"):
             thisComponent.setAutoDraw(False)
     send_to_NS('n40E','n400',cond=None)
+    flips.end_trial(n400trial)
+    flips.set_routine('other')
     # the Routine "n400" was not non-slip safe, so reset the non-slip timer
     routineTimer.reset()
     thisExp.nextEntry()
@@ -634,8 +676,12 @@ for thisTrial in trials:
     numWords = len(words)
     i = 0
     frameCounter = 0
-    totalDuration = numWords * 30 #frames
-    ready_for_resp = totalDuration + 180 # when to start practice_resp
+    # frame schedule of this trial (the feature is a whole number of word durations)
+    wordFrames = timing.frames(dur_word)
+    trial_frames = timing.schedule([('buffer', dur_buffer), ('fixation', dur_fixation), ('target', dur_target),
+                                    ('split', dur_split), ('feature', timing.seconds(numWords * wordFrames))])
+    totalDuration = trial_frames['end'] - trial_frames['feature'] #frames
+    ready_for_resp = trial_frames['end'] # when to start practice_resp
 
     targetPractice.setText(concept)
     prac_keyResp = event.BuilderKeyResponse()
@@ -650,6 +696,7 @@ for thisTrial in trials:
     pracTrial = 'pra' + str(curr_trial)
 
     send_to_NS(pracTrial,'prac',cond=None)
+    onsets.start_trial(pracTrial)
     # -------Start Routine "practice"-------
     while continueRoutine:
         # get current time
@@ -657,12 +704,12 @@ for thisTrial in trials:
         frameN = frameN + 1  # number of completed frames (so 0 is the first frame)
 
         if photocell:
-            if (frameN == 0) or (frameN == 60) or (frameN == 120) or (frameN == 150) or (frameN == 180) or (frameN == ready_for_resp):
+            if frameN in trial_frames.values():
                 show_photocell()
-            if (frameN == 1) or (frameN == 61) or (frameN == 121) or (frameN == 151) or (frameN == 181) or (frameN == ready_for_resp+1):
+            if frameN - 1 in trial_frames.values():
                 whitesquare.setAutoDraw(False)
-            frameCount = 30
-            if frameN > 180 and frameN < ready_for_resp:
+            frameCount = wordFrames
+            if frameN > trial_frames['feature'] and frameN < ready_for_resp:
                 if frameCounter != frameCount:
                     whitesquare.setAutoDraw(False)
 
@@ -673,62 +720,73 @@ for thisTrial in trials:
             bufferPractice.frameNStart = frameN  # exact frame index
             bufferPractice.setAutoDraw(True)
             send_to_NS('bufS','prac',cond=cond_num)
-        if bufferPractice.status == STARTED and frameN >= (bufferPractice.frameNStart + 60):
+            onsets.mark('bufS', trial_frames['buffer'], frameN)
+            flips.set_routine('bufferPractice')
+        if bufferPractice.status == STARTED and frameN >= (bufferPractice.frameNStart + timing.frames(dur_buffer)):
             bufferPractice.setAutoDraw(False)
             send_to_NS('bufE','prac',cond=cond_num)
 
         # *fixationPractice* updates
-        if frameN >= 60 and fixationPractice.status == NOT_STARTED:
+        if frameN >= trial_frames['fixation'] and fixationPractice.status == NOT_STARTED:
             # keep track of start time/frame for later
             fixationPractice.tStart = t
             fixationPractice.frameNStart = frameN  # exact frame index
             fixationPractice.setAutoDraw(True)
             send_to_NS('fixS','prac',cond=cond_num)
-        if fixationPractice.status == STARTED and frameN >= (fixationPractice.frameNStart + 60):
+            onsets.mark('fixS', trial_frames['fixation'], frameN)
+            flips.set_routine('fixationPractice')
+        if fixationPractice.status == STARTED and frameN >= (fixationPractice.frameNStart + timing.frames(dur_fixation)):
             fixationPractice.setAutoDraw(False)
             send_to_NS('fixE','prac',cond=cond_num)
 
         # *targetPractice* updates
-        if frameN >= 120 and targetPractice.status == NOT_STARTED:
+        if frameN >= trial_frames['target'] and targetPractice.status == NOT_STARTED:
             # keep track of start time/frame for later
             targetPractice.tStart = t
             targetPractice.frameNStart = frameN  # exact frame index
             targetPractice.setAutoDraw(True)
             send_to_NS('tarS','prac',cond=cond_num)
-        if targetPractice.status == STARTED and frameN >= (targetPractice.frameNStart + 30):
+            onsets.mark('tarS', trial_frames['target'], frameN)
+            flips.set_routine('targetPractice')
+        if targetPractice.status == STARTED and frameN >= (targetPractice.frameNStart + timing.frames(dur_target)):
             targetPractice.setAutoDraw(False)
             send_to_NS('tarE','prac',cond=cond_num)
 
         # *splitPractice* updates
-        if frameN >= 150 and splitPractice.status == NOT_STARTED:
+        if frameN >= trial_frames['split'] and splitPractice.status == NOT_STARTED:
             # keep track of start time/frame for later
             splitPractice.tStart = t
             splitPractice.frameNStart = frameN  # exact frame index
             splitPractice.setAutoDraw(True)
             send_to_NS('splS','prac',cond=cond_num)
-        if splitPractice.status == STARTED and frameN >= (splitPractice.frameNStart + 30):
+            onsets.mark('splS', trial_frames['split'], frameN)
+            flips.set_routine('splitPractice')
+        if splitPractice.status == STARTED and frameN >= (splitPractice.frameNStart + timing.frames(dur_split)):
             splitPractice.setAutoDraw(False)
             send_to_NS('splE','prac',cond=cond_num)
 
         # featurePractice text change
-        if frameN >= 180: # 3 seconds, 60 frames/sec
+        if frameN >= trial_frames['feature']: # after buffer, fixation, target and split
             if i<= len(words)-1:
                 featurePractice.setText(words[i])
-                frameCount = 30
+                frameCount = wordFrames
                 frameCounter += 1
                 if frameCounter == frameCount:
                     send_to_NS('ft+1','prac',cond=cond_num)
+                    onsets.mark('ft+1', trial_frames['feature'] + (i + 1) * wordFrames - 1, frameN)
                     show_photocell()
                     i+=1
                     frameCounter = 0
 
         # *featurePractice* updates
-        if frameN >= 180 and featurePractice.status == NOT_STARTED:
+        if frameN >= trial_frames['feature'] and featurePractice.status == NOT_STARTED:
             # keep track of start time/frame for later
             featurePractice.tStart = t
             featurePractice.frameNStart = frameN  # exact frame index
             featurePractice.setAutoDraw(True)
             send_to_NS('feaS','prac',cond=cond_num)
+            onsets.mark('feaS', trial_frames['feature'], frameN)
+            flips.set_routine('featurePractice')
         if featurePractice.status == STARTED and frameN >= (featurePractice.frameNStart + totalDuration):
             featurePractice.setAutoDraw(False)
             send_to_NS('feaE','prac',cond=cond_num)
@@ -740,7 +798,9 @@ for thisTrial in trials:
             respPractice.frameNStart = frameN  # exact frame index
             respPractice.setAutoDraw(True)
             send_to_NS('resS','prac',cond=cond_num)
-        if respPractice.status == STARTED and frameN >= (respPractice.frameNStart + 150):
+            onsets.mark('resS', trial_frames['end'], frameN)
+            flips.set_routine('respPractice')
+        if respPractice.status == STARTED and frameN >= (respPractice.frameNStart + timing.frames(dur_resp)):
             respPractice.setAutoDraw(False)
             send_to_NS('resE','prac',cond=cond_num)
 
@@ -753,7 +813,7 @@ for thisTrial in trials:
             # keyboard checking is just starting
             win.callOnFlip(prac_keyResp.clock.reset)  # t=0 on next screen flip
             event.clearEvents(eventType='keyboard')
-        if prac_keyResp.status == STARTED and t >= (prac_keyResp.tStart + 2.5):
+        if prac_keyResp.status == STARTED and t >= (prac_keyResp.tStart + dur_resp):
             prac_keyResp.status = STOPPED
         if prac_keyResp.status == STARTED:
             theseKeys = event.getKeys(keyList=['period', 'slash'])
@@ -801,6 +861,8 @@ for thisTrial in trials:
         if hasattr(thisComponent, "setAutoDraw"):
             thisComponent.setAutoDraw(False)
     send_to_NS('praE','prac',cond=None)
+    flips.end_trial(pracTrial)
+    flips.set_routine('other')
 
     # check responses
     if prac_keyResp.keys in ['', [], None]:  # No response was made
@@ -845,7 +907,7 @@ for thisTrial in trials:
             feedbackText.frameNStart = frameN  # exact frame index
             feedbackText.setAutoDraw(True)
             send_to_NS('fbtS','prac',cond=None)
-        if feedbackText.status == STARTED and frameN >= (feedbackText.frameNStart + 60):
+        if feedbackText.status == STARTED and frameN >= (feedbackText.frameNStart + timing.frames(dur_feedback)):
             feedbackText.setAutoDraw(False)
             send_to_NS('fbtE','prac',cond=None)
 
@@ -983,8 +1045,12 @@ for thisTrial_3 in trials_3:
     i = 0
     frameCounter = 0
 
-    totalDuration = numWords * 30 #frames
-    ready_for_resp = totalDuration + 180 # when to start practice_resp
+    # frame schedule of this trial (the feature is a whole number of word durations)
+    wordFrames = timing.frames(dur_word)
+    trial_frames = timing.schedule([('buffer', dur_buffer), ('fixation', dur_fixation), ('target', dur_target),
+                                    ('split', dur_split), ('feature', timing.seconds(numWords * wordFrames))])
+    totalDuration = trial_frames['end'] - trial_frames['feature'] #frames
+    ready_for_resp = trial_frames['end'] # when to start practice_resp
     # currentWordIndex = -1
 
     targetTrial.setText(concept)
@@ -1005,6 +1071,7 @@ for thisTrial_3 in trials_3:
         realTrial = 't' + str(curr_trial)
 
     send_to_NS(realTrial,'tral',cond=None)
+    onsets.start_trial(realTrial)
     # -------Start Routine "trial"-------
     while continueRoutine:
         # get current time
@@ -1012,12 +1079,12 @@ for thisTrial_3 in trials_3:
         frameN = frameN + 1  # number of completed frames (so 0 is the first frame)
 
         if photocell:
-            if (frameN == 0) or (frameN == 60) or (frameN == 120) or (frameN == 150) or (frameN == 180) or (frameN == ready_for_resp):
+            if frameN in trial_frames.values():
                 show_photocell()
-            if (frameN == 1) or (frameN == 61) or (frameN == 121) or (frameN == 151) or (frameN == 181) or (frameN == ready_for_resp+1):
+            if frameN - 1 in trial_frames.values():
                 whitesquare.setAutoDraw(False)
-            frameCount = 30
-            if frameN > 180 and frameN < ready_for_resp:
+            frameCount = wordFrames
+            if frameN > trial_frames['feature'] and frameN < ready_for_resp:
                 if frameCounter != frameCount:
                     whitesquare.setAutoDraw(False)
 
@@ -1028,62 +1095,73 @@ for thisTrial_3 in trials_3:
             bufferTrial.frameNStart = frameN  # exact frame index
             bufferTrial.setAutoDraw(True)
             send_to_NS('bufS','tral',cond=cond_num)
-        if bufferTrial.status == STARTED and frameN >= (bufferTrial.frameNStart + 60):
+            onsets.mark('bufS', trial_frames['buffer'], frameN)
+            flips.set_routine('bufferTrial')
+        if bufferTrial.status == STARTED and frameN >= (bufferTrial.frameNStart + timing.frames(dur_buffer)):
             bufferTrial.setAutoDraw(False)
             send_to_NS('bufE','tral',cond=cond_num)
 
         # *fixationTrial* updates
-        if frameN >= 60 and fixationTrial.status == NOT_STARTED:
+        if frameN >= trial_frames['fixation'] and fixationTrial.status == NOT_STARTED:
             # keep track of start time/frame for later
             fixationTrial.tStart = t
             fixationTrial.frameNStart = frameN  # exact frame index
             fixationTrial.setAutoDraw(True)
             send_to_NS('fixS','tral',cond=cond_num)
-        if fixationTrial.status == STARTED and frameN >= (fixationTrial.frameNStart + 60):
+            onsets.mark('fixS', trial_frames['fixation'], frameN)
+            flips.set_routine('fixationTrial')
+        if fixationTrial.status == STARTED and frameN >= (fixationTrial.frameNStart + timing.frames(dur_fixation)):
             fixationTrial.setAutoDraw(False)
             send_to_NS('fixE','tral',cond=cond_num)
 
         # *targetTrial* updates
-        if frameN >= 120 and targetTrial.status == NOT_STARTED:
+        if frameN >= trial_frames['target'] and targetTrial.status == NOT_STARTED:
             # keep track of start time/frame for later
             targetTrial.tStart = t
             targetTrial.frameNStart = frameN  # exact frame index
             targetTrial.setAutoDraw(True)
             send_to_NS('tarS','tral',cond=cond_num)
-        if targetTrial.status == STARTED and frameN >= (targetTrial.frameNStart + 30):
+            onsets.mark('tarS', trial_frames['target'], frameN)
+            flips.set_routine('targetTrial')
+        if targetTrial.status == STARTED and frameN >= (targetTrial.frameNStart + timing.frames(dur_target)):
             targetTrial.setAutoDraw(False)
             send_to_NS('tarE','tral',cond=cond_num)
 
         # *splitTrial* updates
-        if frameN >= 150 and splitTrial.status == NOT_STARTED:
+        if frameN >= trial_frames['split'] and splitTrial.status == NOT_STARTED:
             # keep track of start time/frame for later
             splitTrial.tStart = t
             splitTrial.frameNStart = frameN  # exact frame index
             splitTrial.setAutoDraw(True)
             send_to_NS('splS','tral',cond=cond_num)
-        if splitTrial.status == STARTED and frameN >= (splitTrial.frameNStart + 30):
+            onsets.mark('splS', trial_frames['split'], frameN)
+            flips.set_routine('splitTrial')
+        if splitTrial.status == STARTED and frameN >= (splitTrial.frameNStart + timing.frames(dur_split)):
             splitTrial.setAutoDraw(False)
             send_to_NS('splE','tral',cond=cond_num)
 
         # update/draw components on each frame
-        if frameN >= 180: # 3 seconds, 60 frames/sec
+        if frameN >= trial_frames['feature']: # after buffer, fixation, target and split
             if i<= len(words)-1:
                 featureTrial.setText(words[i])
-                frameCount = 30
+                frameCount = wordFrames
                 frameCounter += 1
                 if frameCounter == frameCount:
                     send_to_NS('ft+1','tral',cond=cond_num)
+                    onsets.mark('ft+1', trial_frames['feature'] + (i + 1) * wordFrames - 1, frameN)
                     show_photocell()
                     i+=1
                     frameCounter = 0
 
         # *featureTrial* updates
-        if frameN >= 180 and featureTrial.status == NOT_STARTED:
+        if frameN >= trial_frames['feature'] and featureTrial.status == NOT_STARTED:
             # keep track of start time/frame for later
             featureTrial.tStart = t
             featureTrial.frameNStart = frameN  # exact frame index
             featureTrial.setAutoDraw(True)
             send_to_NS('feaS','tral',cond=cond_num)
+            onsets.mark('feaS', trial_frames['feature'], frameN)
+            flips.set_routine('featureTrial')
         if featureTrial.status == STARTED and frameN >= (featureTrial.frameNStart + totalDuration):
             featureTrial.setAutoDraw(False)
             send_to_NS('feaE','tral',cond=cond_num)
@@ -1095,7 +1173,9 @@ for thisTrial_3 in trials_3:
             respTrial.frameNStart = frameN  # exact frame index
             respTrial.setAutoDraw(True)
             send_to_NS('resS','tral',cond=cond_num)
-        if respTrial.status == STARTED and frameN >= (respTrial.frameNStart + 150):
+            onsets.mark('resS', trial_frames['end'], frameN)
+            flips.set_routine('respTrial')
+        if respTrial.status == STARTED and frameN >= (respTrial.frameNStart + timing.frames(dur_resp)):
             respTrial.setAutoDraw(False)
             send_to_NS('resE','tral',cond=cond_num)
 
@@ -1108,7 +1188,7 @@ for thisTrial_3 in trials_3:
             # keyboard checking is just starting
             win.callOnFlip(trial_keyResp.clock.reset)  # t=0 on next screen flip
             event.clearEvents(eventType='keyboard')
-        if trial_keyResp.status == STARTED and t >= (trial_keyResp.tStart + 2.5):
+        if trial_keyResp.status == STARTED and t >= (trial_keyResp.tStart + dur_resp):
             trial_keyResp.status = STOPPED
         if trial_keyResp.status == STARTED:
             theseKeys = event.getKeys(keyList=['period', 'slash'])
@@ -1154,6 +1234,8 @@ for thisTrial_3 in trials_3:
     for thisComponent in trialComponents:
         if hasattr(thisComponent, "setAutoDraw"):
             thisComponent.setAutoDraw(False)
+    flips.end_trial(realTrial)
+    flips.set_routine('other')
 
     # check responses
     if trial_keyResp.keys in ['', [], None]:  # No response was made
@@ -1201,7 +1283,7 @@ for thisTrial_3 in trials_3:
             feedbackText.setAutoDraw(True)
         if frameN == 0.0 and feedbackText.status == NOT_STARTED:
             send_to_NS('fbtS','tral',cond=None)
-        if feedbackText.status == STARTED and frameN >= (feedbackText.frameNStart + 60):
+        if feedbackText.status == STARTED and frameN >= (feedbackText.frameNStart + timing.frames(dur_feedback)):
             feedbackText.setAutoDraw(False)
             send_to_NS('fbtE','tral',cond=None)
 
@@ -1260,18 +1342,18 @@ for thisTrial_3 in trials_3:
             pause1Text.tStart = t
             pause1Text.frameNStart = frameN  # exact frame index
             pause1Text.setAutoDraw(True)
-        if pause1Text.status == STARTED and frameN >= (pause1Text.frameNStart + 300):
+        if pause1Text.status == STARTED and frameN >= (pause1Text.frameNStart + timing.frames(dur_pause)):
             pause1Text.setAutoDraw(False)
 
         # *pause2Text* updates
-        if frameN >= 300 and pause2Text.status == NOT_STARTED:
+        if frameN >= timing.frames(dur_pause) and pause2Text.status == NOT_STARTED:
             # keep track of start time/frame for later
             pause2Text.tStart = t
             pause2Text.frameNStart = frameN  # exact frame index
             pause2Text.setAutoDraw(True)
 
         # *instrPause_keyResp* updates
-        if frameN >= 300 and instrPause_keyResp.status == NOT_STARTED:
+        if frameN >= timing.frames(dur_pause) and instrPause_keyResp.status == NOT_STARTED:
             # keep track of start time/frame for later
             instrPause_keyResp.tStart = t
             instrPause_keyResp.frameNStart = frameN  # exact frame index
@@ -1388,6 +1470,17 @@ for thisComponent in endComponents:
 # the Routine "end" was not non-slip safe, so reset the non-slip timer
 routineTimer.reset()
 
+onsets.close()
+frame_qc = flips.close()
+print('dropped frames: ' + str(frame_qc))
+logging.exp('dropped frames: ' + str(frame_qc))
+
+# send what's still queued for NetStation and log the send stats
+if netstation:
+    ns_stats = ns_out.stop()
+    print('NetStation events: ' + str(ns_stats))
+    logging.exp('NetStation events: ' + str(ns_stats))
+
 # these shouldn't be strictly necessary (should auto-save)
 thisExp.saveAsWideText(filename+'.csv')
 thisExp.saveAsPickle(filename)
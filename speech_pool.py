@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+concurrent speech decoding for all trial wav files of a subject
+
+every wav is submitted at once to a bounded thread pool (recognizer calls are
+network bound, so threads are enough), failed calls are retried with
+exponential backoff, and results are collected in the same order as the input
+list so trial N always lines up with stim_trialN in the unpickle stage
+
+decoder can be quail.decode_speech or any callable with the same signature,
+e.g. a local stand-in that sleeps and returns canned responses
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def decode_with_retry(decoder, wav_file, speech_context=None, retries=3, backoff=1.0, **kwargs):
+    """
+    Help: decode_with_retry(quail.decode_speech, 'subj-0.wav', trial_stim)
+    calls decoder on a single wav file and retries failed calls
+    waits backoff, 2*backoff, 4*backoff ... seconds between attempts
+    the last error is re-raised once all retries are used up
+    """
+    attempt = 0
+    while True:
+        try:
+            return decoder(wav_file, speech_context=speech_context, **kwargs)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            print('decoding ' + str(wav_file) + ' failed (' + str(e) + '), retry in ' + str(wait) + 's')
+            time.sleep(wait)
+            attempt = attempt + 1
+
+
+def decode_pool(wav_files, speech_contexts, decoder, max_workers=4, retries=3, backoff=1.0, on_done=None, **kwargs):
+    """
+    Help: decode_pool(wav_files, speech_contexts, quail.decode_speech, keypath='key.json')
+    wav_files       : list of wav paths, already in trial order
+    speech_contexts : list of speech_context lists (one per wav) or None
+    max_workers     : max number of recognizer calls in flight at once
+    retries/backoff : per-file retry policy (see decode_with_retry)
+    on_done         : on_done(i, result) is called (in the calling thread) as soon as
+                      wav_files[i] is decoded, e.g. to save progress
+    extra keyword arguments are passed on to decoder
+    returns list of decoder results in the same order as wav_files
+    a file that still fails after its retries doesn't stop the others: its error
+    is raised once every file is done (and on_done has run for the rest)
+    """
+    if speech_contexts is None:
+        speech_contexts = [None] * len(wav_files)
+    if len(speech_contexts) != len(wav_files):
+        raise ValueError('need one speech_context per wav file')
+    if not wav_files:
+        return []
+
+    max_workers = max(1, min(max_workers, len(wav_files)))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = dict((pool.submit(decode_with_retry, decoder, wav_files[i], speech_contexts[i],
+                                    retries, backoff, **kwargs), i)
+                       for i in range(0, len(wav_files)))
+        results = [None] * len(wav_files)
+        failed = []
+        for f in as_completed(futures):
+            i = futures[f]
+            try:
+                results[i] = f.result()
+            except Exception as e:
+                print('decoding ' + str(wav_files[i]) + ' gave up (' + str(e) + ')')
+                failed.append((i, e))
+                continue
+            if on_done is not None:
+                on_done(i, results[i])
+    if failed:
+        print(str(len(failed)) + ' of ' + str(len(wav_files)) + ' wav files failed')
+        # first failing file in input order
+        raise min(failed, key=lambda x: x[0])[1]
+    # in the same order as wav_files, not completion order
+    return results
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+preloaded stimulus images and sounds for the presentation scripts
+
+building an ImageStim (image decode + texture upload) or a sound.Sound
+(wav decode) right before the stimulus onset can cost a frame or more, so
+the items of a list are queued when the list starts and built while the
+instruction screen is up (prefetch); during the list the next items are
+topped up after every presentation and each item is released once shown.
+at onset the script only swaps in objects that already exist
+
+the loaded items are kept under a memory budget (decoded texture / sample
+bytes, estimated from the file headers); items that don't fit stay queued
+and are built by a later prefetch, or on demand if the list runs ahead
+
+the psychopy objects are made by the callables given to StimAssets, so the
+cache itself doesn't depend on psychopy and has to be used from the thread
+that owns the window (textures belong to its gl context)
+"""
+import os
+import time
+from collections import OrderedDict, deque
+
+from wav_mmap import WavFile
+
+
+def image_bytes(path):
+    """
+    decoded rgba size of an image (header only, via PIL), file size x 4 without PIL
+    """
+    try:
+        from PIL import Image
+        with Image.open(path) as im:
+            w, h = im.size
+        return w * h * 4
+    except (ImportError, IOError, OSError):
+        return os.path.getsize(path) * 4 if os.path.isfile(path) else 0
+
+
+def sound_bytes(path):
+    """
+    decoded size of a wav as float32 samples
+    """
+    try:
+        wav = WavFile(path)
+        return wav.n_frames * wav.n_channels * 4
+    except (IOError, OSError, ValueError, EOFError):
+        return os.path.getsize(path) * 2 if os.path.isfile(path) else 0
+
+
+class StimAssets(object):
+    """
+    Help: assets = StimAssets(make_image, make_sound, budget_mb=256)
+    assets.queue([(i, 'img/acorn{}.jpg', 'stimSound/acorn{}.wav'), ...])
+    assets.prefetch()              # while the instruction screen is up
+    image, vocal = assets.get(i)   # at onset
+    assets.release(i)              # after the item was shown
+    make_image(path) / make_sound(path) build the presentation objects
+    """
+
+    def __init__(self, make_image, make_sound, budget_mb=256, image_size=image_bytes, sound_size=sound_bytes):
+        self.make_image = make_image
+        self.make_sound = make_sound
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.image_size = image_size
+        self.sound_size = sound_size
+        self.pending = deque()
+        self.loaded = OrderedDict()  # key -> (image, sound, bytes)
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.load_seconds = 0.0
+
+    def queue(self, items):
+        """
+        adds (key, image path, sound path) items in presentation order
+        """
+        queued = set(k for k, _, _ in self.pending)
+        for key, image_path, sound_path in items:
+            if key not in self.loaded and key not in queued:
+                self.pending.append((key, image_path, sound_path))
+                queued.add(key)
+
+    def _load(self, key, image_path, sound_path, n_bytes):
+        t0 = time.perf_counter()
+        image = self.make_image(image_path) if image_path is not None else None
+        vocal = self.make_sound(sound_path) if sound_path is not None else None
+        self.load_seconds = self.load_seconds + time.perf_counter() - t0
+        self.loaded[key] = (image, vocal, n_bytes)
+        self.n_bytes = self.n_bytes + n_bytes
+
+    def _size(self, image_path, sound_path):
+        return ((self.image_size(image_path) if image_path is not None else 0) +
+                (self.sound_size(sound_path) if sound_path is not None else 0))
+
+    def prefetch(self, max_items=None):
+        """
+        builds queued items in order until the budget is full (at least one
+        item if nothing is loaded), returns the number of items built
+        """
+        n = 0
+        while self.pending and (max_items is None or n < max_items):
+            key, image_path, sound_path = self.pending[0]
+            n_bytes = self._size(image_path, sound_path)
+            if self.loaded and self.n_bytes + n_bytes > self.budget:
+                break
+            self.pending.popleft()
+            self._load(key, image_path, sound_path, n_bytes)
+            n = n + 1
+        return n
+
+    def get(self, key):
+        """
+        (image, sound) of a queued item; built now (a miss) if it wasn't prefetched
+        """
+        if key in self.loaded:
+            self.hits = self.hits + 1
+        else:
+            for item in self.pending:
+                if item[0] == key:
+                    self.pending.remove(item)
+                    break
+            else:
+                raise KeyError('stimulus ' + str(key) + ' was never queued')
+            self.misses = self.misses + 1
+            self._load(item[0], item[1], item[2], self._size(item[1], item[2]))
+        image, vocal, _ = self.loaded[key]
+        return image, vocal
+
+    def release(self, key):
+        """
+        drops the objects of a shown item (textures and sample buffers are
+        freed with the last reference)
+        """
+        entry = self.loaded.pop(key, None)
+        if entry is not None:
+            self.n_bytes = self.n_bytes - entry[2]
+
+    def clear(self):
+        self.pending.clear()
+        for key in list(self.loaded):
+            self.release(key)
+
+    def summary(self):
+        return {'loaded': len(self.loaded), 'pending': len(self.pending), 'bytes': self.n_bytes,
+                'hits': self.hits, 'misses': self.misses, 'load_seconds': self.load_seconds}
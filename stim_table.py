@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+stimulus metadata table for the cdcatmr stim pool
+
+built once from cel_names.txt / loc_names.txt / obj_names.txt and stored as a
+pickle (stim_table.p) next to them in ../stimuli; the pickle is rebuilt
+whenever one of the name files changes. every decoding/scoring path looks up
+category, name tokens and uniqueness here instead of scanning the name lists
+
+only plain data (lists, dicts, sets) is pickled: the matcher index
+(StimIndex, with its fuzzy BK-trees) is built again on load, so a change to
+recall_match / recall_fuzzy never meets an index pickled by older code
+
+categories: 1 = celeb, 2 = location, 3 = object (0 = not in the pool)
+"""
+import os
+import pickle
+import threading
+from collections import Counter
+from recall_match import StimIndex, name_tokens
+
+TABLE_VERSION = 3
+TABLE_FILE = 'stim_table.p'
+NAME_FILES = [('cel_names.txt', 1), ('loc_names.txt', 2), ('obj_names.txt', 3)]
+
+
+def name_key(name):
+    """
+    normalized lookup key of a stimulus name ('Tom  Hanks' -> 'tom hanks')
+    """
+    return ' '.join(name_tokens(name))
+
+
+class StimTable(object):
+    """
+    Help: table = load_stim_table('../stimuli')
+    table.cel_list / loc_list / obj_list / total_list : names as in the txt files
+    table.category_of('Tom Hanks') -> 1
+    table.tokens_of('Tom Hanks')   -> ('tom', 'hanks')
+    table.is_unique('Tom Hanks')   -> True if at least one of its words is in no other name
+    table.unique_words / stop_words: words in exactly one / in 2+ stimulus names
+    table.index                    : StimIndex for recall matching
+    """
+
+    def __init__(self, name_lists):
+        self.cel_list, self.loc_list, self.obj_list = name_lists
+        self.total_list = self.cel_list + self.loc_list + self.obj_list
+
+        self.category = {}
+        self.tokens = {}
+        for names, cat in zip(name_lists, [c for _, c in NAME_FILES]):
+            for name in names:
+                key = name_key(name)
+                if key:
+                    self.category[key] = cat
+                    self.tokens[key] = tuple(key.split())
+
+        counts = Counter()
+        for key in self.tokens:
+            counts.update(set(self.tokens[key]))
+        self.unique_words = set(w for w in counts if counts[w] == 1)
+        self.stop_words = set(w for w in counts if counts[w] >= 2)
+        self.unique = dict((key, any(w in self.unique_words for w in self.tokens[key]))
+                           for key in self.tokens)
+        self.index = StimIndex(self.total_list)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['index']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.index = StimIndex(self.total_list)
+
+    def category_of(self, name):
+        return self.category.get(name_key(name), 0)
+
+    def tokens_of(self, name):
+        return self.tokens.get(name_key(name), ())
+
+    def is_unique(self, name):
+        return self.unique.get(name_key(name), False)
+
+
+def _source_stamp(stim_dir):
+    stamp = [TABLE_VERSION]
+    for fname, _ in NAME_FILES:
+        st = os.stat(os.path.join(stim_dir, fname))
+        stamp.append((fname, st.st_size, st.st_mtime))
+    return stamp
+
+
+def load_stim_table(stim_dir, rebuild=False):
+    """
+    Help: table = load_stim_table('../stimuli')
+    returns the cached StimTable in stim_dir, rebuilding it if the name files changed
+    """
+    stamp = _source_stamp(stim_dir)
+    table_path = os.path.join(stim_dir, TABLE_FILE)
+    if not rebuild and os.path.isfile(table_path):
+        try:
+            with open(table_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('stamp') == stamp:
+                return cached['table']
+        except Exception:
+            pass
+
+    name_lists = []
+    for fname, _ in NAME_FILES:
+        with open(os.path.join(stim_dir, fname), 'r') as f:
+            name_lists.append([n for n in f.read().splitlines() if n.strip()])
+    table = StimTable(name_lists)
+    # written next to the table and renamed into place, so processes starting at the
+    # same time (cohort_decode) never read a half-written pickle
+    tmp = table_path + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident) + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump({'stamp': stamp, 'table': table}, f)
+        os.replace(tmp, table_path)
+    except (IOError, OSError):
+        print('could not write ' + table_path + ', stim table is not cached')
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+    return table
+
+
+class StimPool(object):
+    """
+    Help: pool = get_pool('../stimuli')
+    lazy handle on the stim pool of one stimuli folder; nothing is read until
+    the first attribute access (pool.cel_list, pool.category_of(...), ...),
+    which loads the StimTable and keeps it. attributes are those of StimTable
+    """
+
+    def __init__(self, stim_dir):
+        self.stim_dir = os.path.abspath(stim_dir)
+        self._table = None
+        self._lock = threading.Lock()
+
+    @property
+    def table(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = load_stim_table(self.stim_dir)
+        return self._table
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.table, name)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(stim_dir):
+    """
+    Help: pool = get_pool('../stimuli')
+    one StimPool per stimuli folder (memoized on the absolute path), so several
+    pools can live in one process and each is only read once
+    """
+    key = os.path.abspath(stim_dir)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = StimPool(key)
+        return _pools[key]
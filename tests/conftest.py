@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+the modules live at the repo root (scripts run from there), put it on sys.path
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
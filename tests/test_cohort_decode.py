@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+cohort_decode: subject discovery, skipped subjects and the run manifest
+"""
+import json
+import os
+
+import pandas as pd
+
+from cohort_decode import check_subject, decode_cohort, decode_subject, find_subjects
+from test_recall_decoders import NAMES, make_stimuli, write_wav
+
+
+def make_cohort(tmp_path):
+    stim_dir = str(tmp_path / 'stimuli')
+    make_stimuli(stim_dir)
+    os.makedirs(os.path.join(stim_dir, 'export_stim'))
+    pool = sum(NAMES.values(), [])
+    stim = [pool[k % len(pool)] for k in range(18 + 27)]
+    pd.DataFrame({'stimName': stim}).to_csv(os.path.join(stim_dir, 'export_stim', 'subj1stimuli.csv'), index=False)
+    data_dir = tmp_path / 'data'
+    (data_dir / 'Subj1' / 'record').mkdir(parents=True)
+    (data_dir / 'Subj2' / 'record').mkdir(parents=True)  # no stimuli file
+    (data_dir / 'notes').mkdir()                          # no record folder
+    write_wav(str(data_dir / 'Subj1' / 'record' / 'subj1-0.wav'))
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    (fixtures / 'subj1-0.wav.json').write_text(json.dumps([['hammer', 0.5, 0.9]]))
+    return str(data_dir), stim_dir, str(fixtures)
+
+
+def test_find_and_check_subjects(tmp_path):
+    data_dir, stim_dir, _ = make_cohort(tmp_path)
+    assert find_subjects(data_dir) == ['Subj1', 'Subj2']
+    assert find_subjects(data_dir, 'Subj1*') == ['Subj1']
+    assert check_subject(data_dir, stim_dir, 'Subj1') is None
+    assert check_subject(data_dir, stim_dir, 'Subj2').startswith('no stimuli file')
+    assert check_subject(data_dir, stim_dir, 'notes').startswith('no record folder')
+
+
+def test_failing_subject_is_reported_not_raised(tmp_path):
+    data_dir, stim_dir, _ = make_cohort(tmp_path)
+    entry = decode_subject(('Subj2', data_dir, stim_dir, {'backend': 'fixture', 'cache': False}))
+    assert entry['status'] == 'failed'
+    assert entry['error'] and entry['traceback']
+
+
+def test_decode_cohort_manifest(tmp_path):
+    data_dir, stim_dir, fixtures = make_cohort(tmp_path)
+    manifest = str(tmp_path / 'manifest.json')
+    run = decode_cohort(data_dir, processes=2, stim_dir=stim_dir, manifest=manifest,
+                        backend='fixture', fixture_dir=fixtures, cache=False)
+    assert (run['n_ok'], run['n_failed'], run['n_skipped']) == (1, 0, 1)
+    status = dict((e['subj'], e['status']) for e in run['subjects'])
+    assert status == {'Subj1': 'ok', 'Subj2': 'skipped'}
+    assert run['subjects'][0]['n_items'] == 1
+    with open(manifest) as f:
+        assert json.load(f)['n_ok'] == 1
+    assert os.path.isfile(str(tmp_path / 'manifest_stats.csv'))
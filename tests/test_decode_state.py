@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+decode_state: which trials need decoding/scoring again, and the saved state file
+"""
+import json
+
+import numpy as np
+
+from decode_state import STATE_VERSION, DecodeState, plain_rows
+
+ROWS = {'item': ['Tom Hanks', 'acorn'], 'intrusion': [0, 1], 'onset': [1.0, 3.0]}
+
+
+def wav_path(tmp_path):
+    wav = tmp_path / 'subj-0.wav'
+    wav.write_bytes(b'RIFF')
+    (tmp_path / 'subj-0.wav.p').write_bytes(b'')
+    return str(wav)
+
+
+def test_needs_decode(tmp_path):
+    wav = wav_path(tmp_path)
+    state = DecodeState(str(tmp_path / 'subj[STATE].json'))
+    assert state.needs_decode(wav, 'a')
+    state.mark_decoded(wav, 'a')
+    assert not state.needs_decode(wav, 'a')
+    # changed audio
+    assert state.needs_decode(wav, 'b')
+    # pickle gone
+    (tmp_path / 'subj-0.wav.p').unlink()
+    assert state.needs_decode(wav, 'a')
+
+
+def test_cached_rows_invalidation(tmp_path):
+    wav = wav_path(tmp_path)
+    state = DecodeState(str(tmp_path / 'subj[STATE].json'))
+    state.mark_decoded(wav, 'a')
+    assert state.cached_rows(wav, 'p1', 'stim1', 1) is None
+    state.store_rows(wav, 'p1', 'stim1', 1, ROWS)
+    assert state.cached_rows(wav, 'p1', 'stim1', 1) == ROWS
+    # new pickle, other stimuli or newer scoring code: score again
+    assert state.cached_rows(wav, 'p2', 'stim1', 1) is None
+    assert state.cached_rows(wav, 'p1', 'stim2', 1) is None
+    assert state.cached_rows(wav, 'p1', 'stim1', 2) is None
+    # rows edited by hand no longer match their checksum
+    state.trials['subj-0.wav']['rows']['intrusion'][1] = 0
+    assert state.cached_rows(wav, 'p1', 'stim1', 1) is None
+
+
+def test_new_audio_drops_rows(tmp_path):
+    wav = wav_path(tmp_path)
+    state = DecodeState(str(tmp_path / 'subj[STATE].json'))
+    state.mark_decoded(wav, 'a')
+    state.store_rows(wav, 'p1', 'stim1', 1, ROWS)
+    state.mark_decoded(wav, 'a')
+    assert state.cached_rows(wav, 'p1', 'stim1', 1) == ROWS
+    state.mark_decoded(wav, 'b')
+    assert state.cached_rows(wav, 'p1', 'stim1', 1) is None
+
+
+def test_save_and_reload(tmp_path):
+    wav = wav_path(tmp_path)
+    path = str(tmp_path / 'subj[STATE].json')
+    state = DecodeState(path)
+    state.mark_decoded(wav, 'a')
+    state.store_rows(wav, 'p1', 'stim1', 1, ROWS)
+    state.save()
+    loaded = DecodeState(path)
+    assert not loaded.needs_decode(wav, 'a')
+    assert loaded.cached_rows(wav, 'p1', 'stim1', 1) == ROWS
+    assert not (tmp_path / 'subj[STATE].json.tmp').exists()
+
+
+def test_other_version_or_broken_file_starts_over(tmp_path):
+    wav = wav_path(tmp_path)
+    path = tmp_path / 'subj[STATE].json'
+    path.write_text(json.dumps({'version': STATE_VERSION + 1, 'trials': {'subj-0.wav': {'wav_sha': 'a'}}}))
+    assert DecodeState(str(path)).needs_decode(wav, 'a')
+    path.write_text('{not json')
+    assert DecodeState(str(path)).trials == {}
+
+
+def test_plain_rows():
+    rows = plain_rows({'onset': np.array([1.5, 2.0]), 'category': [np.int64(1), 2], 'item': ['acorn', 'x']})
+    assert rows == {'onset': [1.5, 2.0], 'category': [1, 2], 'item': ['acorn', 'x']}
+    assert type(rows['category'][0]) is int
+    json.dumps(rows)
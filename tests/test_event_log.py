@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+event_log: append-only events file, same csv text as the old dataframe rewrite
+"""
+import math
+
+import pandas as pd
+import pytest
+
+from event_log import EventWriter
+
+COL_NAMES = ['type', 'item', 'resp', 'rt', 'trialtime', 'duration', 'runtime', 'isi']
+ITEMS = [dict(type=['fix_dist', 'stim_pres'], item=['+', 'Tom Hanks'], resp=[[], 'period'], rt=[[], 0.8123],
+              trialtime=[0.0, 5.0166], duration=[5.0, 2.5], runtime=[[], []], isi=5),
+         dict(type=['math_dist', 'math_ans', 'stim_pres'], item=[7, '12?', 'acorn'], resp=[[], 'slash', 'NaN'],
+              rt=[[], 1.25, 'NaN'], trialtime=[7.5, 8.4, 13.0], duration=[0.8, 1.1, 2.5], runtime=[[], [], []],
+              isi=6)]
+
+
+def test_csv_matches_old_rewrite(tmp_path):
+    stem = str(tmp_path / 's1_events')
+    events = EventWriter(stem, COL_NAMES)
+    assert events.paths == [stem + '.csv']
+    for values in ITEMS:
+        events.write(**values)
+    events.close()
+    assert (events.n_writes, events.n_rows) == (2, 5)
+
+    # what the script used to do after every item: rebuild the frame, rewrite the csv
+    frames = [pd.DataFrame(dict((c, v if isinstance(v, list) else [v] * len(values['type']))
+                                for c, v in values.items()))[COL_NAMES] for values in ITEMS]
+    old = str(tmp_path / 'old.csv')
+    pd.concat(frames, ignore_index=True).to_csv(old, index=False)
+    with open(stem + '.csv') as new_file, open(old) as old_file:
+        assert new_file.read() == old_file.read()
+
+
+def test_rows_are_on_disk_after_each_write(tmp_path):
+    stem = str(tmp_path / 's1_events')
+    events = EventWriter(stem, COL_NAMES, fsync_every=0)
+    events.write(**ITEMS[0])
+    # readable before close, as after a crash
+    assert list(pd.read_csv(stem + '.csv')['item']) == ['+', 'Tom Hanks']
+    assert events.write(**dict((c, []) for c in COL_NAMES)) == 0
+    events.close()
+    assert len(pd.read_csv(stem + '.csv')) == 2
+
+
+def test_bad_columns_and_formats(tmp_path):
+    stem = str(tmp_path / 's1_events')
+    with pytest.raises(ValueError):
+        EventWriter(stem, COL_NAMES, formats=('xlsx',))
+    events = EventWriter(stem, COL_NAMES)
+    with pytest.raises(ValueError):
+        events.write(type=['a', 'b'], item=['x'])
+    events.close()
+
+
+def test_arrow_stream(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    stem = str(tmp_path / 's1_events')
+    events = EventWriter(stem, COL_NAMES, formats=('csv', 'arrow'))
+    for values in ITEMS:
+        events.write(**values)
+    events.close()
+    with pa.OSFile(stem + '.arrow', 'rb') as f:
+        table = pa.ipc.open_stream(f).read_all()
+    assert table.num_rows == 5
+    rt = table.column('rt').to_pylist()
+    # empty responses ([]) are nulls, the 'NaN' strings the script writes are nan
+    assert rt[:4] == [None, 0.8123, None, 1.25] and math.isnan(rt[4])
+    assert table.column('item').to_pylist() == ['+', 'Tom Hanks', '7', '12?', 'acorn']
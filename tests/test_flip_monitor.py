@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+flip_monitor: dropped frames per routine, pauses, the ring buffer and the QC table
+"""
+import csv
+
+from flip_monitor import FlipMonitor
+
+FRAME = 0.01
+
+
+class FakeWin(object):
+    """
+    win.flip returning scripted flip times
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.next_interval = FRAME
+
+    def flip(self, clearBuffer=True):
+        self.now = self.now + self.next_interval
+        self.next_interval = FRAME
+        return self.now
+
+
+def flip_n(win, n):
+    for _ in range(n):
+        win.flip()
+
+
+def test_counts_dropped_frames_per_routine(tmp_path):
+    win = FakeWin()
+    path = str(tmp_path / 's1_frames.csv')
+    flips = FlipMonitor(win, FRAME, path, ['fixation', 'stim_pres']).install()
+
+    flips.set_routine('fixation')
+    flip_n(win, 6)
+    win.next_interval = 3 * FRAME  # two frames missed
+    flip_n(win, 4)
+    flips.set_routine('stim_pres')
+    flip_n(win, 5)
+    # a deliberate wait (core.wait, waitKeys) isn't a drop
+    flips.pause()
+    win.next_interval = 2.0
+    flip_n(win, 3)
+    flips.end_trial('t3_1')
+
+    flips.set_routine('stim_pres')
+    win.next_interval = 1.6 * FRAME
+    flip_n(win, 2)
+    summary = flips.close()
+
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    trials = [(r['trial'], r['routine'], r['n_frames'], r['n_dropped']) for r in rows]
+    # the first flip of the session has no interval
+    assert trials == [('t3_1', 'fixation', '9', '1'), ('t3_1', 'stim_pres', '7', '0'),
+                      ('end', 'stim_pres', '2', '1')]
+    assert rows[0]['max_interval_ms'] == '30.00'
+    assert rows[0]['mean_interval_ms'] == '%.2f' % (1000 * (8 * FRAME + 3 * FRAME) / 9)
+    assert summary == {'fixation': {'frames': 9, 'dropped': 1, 'max_interval_ms': 30.0},
+                       'stim_pres': {'frames': 9, 'dropped': 1, 'max_interval_ms': 16.0}}
+
+
+def test_install_and_close_restore_flip(tmp_path):
+    win = FakeWin()
+    original = win.flip
+    flips = FlipMonitor(win, FRAME, str(tmp_path / 'frames.csv'), ['fixation']).install()
+    assert win.flip != original
+    assert win.flip() == FRAME  # the flip time still comes back to the caller
+    flips.close()
+    assert win.flip == original
+
+
+def test_ring_buffer_keeps_last_flips(tmp_path):
+    win = FakeWin()
+    flips = FlipMonitor(win, FRAME, str(tmp_path / 'frames.csv'), ['fixation', 'math'], capacity=5).install()
+    assert len(flips.times) == 8  # rounded up to a power of two
+    flips.set_routine('fixation')
+    flip_n(win, 10)
+    flips.set_routine('math')
+    flip_n(win, 2)
+    times, routines = flips.recent(4)
+    assert [round(t, 6) for t in times] == [0.09, 0.10, 0.11, 0.12]
+    assert routines == ['fixation', 'fixation', 'math', 'math']
+    assert len(flips.recent()[0]) == 8
+    flips.set_routine('unknown')  # falls back to 'other'
+    flip_n(win, 1)
+    assert flips.recent(1)[1] == ['other']
+    flips.close()
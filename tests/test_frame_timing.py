@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+frame_timing: frame counts at the measured rate and the OnsetLog rows
+"""
+import csv
+
+from frame_timing import FrameTiming, OnsetLog
+
+
+class FakeWin(object):
+    """
+    win.callOnFlip / win.flip with a clock that advances one frame per flip
+    """
+
+    def __init__(self, frame_dur):
+        self.now = 0.0
+        self.frame_dur = frame_dur
+        self.pending = []
+
+    def clock(self):
+        return self.now
+
+    def callOnFlip(self, fn, *args):
+        self.pending.append((fn, args))
+
+    def flip(self):
+        self.now = self.now + self.frame_dur
+        pending, self.pending = self.pending, []
+        for fn, args in pending:
+            fn(*args)
+
+
+def test_frames_at_measured_rate():
+    assert FrameTiming(60).frames(2.5) == 150
+    assert FrameTiming(120).frames(2.5) == 300
+    assert FrameTiming(None).rate == 60.0
+    assert FrameTiming(60).frames(0.001) == 1
+    assert FrameTiming(60).frames(0.999, truncate=True) == 59
+    assert FrameTiming(60).frames(0) == 0
+    start = FrameTiming(60).schedule([('buffer', 1.0), ('fixation', 1.0), ('target', 0.5)])
+    assert list(start.items()) == [('buffer', 0), ('fixation', 60), ('target', 120), ('end', 150)]
+
+
+def test_onset_rows(tmp_path):
+    timing = FrameTiming(100)
+    win = FakeWin(timing.frame_dur)
+    path = str(tmp_path / 'onsets.csv')
+    onsets = OnsetLog(win, path, timing, clock=win.clock)
+
+    onsets.start_trial('t3_1')
+    onsets.mark('disS', 0, 0)
+    for frameN in range(5):
+        if frameN == 2:
+            onsets.mark('mthS', None, frameN)  # no intended onset
+        if frameN == 3:
+            onsets.mark('imgS', 2)  # two frames late, frame from the flip time
+        win.flip()
+    onsets.mark_now('imgK')
+    onsets.close()
+
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert [r['event'] for r in rows] == ['disS', 'mthS', 'imgS', 'imgK']
+    dis, mth, img, key = rows
+    assert (dis['intended_frame'], dis['actual_frame'], dis['actual_onset'], dis['error_ms']) == ('0', '0', '0.0000', '0.0')
+    assert (mth['intended_frame'], mth['intended_onset'], mth['error_ms']) == ('', '', '')
+    assert mth['actual_onset'] == '0.0200'
+    assert (img['actual_frame'], img['intended_onset'], img['error_ms']) == ('3', '0.0200', '10.0')
+    # between flips: the time of the call, after the fifth flip
+    assert (key['actual_frame'], key['actual_onset'], key['intended_frame']) == ('4', '0.0400', '')
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+decoding modules import without touching the disk; the stim pool loads lazily
+"""
+import os
+import subprocess
+import sys
+
+from stim_table import NAME_FILES, TABLE_FILE, get_pool
+from test_recall_decoders import NAMES, make_stimuli
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_leaves_cwd_alone(tmp_path):
+    # run from an empty folder without ../stimuli: importing must not chdir, read or fail
+    cwd = tmp_path / 'somewhere'
+    cwd.mkdir()
+    code = ('import os, sys; before = os.getcwd(); import decode_all_wav, wav_to_pickle; '
+            'assert os.getcwd() == before; assert "quail" not in sys.modules; print("ok")')
+    env = dict(os.environ, PYTHONPATH=REPO)
+    out = subprocess.run([sys.executable, '-c', code], cwd=str(cwd), env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == 'ok'
+    assert os.listdir(str(cwd)) == []
+
+
+def test_pool_loads_on_first_use(tmp_path):
+    stim_dir = str(tmp_path / 'stimuli')
+    make_stimuli(stim_dir)
+    pool = get_pool(stim_dir)
+    assert get_pool(stim_dir + os.sep) is pool
+    assert not os.path.isfile(os.path.join(stim_dir, TABLE_FILE))
+    assert pool.category_of('acorn') == 3
+    assert os.path.isfile(os.path.join(stim_dir, TABLE_FILE))
+    assert pool.total_list == sum((NAMES[fname] for fname, _ in NAME_FILES), [])
+
+
+def test_pools_of_two_folders(tmp_path):
+    first = str(tmp_path / 'a')
+    second = str(tmp_path / 'b')
+    make_stimuli(first)
+    make_stimuli(second)
+    with open(os.path.join(second, 'obj_names.txt'), 'a') as f:
+        f.write('banana\n')
+    assert get_pool(first) is not get_pool(second)
+    assert get_pool(first).category_of('banana') == 0
+    assert get_pool(second).category_of('banana') == 3
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+NSDispatcher against the local NetStation stand-in
+"""
+import pytest
+
+from ns_dispatch import NSDispatcher, NetStationStandIn, ProtocolClient
+
+
+@pytest.fixture
+def netstation():
+    server = NetStationStandIn(delay=0.002)
+    ns = ProtocolClient(server.host, server.port)
+    ns.BeginSession()
+    yield server, ns
+    ns.EndSession()
+    server.close()
+
+
+def test_events_arrive_in_order(netstation):
+    server, ns = netstation
+    ns_out = NSDispatcher(ns, sync_every=60)
+    for n in range(50):
+        ns_out.send('ev%02d' % n, label='L' + str(n), timestamp=1000 + n)
+    stats = ns_out.stop()
+    assert stats['sent'] == 50 and stats['failed'] == 0
+    assert [e[0] for e in server.events] == ['ev%02d' % n for n in range(50)]
+    assert [e[1] for e in server.events] == [1000 + n for n in range(50)]
+    assert [e[2] for e in server.events] == ['L' + str(n) for n in range(50)]
+
+
+def test_timestamp_taken_at_send(netstation):
+    server, ns = netstation
+    clock = iter(range(500, 600))
+    ns_out = NSDispatcher(ns, clock=lambda: next(clock))
+    ns_out.send('imgS')
+    ns_out.send('imgE')
+    ns_out.stop()
+    assert [(e[0], e[1]) for e in server.events] == [('imgS', 500), ('imgE', 501)]
+
+
+def test_syncs_once_per_interval(netstation):
+    server, ns = netstation
+    ns_out = NSDispatcher(ns, sync_every=60)
+    for n in range(20):
+        ns_out.send('ev%02d' % n)
+    stats = ns_out.stop()
+    # one sync when the thread starts, none per event
+    assert stats['syncs'] == 1
+    assert server.counts[b'T'] == 1
+
+
+def test_stop_flushes_the_queue():
+    slow = NetStationStandIn(delay=0.01)
+    slow_ns = ProtocolClient(slow.host, slow.port)
+    ns_out = NSDispatcher(slow_ns, sync_every=60)
+    for n in range(30):
+        ns_out.send('ev%02d' % n)
+    assert ns_out.pending() > 0
+    stats = ns_out.stop()
+    assert ns_out.pending() == 0
+    assert stats['sent'] == 30 and len(slow.events) == 30
+    assert stats['latency_ms']['n'] == 30
+    slow_ns.EndSession()
+    slow.close()
+
+
+def test_errors_dont_stop_the_thread():
+    class Broken(object):
+        def sync(self):
+            pass
+
+        def send_event(self, key, **kwargs):
+            if key == 'bad':
+                raise IOError('link down')
+
+    ns_out = NSDispatcher(Broken())
+    for key in ['ok1', 'bad', 'ok2']:
+        ns_out.send(key)
+    stats = ns_out.stop()
+    assert stats['sent'] == 2 and stats['failed'] == 1
+    assert stats['errors'] and stats['errors'][0].startswith('bad')
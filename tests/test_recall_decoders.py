@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+fixture backend: decode and score a trial without any recognizer
+"""
+import json
+import os
+import wave
+
+import pandas as pd
+
+from decode_all_wav import decode, score_trial
+from recall_decoders import fixture_decoder
+from stim_table import NAME_FILES, load_stim_table
+
+NAMES = {'cel_names.txt': ['Tom Hanks', 'Emma Stone', 'Lady Gaga'],
+         'loc_names.txt': ['Eiffel Tower', 'Grand Canyon', 'Big Ben'],
+         'obj_names.txt': ['acorn', 'hammer', 'red apple']}
+
+
+def write_wav(path, seconds=2.0, rate=16000):
+    w = wave.open(path, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(rate)
+    w.writeframes(b'\x00\x00' * int(seconds * rate))
+    w.close()
+
+
+def make_stimuli(stim_dir):
+    os.makedirs(stim_dir)
+    for fname, _ in NAME_FILES:
+        with open(os.path.join(stim_dir, fname), 'w') as f:
+            f.write('\n'.join(NAMES[fname]) + '\n')
+
+
+def test_fixture_response_scored(tmp_path):
+    stim_dir = str(tmp_path / 'stimuli')
+    make_stimuli(stim_dir)
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    # 'tom hanks' recalled, 'acorn' twice (repeat), 'big ben' is not on this list
+    words = [['tom', 1.0, 1.3], ['hanks', 1.3, 1.7], ['acorn', 3.0, 3.4], ['big', 5.0, 5.2],
+             ['ben', 5.2, 5.5], ['acorn', 7.0, 7.4]]
+    (fixtures / 'subj-0.wav.json').write_text(json.dumps(words))
+    wav = str(tmp_path / 'subj-0.wav')
+    write_wav(wav)
+
+    response = fixture_decoder(str(fixtures))(wav, speech_context=['Tom Hanks', 'acorn'])
+    table = load_stim_table(stim_dir)
+    found, onset, offset, rows = score_trial([response], ['Tom Hanks', 'acorn', 'hammer'], table)
+
+    assert list(found) == ['tom', 'hanks', 'acorn', 'big', 'ben', 'acorn']
+    assert rows['item'] == ['Tom Hanks', 'acorn', 'Big Ben', 'acorn']
+    assert rows['category'] == [1, 3, 2, 3]
+    assert rows['intrusion'] == [0, 0, 1, -1]
+    assert list(rows['onset']) == [1.0, 3.0, 5.0, 7.0]
+    assert list(rows['offset']) == [1.7, 3.4, 5.5, 7.4]
+
+
+def test_fixture_decode_is_deterministic(tmp_path):
+    wav = str(tmp_path / 'subj-3.wav')
+    write_wav(wav)
+    context = ['Tom Hanks', 'Grand Canyon', 'acorn', 'hammer']
+    first = fixture_decoder()(wav, speech_context=context)
+    assert fixture_decoder()(wav, speech_context=context) == first
+    for result in first['results']:
+        for w in result['alternatives'][0]['words']:
+            assert any(w['word'] in name.split() for name in context)
+
+
+def test_decode_subject_with_fixture_backend(tmp_path):
+    stim_dir = str(tmp_path / 'stimuli')
+    make_stimuli(stim_dir)
+    pool = sum(NAMES.values(), [])
+    # 18 practice items, then one 27 item list
+    stim = [pool[k % len(pool)] for k in range(18 + 27)]
+    os.makedirs(os.path.join(stim_dir, 'export_stim'))
+    pd.DataFrame({'stimName': stim}).to_csv(os.path.join(stim_dir, 'export_stim', 'subj1stimuli.csv'), index=False)
+    data_dir = tmp_path / 'data'
+    record = data_dir / 'Subj1' / 'record'
+    record.mkdir(parents=True)
+    write_wav(str(record / 'subj1-0.wav'))
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    (fixtures / 'subj1-0.wav.json').write_text(json.dumps([['hammer', 0.5, 0.9], ['um', 1.0, 1.1]]))
+
+    df = decode('Subj1', data_dir=str(data_dir), stim_dir=stim_dir, backend='fixture',
+                fixture_dir=str(fixtures), cache=False)
+    assert list(df['item']) == ['hammer', 'um']
+    assert list(df['intrusion']) == [0, 1]
+    assert os.path.isfile(str(record / 'subj1[ANNOTATION].csv'))
+    with open(str(record / 'subj1[STATE].json')) as f:
+        assert 'subj1-0.wav' in json.load(f)['trials']
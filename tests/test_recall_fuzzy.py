@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+recall_fuzzy: edit distance, soundex, BK-tree search and FuzzyIndex.match on
+misrecognized recalls
+"""
+import pytest
+
+from recall_fuzzy import BKTree, FuzzyIndex, levenshtein, soundex
+
+NAMES = ['tom hanks', 'emma stone', 'golden gate bridge', 'acorn', 'handle', 'ladle', 'needle']
+UNIQUE = {'tom': 'tom hanks', 'hanks': 'tom hanks', 'emma': 'emma stone', 'stone': 'emma stone'}
+
+
+def fuzzy_index(min_confidence=0.6):
+    return FuzzyIndex(dict((n, n) for n in NAMES), UNIQUE, min_confidence=min_confidence)
+
+
+def test_levenshtein():
+    assert levenshtein('kitten', 'sitting') == 3
+    assert levenshtein('acorn', 'acorns') == 1
+    assert levenshtein('', 'abc') == 3
+    assert levenshtein('hanks', 'hanks') == 0
+    # farther than max_dist stops early at max_dist + 1
+    assert levenshtein('hammer', 'hammock', max_dist=1) == 2
+    assert levenshtein('a', 'abcdef', max_dist=2) == 3
+
+
+def test_soundex():
+    assert soundex('hanks') == 'h520'
+    assert soundex('Hanx') == 'h520'
+    assert soundex('Robert') == soundex('Rupert') == 'r163'
+    assert soundex('Ashcraft') == 'a261'  # h/w don't separate same codes
+    assert soundex('Tymczak') == 't522'
+    assert soundex('Pfister') == 'p236'
+    assert soundex('42') == ''
+
+
+def test_bktree_search():
+    tree = BKTree(['acorn', 'apron', 'hammer', 'hammock', 'spoon', 'spool', 'tom hanks'])
+    assert tree.search('acorns', 1) == [('acorn', 1)]
+    assert sorted(tree.search('spoom', 1)) == [('spool', 1), ('spoon', 1)]
+    assert tree.search('hammer', 0) == [('hammer', 0)]
+    assert tree.search('tom hanx', 2) == [('tom hanks', 2)]
+    assert tree.search('banana', 2) == []
+    assert BKTree().search('acorn', 3) == []
+
+
+@pytest.mark.parametrize('said, name, last', [
+    ('tom hanx', 'tom hanks', 1),                     # misheard word of a name
+    ('hanx', 'tom hanks', 0),                         # misheard unique word alone
+    ('emma stoan', 'emma stone', 1),                  # same soundex, one edit
+    ('golden gait bridge', 'golden gate bridge', 2),  # homophone inside a long name
+    ('acorns', 'acorn', 0),                           # plural
+])
+def test_match_misrecognized(said, name, last):
+    match = fuzzy_index().match(said.split(), 0)
+    assert match is not None
+    assert match[:2] == (name, last)
+    assert 0.6 <= match[2] < 1.0
+
+
+def test_match_confidence_floor():
+    fuzzy = fuzzy_index()
+    # 'hanx' vs 'hanks' is exactly at the 0.6 floor
+    assert fuzzy.match(['hanx'], 0)[2] == pytest.approx(0.6)
+    # 'noodel' only sounds like 'needle' (same soundex, similarity 1/3)
+    assert fuzzy.match(['noodel'], 0) is None
+    assert fuzzy_index(min_confidence=0.3).match(['noodel'], 0)[0] == 'needle'
+    # nothing close at all
+    assert fuzzy.match(['hammock'], 0) is None
+
+
+def test_match_skips_known_and_short_words():
+    fuzzy = fuzzy_index()
+    assert fuzzy.match(['acorn'], 0) is None   # exact words are score_tokens' job
+    assert fuzzy.match(['ton'], 0) is None     # too short to call it a misspelling
+    # a filler in front isn't pulled into the name
+    assert fuzzy.match(['um', 'golden', 'gate'], 0) is None
+
+
+def test_studied_bonus_breaks_near_ties():
+    fuzzy = fuzzy_index()
+    # 'hadle': handle 0.833, ladle 0.8 -- within the 0.05 bonus
+    assert fuzzy.match(['hadle'], 0)[0] == 'handle'
+    match = fuzzy.match(['hadle'], 0, studied={'ladle': 'ladle'})
+    assert match[0] == 'ladle'
+    assert match[2] == pytest.approx(0.8)  # the bonus only ranks, confidence is unchanged
+    # 'acorns' is no near tie for anything, a studied name doesn't pull it away
+    assert fuzzy.match(['acorns'], 0, studied={'handle': 'handle'})[0] == 'acorn'
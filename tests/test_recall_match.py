@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+recall_match: phrase trie, unique word map and the recall/intrusion/repeat rules
+"""
+from recall_match import INTRUSION, RECALL, REPEAT, StimIndex, TrialIndex, score_tokens
+
+POOL = ['Tom Hanks', 'Tom Cruise', 'Emma Stone', 'White House', 'The White Tower', 'Stonehenge',
+        'acorn', 'hammer']
+
+
+def scored(words, studied, fuzzy=True):
+    items = score_tokens(words, TrialIndex(studied, StimIndex(POOL)), fuzzy=fuzzy)
+    return [(item, intrusion) for item, intrusion, _, _, _ in items]
+
+
+def test_trie_takes_longest_name():
+    index = StimIndex(POOL)
+    assert index.longest_match(['the', 'white', 'tower', 'now'], 0) == ('the white tower', 2)
+    assert index.longest_match(['white', 'house'], 0) == ('white house', 1)
+    # prefix of a name only
+    assert index.longest_match(['the', 'white'], 0) == (None, 0)
+    assert index.names['tom hanks'] == 'Tom Hanks'
+
+
+def test_unique_map_keeps_words_of_one_name():
+    index = StimIndex(POOL)
+    assert index.unique['hanks'] == 'tom hanks'
+    assert index.unique['house'] == 'white house'
+    for shared in ['tom', 'white']:
+        assert shared not in index.unique
+
+
+def test_recall_intrusion_and_repeat():
+    studied = ['Tom Hanks', 'acorn', 'White House']
+    words = ['Tom', 'Hanks,', 'acorn', 'hammer', 'acorn', 'hammer', 'banana', 'banana']
+    assert scored(words, studied) == [('Tom Hanks', RECALL), ('acorn', RECALL), ('hammer', INTRUSION),
+                                      ('acorn', REPEAT), ('hammer', REPEAT), ('banana', INTRUSION),
+                                      ('banana', REPEAT)]
+
+
+def test_unique_and_shared_words_of_studied_names():
+    studied = ['Tom Hanks', 'White House']
+    # 'hanks' alone recalls Tom Hanks once, 'house' recalls White House,
+    # 'white' and 'tom' are shared with other names and are dropped
+    assert scored(['hanks', 'white', 'hanks', 'tom', 'house'], studied) == [
+        ('Tom Hanks', RECALL), ('White House', RECALL)]
+
+
+def test_exact_word_lookup_before_fuzzy():
+    # 'stone hedge' is close to Stonehenge, but 'stone' is a word of the studied Emma Stone
+    assert scored(['stone', 'hedge'], ['Emma Stone', 'acorn']) == [('Emma Stone', RECALL), ('hedge', INTRUSION)]
+
+
+def test_fuzzy_only_for_unknown_words():
+    studied = ['Tom Hanks', 'acorn']
+    assert scored(['tom', 'hanx', 'acorns'], studied) == [('Tom Hanks', RECALL), ('acorn', RECALL)]
+    assert scored(['tom', 'hanx', 'acorns'], studied, fuzzy=False) == [('hanx', INTRUSION), ('acorns', INTRUSION)]
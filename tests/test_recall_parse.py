@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+recall_parse: recognizer responses (objects or plain dicts) to word timings
+and the float64 onset/offset arrays
+"""
+import datetime
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from recall_parse import WordTiming, duration_parts, load_pickle, parse_response, timing_arrays
+
+
+def dict_response(words_per_result):
+    return {'results': [{'alternatives': [{'transcript': ' '.join(w for w, _, _ in words),
+                                           'words': [{'word': w, 'start_time': start, 'end_time': end}
+                                                     for w, start, end in words]}]}
+                        for words in words_per_result]}
+
+
+def test_duration_parts():
+    assert duration_parts(None) == (0, 0)
+    assert duration_parts({'seconds': 3, 'nanos': 500000000}) == (3, 500000000)
+    # protobuf leaves zero fields out
+    assert duration_parts({'nanos': 200000000}) == (0, 200000000)
+    assert duration_parts({'seconds': 7}) == (7, 0)
+    assert duration_parts(SimpleNamespace(seconds=2, nanos=None)) == (2, 0)
+    assert duration_parts(datetime.timedelta(seconds=61, microseconds=250)) == (61, 250000)
+    assert duration_parts('101.25s') == (101, 250000000)
+    assert duration_parts('4s') == (4, 0)
+    assert duration_parts(1.5) == (1, 500000000)
+
+
+def test_parse_dict_response():
+    response = dict_response([[('tom', {'seconds': 1}, {'seconds': 1, 'nanos': 300000000}),
+                               ('hanks', {'seconds': 1, 'nanos': 300000000}, {'seconds': 2})],
+                              [('acorn', {'seconds': 5, 'nanos': 100000000}, {'seconds': 5, 'nanos': 600000000})]])
+    assert list(parse_response(response)) == [WordTiming('tom', 1.0, 1.3), WordTiming('hanks', 1.3, 2.0),
+                                              WordTiming('acorn', 5.1, 5.6)]
+
+
+def test_parse_response_objects_and_lists():
+    # attribute access like the google response classes, several responses in one pickle
+    word = SimpleNamespace(word='acorn', start_time=SimpleNamespace(seconds=2, nanos=0),
+                           end_time=SimpleNamespace(seconds=2, nanos=400000000))
+    response = SimpleNamespace(results=[SimpleNamespace(alternatives=[SimpleNamespace(transcript='acorn',
+                                                                                      words=[word])])])
+    second = dict_response([[('hammer', '3s', '3.5s')]])
+    assert list(parse_response([response, second])) == [WordTiming('acorn', 2.0, 2.4),
+                                                        WordTiming('hammer', 3.0, 3.5)]
+
+
+def test_parse_skips_empty_results():
+    response = {'results': [{'alternatives': []}, {}]}
+    assert list(parse_response(response)) == []
+    assert list(parse_response({})) == []
+
+
+def test_load_pickle_reads_every_object(tmp_path):
+    path = str(tmp_path / 'subj-0.wav.p')
+    first = dict_response([[('tom', '1s', '1.3s')]])
+    second = dict_response([[('acorn', '2s', '2.4s')]])
+    with open(path, 'wb') as f:
+        pickle.dump(first, f)
+        pickle.dump(second, f)
+    objects = load_pickle(path)
+    assert objects == [first, second]
+    assert [w.word for w in parse_response(objects)] == ['tom', 'acorn']
+
+
+def test_timing_arrays_full_precision():
+    # a day into a recording single nanoseconds still resolve (float32 would be off by seconds)
+    response = dict_response([[('tom', {'seconds': 86399, 'nanos': 1}, {'seconds': 86399, 'nanos': 999999999}),
+                               ('hanks', {'seconds': 123456, 'nanos': 500000000}, {'seconds': 123457})]])
+    words, onset, offset = timing_arrays(response)
+    assert words == ['tom', 'hanks']
+    assert onset.dtype == np.float64 and offset.dtype == np.float64
+    assert onset[0] == 86399 + 1e-9
+    assert offset[0] - onset[0] == pytest.approx(0.999999998, abs=1e-9)
+    assert list(onset[1:]) == [123456.5]
+    assert list(offset[1:]) == [123457.0]
+
+
+def test_timing_arrays_untimed_transcript():
+    response = {'results': [{'alternatives': [{'transcript': 'um acorn'}]},
+                            {'alternatives': [{'transcript': 'hammer', 'words': [
+                                {'word': 'hammer', 'start_time': '3s', 'end_time': '3.5s'}]}]}]}
+    words, onset, offset = timing_arrays(response)
+    assert words == ['um', 'acorn', 'hammer']
+    assert np.isnan(onset[:2]).all() and np.isnan(offset[:2]).all()
+    assert (onset[2], offset[2]) == (3.0, 3.5)
+
+
+def test_timing_arrays_empty():
+    words, onset, offset = timing_arrays({'results': []})
+    assert words == [] and onset.shape == (0,) and offset.shape == (0,)
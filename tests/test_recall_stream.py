@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+recall_stream: chunked wav reading and streaming decode with the stand-in recognizer
+"""
+import wave
+
+from recall_parse import WordTiming, parse_response
+from recall_stream import StandInStreamRecognizer, final_results, stream_decode, streaming_decoder, wav_chunks
+
+WORDS = [('tom', 0.2, 0.4), ('hanks', 0.4, 0.7), ('acorn', 1.6, 1.9)]
+
+
+def write_wav(path, seconds=2.0, rate=8000):
+    w = wave.open(path, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(rate)
+    w.writeframes(b''.join(int(k % 256).to_bytes(2, 'little') for k in range(int(seconds * rate))))
+    w.close()
+
+
+def test_wav_chunks_cover_the_audio(tmp_path):
+    path = str(tmp_path / 'subj-0.wav')
+    write_wav(path, seconds=1.3)
+    chunks = list(wav_chunks(path, chunk_sec=0.5))
+    assert [len(c) for c in chunks] == [8000, 8000, 4800]
+    w = wave.open(path, 'rb')
+    assert b''.join(chunks) == w.readframes(w.getnframes())
+    w.close()
+
+
+def test_final_results_skip_interim():
+    response = {'results': [{'is_final': False, 'alternatives': []}, {'is_final': True, 'alternatives': []},
+                            {'alternatives': []}]}
+    assert len(final_results(response)) == 2
+
+
+def test_stream_decode(tmp_path):
+    path = str(tmp_path / 'subj-0.wav')
+    write_wav(path)
+    pushed = []
+
+    def counted(chunks):
+        for chunk in chunks:
+            pushed.append(chunk)
+            yield chunk
+
+    # words come back with the chunk that passes their offset, not at the end of the file
+    arrivals = []
+    for response in StandInStreamRecognizer(WORDS)(counted(wav_chunks(path, 0.5)), sample_rate=8000):
+        arrivals.append((len(pushed), [r['alternatives'][0]['transcript'] for r in response['results']]))
+    assert arrivals == [(1, ['tom']), (2, ['hanks']), (4, ['acorn'])]
+
+    words = list(stream_decode(path, StandInStreamRecognizer(WORDS), chunk_sec=0.5))
+    assert words == [WordTiming(w, on, off) for w, on, off in WORDS]
+
+
+def test_streaming_decoder_matches_parse(tmp_path):
+    path = str(tmp_path / 'subj-0.wav')
+    write_wav(path)
+    decoder = streaming_decoder(StandInStreamRecognizer(WORDS), chunk_sec=0.25)
+    response = decoder(path, speech_context=['Tom Hanks', 'acorn'])
+    assert [r['alternatives'][0]['transcript'] for r in response['results']] == ['tom', 'hanks', 'acorn']
+    assert list(parse_response(response)) == [WordTiming(w, on, off) for w, on, off in WORDS]
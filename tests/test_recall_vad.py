@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+recall_vad: speech segments and the joined-wav -> original time remap
+"""
+import numpy as np
+
+from recall_parse import parse_response
+from recall_vad import segment_map, speech_segments, vad_decoder, write_wav
+from wav_mmap import WavFile
+
+RATE = 8000
+
+
+def recording(bursts, seconds=10.0, seed=0):
+    """
+    int16 mono recording: quiet noise with loud tone bursts at (start, end) seconds
+    """
+    rng = np.random.RandomState(seed)
+    x = rng.normal(0, 30, int(seconds * RATE))
+    t = np.arange(len(x)) / float(RATE)
+    for start, end in bursts:
+        on = (t >= start) & (t < end)
+        x[on] = x[on] + 8000 * np.sin(2 * np.pi * 220 * t[on])
+    return x.astype(np.int16).reshape(-1, 1)
+
+
+def test_speech_segments_find_padded_bursts():
+    frames = recording([(1.0, 1.5), (5.0, 5.6)])
+    segments = speech_segments(frames, RATE, pad_sec=0.2)
+    assert segments.shape == (2, 2)
+    assert np.allclose(segments / float(RATE), [[0.8, 1.7], [4.8, 5.8]], atol=0.03)
+
+
+def test_speech_segments_merge_and_drop():
+    # 0.3 s apart -> one segment; a 40 ms click is not speech
+    frames = recording([(1.0, 1.5), (1.8, 2.2), (6.0, 6.04)])
+    segments = speech_segments(frames, RATE, pad_sec=0.1, min_gap_sec=0.6)
+    assert np.allclose(segments / float(RATE), [[0.9, 2.3]], atol=0.03)
+    assert len(speech_segments(recording([]), RATE, threshold_db=60)) == 0
+
+
+def test_segment_map_round_trip():
+    rate = 44100
+    # a long recording, so ns offsets are large
+    segments = np.array([[441, 30000], [1000000, 1500000], [3900000, 3969000]], dtype=np.int64)
+    gap = int(round(0.3 * rate))
+    remap = segment_map(segments, rate, gap_sec=0.3)
+    joined_start = 0
+    for start, end in segments:
+        for i in np.linspace(start, end - 1, 50).astype(np.int64):
+            j = joined_start + (i - start)
+            seconds, nanos = remap(int(j * 10 ** 9 // rate) // 10 ** 9, int(j * 10 ** 9 // rate) % 10 ** 9)
+            assert 0 <= nanos < 10 ** 9
+            assert abs(seconds * 10 ** 9 + nanos - i * 10 ** 9 // rate) <= 1
+        joined_start = joined_start + (end - start) + gap
+
+
+def test_segment_map_gap_belongs_to_previous_segment():
+    segments = np.array([[8000, 16000], [40000, 48000]], dtype=np.int64)
+    remap = segment_map(segments, RATE, gap_sec=0.5)
+    # 1 s of speech, then a 0.5 s gap: 1.2 s in the joined wav is 0.2 s past the first segment
+    assert remap(1, 200000000) == (2, 200000000)
+    assert remap(1, 500000000) == (5, 0)
+    assert remap(0, 0) == (1, 0)
+
+
+def test_vad_decoder_reports_original_times(tmp_path):
+    path = str(tmp_path / 'subj-0.wav')
+    write_wav(path, recording([(1.0, 1.5), (5.0, 5.6)]), RATE, 2)
+    seen = {}
+
+    def fake_decoder(wav_file, speech_context=None, save=False, **kwargs):
+        # one word at the start of every speech segment of the joined wav
+        wav = WavFile(wav_file)
+        seen['seconds'] = wav.n_frames / float(wav.sample_rate)
+        loud = np.flatnonzero(np.abs(wav.frames[:, 0].astype(np.int64)) > 4000)
+        starts = [loud[0]] + [b for a, b in zip(loud[:-1], loud[1:]) if b - a > RATE * 0.25]
+        return {'results': [{'alternatives': [{'transcript': 'w', 'words': [
+            {'word': 'w' + str(k), 'start_time': s / float(RATE), 'end_time': s / float(RATE) + 0.1}]}]}
+            for k, s in enumerate(starts)]}
+
+    response = vad_decoder(fake_decoder, gap_sec=0.3, pad_sec=0.2)(path)
+    words = list(parse_response(response))
+    assert seen['seconds'] < 2.5  # only the speech (plus gap) was sent, not 10 s
+    assert [w.word for w in words] == ['w0', 'w1']
+    assert np.allclose([w.onset for w in words], [1.0, 5.0], atol=0.01)
+
+
+def test_vad_decoder_skips_silence(tmp_path):
+    path = str(tmp_path / 'subj-0.wav')
+    write_wav(path, recording([]), RATE, 2)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('silent wav was sent')
+
+    assert vad_decoder(fail, threshold_db=60)(path) == {'results': []}
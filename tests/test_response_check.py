@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+response_check: summary values, incremental updates and summaries of another version
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from response_check import SUMMARY_COLUMNS, SUMMARY_VERSION, load_trials, session_files, summarize, update_summary
+
+# cond, trialN, keys, corr, rt
+TRIALS = [(1, 1, 'period', 1, 1.0), (1, 2, 'slash', 0, 2.0), (1, 3, 'None', 1, None), (1, 4, 'period', 1, 1.0),
+          (2, 1, 'period', 1, 0.5), (2, 2, 'None', 0, None), (2, 3, 'slash', 0, 1.5), (2, 4, 'slash', 1, 1.0)]
+
+
+def write_session(data_dir, subj, trials=TRIALS):
+    rows = [{'trials_3.thisN': None}]  # instruction row outside the main loop
+    for n, (cond, trial_n, keys, corr, rt) in enumerate(trials):
+        rows.append({'trials_3.thisN': n, 'trial_keyResp.keys': keys, 'trial_keyResp.corr': corr,
+                     'trial_keyResp.rt': rt, 'cond': cond, 'trialN': trial_n, 'feat': 'x'})
+    path = os.path.join(data_dir, subj + '_sfv_eeg1_2020.csv')
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def test_summary_values(tmp_path):
+    data_dir = str(tmp_path)
+    write_session(data_dir, '01')
+    pd.DataFrame({'a': [1]}).to_csv(os.path.join(data_dir, '01_sfv_eeg1_2020_onsets.csv'), index=False)
+    sessions = session_files(data_dir)
+    assert list(sessions) == ['01'] and len(sessions['01']) == 1
+    row = summarize(load_trials(sessions)).iloc[0]
+
+    assert (row['stim_period'], row['stim_slash'], row['stim_nan'], row['stim_total']) == (3, 3, 2, 8)
+    assert (row['stim_period%'], row['total_response%'], row['avg_rt']) == (50.0, 75.0, 1.17)
+    assert (row['c1_resp'], row['c1_total'], row['c1%']) == (3, 4, 75.0)
+    assert (row['c2_resp'], row['c2_total'], row['c2_resp%'], row['c2_overall_accuracy']) == (3, 4, 0.75, 50.0)
+    # one trial per quartile here: the bin accuracy is that trial's corr, starting at its trialN
+    assert [row['c1_q' + str(b)] for b in range(4)] == [1.0, 0.0, 1.0, 1.0]
+    assert [row['c2_q' + str(b)] for b in range(4)] == [1.0, 0.0, 0.0, 1.0]
+    assert [row['c1_q' + str(b) + 'trialN'] for b in range(4)] == [1, 2, 3, 4]
+    assert row['summary_version'] == SUMMARY_VERSION
+
+
+def test_update_only_reads_new_subjects(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    os.makedirs(data_dir)
+    summary_file = str(tmp_path / 'responseSummary.csv')
+    write_session(data_dir, '01')
+    first = update_summary(data_dir, summary_file)
+    assert list(first['subj']) == ['01']
+    assert list(first.columns) == SUMMARY_COLUMNS
+
+    # 01 changed on disk but is already summarized: only 02 is read
+    write_session(data_dir, '01', TRIALS[:2])
+    write_session(data_dir, '02', TRIALS[:4])
+    second = update_summary(data_dir, summary_file)
+    assert list(second['subj']) == ['01', '02']
+    assert list(second['stim_total']) == [8, 4]
+    assert list(pd.read_csv(summary_file, dtype={'subj': str})['subj']) == ['01', '02']
+
+    rebuilt = update_summary(data_dir, summary_file, rebuild=True)
+    assert list(rebuilt['stim_total']) == [2, 4]
+
+
+def test_other_version_needs_rebuild_and_keeps_lost_subjects(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    os.makedirs(data_dir)
+    summary_file = str(tmp_path / 'responseSummary.csv')
+    write_session(data_dir, '01')
+    # summary of the old script: no summary_version, bins named cN_b / cN_btrialN
+    old = pd.DataFrame({'subj': ['01', '99'], 'stim_total': [5, 7], 'c1_0': [0.5, 0.25], 'c1_0trialN': [-1, -1]})
+    old.to_csv(summary_file, index=False)
+    with open(summary_file) as f:
+        written = f.read()
+
+    with pytest.raises(ValueError):
+        update_summary(data_dir, summary_file)
+    with open(summary_file) as f:
+        assert f.read() == written
+
+    summary = update_summary(data_dir, summary_file, rebuild=True).set_index('subj')
+    assert list(summary.index) == ['01', '99']
+    assert summary.loc['01', 'stim_total'] == 8 and summary.loc['01', 'summary_version'] == SUMMARY_VERSION
+    # 99 has no session files left: its row stays, with its own columns
+    assert summary.loc['99', 'stim_total'] == 7 and summary.loc['99', 'summary_version'] == 1
+    assert summary.loc['99', 'c1_0trialN'] == -1 and np.isnan(summary.loc['01', 'c1_0trialN'])
+    assert np.isnan(summary.loc['99', 'c1_q0'])
+
+    # rows that can't be recomputed don't block the next plain update
+    write_session(data_dir, '02')
+    assert list(update_summary(data_dir, summary_file)['subj']) == ['01', '02', '99']
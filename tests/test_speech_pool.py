@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+decode_pool with a fake decoder (no recognizer, no network)
+"""
+import threading
+import time
+
+import pytest
+
+from speech_pool import decode_pool, decode_with_retry
+
+
+class FlakyDecoder(object):
+    """
+    fails the first `fails[wav]` calls for a wav, sleeps `delay[wav]` seconds,
+    then returns ('text of', wav, speech_context)
+    """
+
+    def __init__(self, fails=None, delay=None):
+        self.fails = dict(fails or {})
+        self.delay = delay or {}
+        self.calls = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, wav_file, speech_context=None, **kwargs):
+        with self._lock:
+            self.calls[wav_file] = self.calls.get(wav_file, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay.get(wav_file, 0.0))
+            with self._lock:
+                if self.fails.get(wav_file, 0) > 0:
+                    self.fails[wav_file] -= 1
+                    raise IOError('recognizer unavailable')
+            return ('text of', wav_file, speech_context, kwargs.get('keypath'))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_results_in_input_order():
+    wavs = ['t1.wav', 't2.wav', 't3.wav', 't4.wav']
+    # later wavs finish first
+    decoder = FlakyDecoder(delay={'t1.wav': 0.06, 't2.wav': 0.04, 't3.wav': 0.02})
+    results = decode_pool(wavs, [['a'], ['b'], ['c'], ['d']], decoder, max_workers=4, keypath='key.json')
+    assert results == [('text of', w, [c], 'key.json') for w, c in zip(wavs, 'abcd')]
+
+
+def test_retries_until_success():
+    decoder = FlakyDecoder(fails={'t2.wav': 2})
+    results = decode_pool(['t1.wav', 't2.wav'], None, decoder, retries=3, backoff=0.001)
+    assert [r[1] for r in results] == ['t1.wav', 't2.wav']
+    assert decoder.calls == {'t1.wav': 1, 't2.wav': 3}
+
+
+def test_gives_up_after_retries():
+    decoder = FlakyDecoder(fails={'t1.wav': 5})
+    with pytest.raises(IOError):
+        decode_with_retry(decoder, 't1.wav', retries=2, backoff=0.001)
+    assert decoder.calls['t1.wav'] == 3
+
+
+def test_failure_raised_after_the_others_are_done():
+    decoder = FlakyDecoder(fails={'t2.wav': 10}, delay={'t3.wav': 0.03})
+    done = []
+    with pytest.raises(IOError):
+        decode_pool(['t1.wav', 't2.wav', 't3.wav'], None, decoder, retries=1, backoff=0.001,
+                    on_done=lambda i, result: done.append(i))
+    assert sorted(done) == [0, 2]
+
+
+def test_bounded_workers():
+    wavs = ['t' + str(k) + '.wav' for k in range(8)]
+    decoder = FlakyDecoder(delay=dict((w, 0.02) for w in wavs))
+    decode_pool(wavs, None, decoder, max_workers=2)
+    assert decoder.max_in_flight <= 2
+
+
+def test_needs_one_context_per_wav():
+    with pytest.raises(ValueError):
+        decode_pool(['t1.wav', 't2.wav'], [['a']], FlakyDecoder())
+    assert decode_pool([], None, FlakyDecoder()) == []
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+stim_table cache: plain data on disk, matcher index rebuilt on load
+"""
+import os
+
+from recall_match import StimIndex
+from stim_table import NAME_FILES, TABLE_FILE, load_stim_table
+
+NAMES = {'cel_names.txt': ['Tom Hanks', 'Emma Stone'],
+         'loc_names.txt': ['Eiffel Tower', 'Big Ben'],
+         'obj_names.txt': ['acorn', 'hammer']}
+
+
+def make_stimuli(stim_dir):
+    for fname, _ in NAME_FILES:
+        with open(os.path.join(stim_dir, fname), 'w') as f:
+            f.write('\n'.join(NAMES[fname]) + '\n')
+
+
+def test_cache_holds_no_matcher_objects(tmp_path):
+    make_stimuli(str(tmp_path))
+    load_stim_table(str(tmp_path))
+    with open(os.path.join(str(tmp_path), TABLE_FILE), 'rb') as f:
+        blob = f.read()
+    for name in [b'StimIndex', b'FuzzyIndex', b'BKTree']:
+        assert name not in blob
+
+
+def test_cached_table_rebuilds_index(tmp_path):
+    make_stimuli(str(tmp_path))
+    built = load_stim_table(str(tmp_path))
+    cached = load_stim_table(str(tmp_path))
+    assert cached is not built
+    assert isinstance(cached.index, StimIndex)
+    assert cached.index.names == built.index.names
+    assert cached.category_of('tom  hanks') == 1
+    assert cached.index.fuzzy.match(['hanx'], 0)[0] == 'tom hanks'
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+transcription_cache: hits skip the recognizer, the wav is hashed once and an
+unchanged wav + '.p' isn't rewritten
+"""
+import os
+import pickle
+
+import transcription_cache
+from transcription_cache import TranscriptionCache, cached_decoder, wav_sha
+
+from test_recall_decoders import write_wav
+
+
+class CountingDecoder(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, wav_file, speech_context=None, save=False, **kwargs):
+        self.calls = self.calls + 1
+        return {'words': ['tom', 'hanks'], 'wav': os.path.basename(wav_file)}
+
+
+def test_hit_skips_recognizer_and_keeps_pickle(tmp_path):
+    wav = str(tmp_path / 'subj-0.wav')
+    write_wav(wav)
+    recognizer = CountingDecoder()
+    cache = TranscriptionCache(str(tmp_path / 'cache'))
+    decode_fn = cached_decoder(recognizer, cache)
+
+    first = decode_fn(wav, speech_context=['Tom Hanks'], save=True)
+    with open(wav + '.p', 'rb') as f:
+        assert pickle.load(f) == first
+    os.utime(wav + '.p', (1000, 1000))
+
+    assert decode_fn(wav, speech_context=['Tom Hanks'], save=True) == first
+    assert recognizer.calls == 1 and (cache.hits, cache.misses) == (1, 1)
+    assert os.stat(wav + '.p').st_mtime == 1000
+
+    # a lost or different pickle is written again
+    with open(wav + '.p', 'wb') as f:
+        pickle.dump({'words': []}, f)
+    decode_fn(wav, speech_context=['Tom Hanks'], save=True)
+    with open(wav + '.p', 'rb') as f:
+        assert pickle.load(f) == first
+    os.remove(wav + '.p')
+    decode_fn(wav, speech_context=['Tom Hanks'], save=True)
+    assert os.path.isfile(wav + '.p') and recognizer.calls == 1
+
+
+def test_given_hash_is_not_recomputed(tmp_path, monkeypatch):
+    wav = str(tmp_path / 'subj-0.wav')
+    write_wav(wav)
+    sha = wav_sha(wav)
+    cache = TranscriptionCache(str(tmp_path / 'cache'))
+    assert cache.key(wav, ['acorn'], sha=sha) == cache.key(wav, ['acorn'])
+
+    def no_hash(wav_file, block_size=None):
+        raise AssertionError('wav hashed again')
+    monkeypatch.setattr(transcription_cache, 'wav_sha', no_hash)
+    recognizer = CountingDecoder()
+    decode_fn = cached_decoder(recognizer, cache)
+    decode_fn(wav, speech_context=['acorn'], sha=sha)
+    decode_fn(wav, speech_context=['acorn'], sha=sha)
+    assert recognizer.calls == 1 and cache.hits == 1
+
+
+def test_variant_and_refresh(tmp_path):
+    wav = str(tmp_path / 'subj-0.wav')
+    write_wav(wav)
+    recognizer = CountingDecoder()
+    cache = TranscriptionCache(str(tmp_path / 'cache'))
+    cached_decoder(recognizer, cache)(wav)
+    cached_decoder(recognizer, cache, variant='vad')(wav)
+    assert recognizer.calls == 2
+    cached_decoder(recognizer, cache, refresh=True)(wav)
+    cached_decoder(recognizer, None)(wav)
+    assert recognizer.calls == 4
+    assert len([name for name in os.listdir(cache.cache_dir) if name[-2:] == '.p']) == 2
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+trial_schedule: seeded compile, frame-rate recompile, validate and the saved files
+"""
+import json
+import os
+import wave
+
+import pandas as pd
+import pytest
+
+from trial_schedule import (SCHEDULE_VERSION, compile_schedule, flat_items, load_schedule, save_schedule,
+                            schedule_table, sound_duration, validate)
+
+# one practice list of 2 items, then two lists of 3 (light, heavy math)
+PARAMS = {'n_practice_trials': 1, 'n_practice_items': 2, 'n_trials': 2, 'n_trains': 1, 'n_per_train': 3}
+CONDS = [0, 0, 1, 1, 1, 2, 2, 2]
+MATH = pd.DataFrame([[2, 3, 0, 5, 6], [1, 2, 3, 6, 7], [4, 4, 0, 8, 9], [3, 1, 2, 6, 5]],
+                    columns=['n1', 'n2', 'n3', 'a1', 'a2'])
+
+
+def stim_file(conds=CONDS):
+    return pd.DataFrame({'cond': conds, 'cat': [1 + k % 3 for k in range(len(conds))],
+                         'stimImg': ['img/stim' + str(k) + '.jpg' for k in range(len(conds))],
+                         'stimName': ['stim' + str(k) for k in range(len(conds))]})
+
+
+def write_wav(path, seconds, rate=8000, width=2):
+    w = wave.open(path, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(width)
+    w.setframerate(rate)
+    w.writeframes(b'\x00' * width * int(seconds * rate))
+    w.close()
+
+
+def make_files(root, conds=CONDS):
+    os.makedirs(os.path.join(root, 'img'))
+    os.makedirs(os.path.join(root, 'snd'))
+    for k in range(len(conds)):
+        open(os.path.join(root, 'img', 'stim' + str(k) + '.jpg'), 'w').close()
+        write_wav(os.path.join(root, 'snd', 'stim' + str(k) + '.wav'), 1.0)
+
+
+def test_same_seed_same_session():
+    first = compile_schedule(stim_file(), MATH, PARAMS, seed=7)
+    second = compile_schedule(stim_file(), MATH, PARAMS, seed=7)
+    assert json.dumps(first, sort_keys=True) == json.dumps(second, sort_keys=True)
+    other = compile_schedule(stim_file(), MATH, PARAMS, seed=8)
+    assert ([item['isi'] for item in flat_items(first)] != [item['isi'] for item in flat_items(other)] or
+            first['math'] != other['math'])
+    assert compile_schedule(stim_file(), MATH, PARAMS)['seed'] != compile_schedule(stim_file(), MATH, PARAMS)['seed']
+
+
+def test_recompile_at_another_rate_only_changes_frames():
+    at60 = compile_schedule(stim_file(), MATH, PARAMS, frame_rate=60, seed=7)
+    at120 = compile_schedule(stim_file(), MATH, PARAMS, frame_rate=120, seed=7)
+    assert at60['math'] == at120['math']
+    for a, b in zip(flat_items(at60), flat_items(at120)):
+        assert (a['isi'], a['name'], a['math_max']) == (b['isi'], b['name'], b['math_max'])
+        assert b['isi_frames'] == 2 * a['isi_frames'] and b['stim_frames'] == 2 * a['stim_frames']
+    assert at120['frames']['stim'] == 300
+
+
+def test_layout():
+    schedule = compile_schedule(stim_file(), MATH, PARAMS, seed=7)
+    assert [(t['practice'], t['cond'], len(t['items'])) for t in schedule['trials']] == [
+        (True, 0, 2), (False, 1, 3), (False, 2, 3)]
+    assert [item['index'] for item in flat_items(schedule)] == list(range(8))
+    for trial in schedule['trials'][1:]:
+        # isi of a list averages isi_mean
+        assert sum(item['isi'] for item in trial['items']) == 7 * len(trial['items'])
+    practice = schedule['trials'][0]
+    assert practice['ns'] == [] and all(item['ns'] == [] and item['math_max'] == 0 for item in practice['items'])
+    item = schedule['trials'][1]['items'][0]
+    ns = dict(item['ns'])
+    assert ns['imgS'] == item['isi_frames'] and ns['imgE'] == item['isi_frames'] + 149
+    assert ns['imgK'] is None and 'disE' in ns
+
+
+def test_math_deck_in_session_order():
+    schedule = compile_schedule(stim_file(), MATH, PARAMS, seed=7)
+    n_math = sum(item['math_max'] for item in flat_items(schedule))
+    n_math = n_math + sum(trial.get('final_math_max', 0) for trial in schedule['trials'])
+    assert len(schedule['math']) == n_math
+    # every pass over math_dist uses each row once before reshuffling
+    for k in range(0, n_math - 3, 4):
+        assert sorted(tuple(p['nums']) for p in schedule['math'][k:k + 4]) == [(1, 2, 3), (2, 3), (3, 1, 2), (4, 4)]
+    for problem in schedule['math']:
+        assert problem['correct'] == (problem['shown'] == sum(problem['nums']))
+
+
+def test_validate(tmp_path):
+    root = str(tmp_path)
+    make_files(root)
+    schedule = compile_schedule(stim_file(), MATH, PARAMS, seed=7, sound_dir=os.path.join(root, 'snd') + os.sep)
+    assert validate(schedule, check_files=False) == []
+    assert all(item['sound_dur'] == 1.0 for item in flat_items(schedule))
+    assert any('missing image' in p for p in validate(schedule))
+
+    short = compile_schedule(stim_file(CONDS[:6]), MATH, PARAMS, seed=7)
+    assert any('stimuli.csv has 6 rows' in p for p in validate(short, check_files=False))
+    mixed = compile_schedule(stim_file(CONDS[:3] + [2] + CONDS[4:]), MATH, PARAMS, seed=7)
+    assert any('differs from the list cond' in p for p in validate(mixed, check_files=False))
+
+    broken = json.loads(json.dumps(schedule))
+    broken['math'] = broken['math'][:3]
+    broken['trials'][1]['items'][0]['ns'][-1] = ['imgE', 1]
+    broken['trials'][0]['ns'] = ['finS']
+    problems = validate(broken, check_files=False)
+    assert any('math problems, the session can use' in p for p in problems)
+    assert any('NetStation imgE at frame 1' in p for p in problems)
+    assert any('practice items send no NetStation codes' in p for p in problems)
+
+
+def test_sound_duration_from_header(tmp_path):
+    path = str(tmp_path / 'acorn.wav')
+    write_wav(path, 1.5, rate=44100, width=3)  # 24 bit, which the old numpy read couldn't load
+    assert sound_duration(path) == pytest.approx(1.5)
+    assert sound_duration(str(tmp_path / 'missing.wav')) is None
+    (tmp_path / 'bad.wav').write_bytes(b'not a wav')
+    assert sound_duration(str(tmp_path / 'bad.wav')) is None
+
+
+def test_save_and_load(tmp_path):
+    schedule = compile_schedule(stim_file(), MATH, PARAMS, seed=7, subj='s1')
+    json_path, csv_path = save_schedule(schedule, str(tmp_path / 's1_schedule'))
+    assert load_schedule(json_path) == json.loads(json.dumps(schedule))
+    table = pd.read_csv(csv_path)
+    assert len(table) == 8
+    assert list(table.columns) == list(schedule_table(schedule).columns)
+    assert table['ns_codes'][2].startswith('bgin@0 disS@0 disE@')
+    schedule['version'] = SCHEDULE_VERSION - 1
+    with open(json_path, 'w') as f:
+        json.dump(schedule, f)
+    with pytest.raises(ValueError):
+        load_schedule(json_path)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+wav_mmap: RIFF header parsing (plain, WAVE_FORMAT_EXTENSIBLE, odd chunks,
+streaming placeholders) and the memory-mapped views
+"""
+import struct
+
+import numpy as np
+import pytest
+
+from wav_mmap import EXTENSIBLE, IEEE_FLOAT, PCM, WavFile, parse_header
+
+# tail of the KSDATAFORMAT_SUBTYPE guids after the 2 byte format tag
+GUID_TAIL = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+
+def wav_bytes(samples, rate=16000, format_tag=PCM, extensible=False, extra_chunk=None, data_size=None):
+    """
+    a wav file as bytes; samples is a (n_frames, n_channels) array
+    """
+    n_channels = samples.shape[1]
+    width = samples.dtype.itemsize
+    fmt = struct.pack('<HHIIHH', EXTENSIBLE if extensible else format_tag, n_channels, rate,
+                      rate * n_channels * width, n_channels * width, 8 * width)
+    if extensible:
+        fmt = fmt + struct.pack('<HHI', 22, 8 * width, 0) + struct.pack('<H', format_tag) + GUID_TAIL
+    payload = samples.tobytes()
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    if extra_chunk is not None:
+        chunks = chunks + extra_chunk[0] + struct.pack('<I', len(extra_chunk[1])) + extra_chunk[1]
+        if len(extra_chunk[1]) % 2:
+            chunks = chunks + b'\x00'
+    size = len(payload) if data_size is None else data_size
+    chunks = chunks + b'data' + struct.pack('<I', size) + payload
+    return b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks
+
+
+def test_parse_plain_pcm():
+    samples = np.arange(20, dtype=np.int16).reshape(10, 2)
+    header = parse_header(wav_bytes(samples, rate=44100))
+    assert header.sample_rate == 44100
+    assert (header.n_channels, header.sample_width, header.format_tag) == (2, 2, PCM)
+    assert (header.data_offset, header.data_size) == (44, 40)
+
+
+def test_parse_extensible_takes_subformat():
+    samples = np.zeros((8, 1), dtype=np.float32)
+    header = parse_header(wav_bytes(samples, format_tag=IEEE_FLOAT, extensible=True))
+    assert header.format_tag == IEEE_FLOAT
+    assert header.sample_width == 4
+    assert header.data_offset == 12 + 8 + 40 + 8
+    pcm = parse_header(wav_bytes(np.zeros((8, 2), dtype=np.int32), extensible=True))
+    assert (pcm.format_tag, pcm.sample_width, pcm.n_channels) == (PCM, 4, 2)
+
+
+def test_parse_skips_odd_chunks():
+    samples = np.arange(6, dtype=np.int16).reshape(6, 1)
+    blob = wav_bytes(samples, extra_chunk=(b'LIST', b'INFOabc'))
+    header = parse_header(blob)
+    assert header.data_offset == 12 + 24 + 8 + 8 + 8
+    assert blob[header.data_offset:] == samples.tobytes()
+
+
+def test_parse_incomplete_or_streaming():
+    blob = wav_bytes(np.zeros((4, 1), dtype=np.int16))
+    assert parse_header(blob[:30]) is None       # cut inside the fmt chunk
+    assert parse_header(b'RIFX' + blob[4:]) is None
+    assert parse_header(b'') is None
+    # recorders that are still writing leave 0 or 0xFFFFFFFF in the data size
+    for placeholder in (0, 0xFFFFFFFF):
+        assert parse_header(wav_bytes(np.zeros((4, 1), dtype=np.int16), data_size=placeholder)).data_size is None
+
+
+@pytest.mark.parametrize('dtype, format_tag, extensible', [
+    (np.uint8, PCM, False), (np.int16, PCM, False), (np.int32, PCM, True),
+    (np.float32, IEEE_FLOAT, False), (np.float64, IEEE_FLOAT, True)])
+def test_wavfile_views(tmp_path, dtype, format_tag, extensible):
+    samples = (np.arange(2000).reshape(1000, 2) % 100).astype(dtype)
+    path = tmp_path / 'subj-0.wav'
+    path.write_bytes(wav_bytes(samples, rate=1000, format_tag=format_tag, extensible=extensible))
+    wav = WavFile(str(path))
+    assert wav.dtype == np.dtype(dtype)
+    assert (wav.n_frames, wav.n_channels, wav.duration) == (1000, 2, 1.0)
+    assert np.array_equal(wav.frames, samples)
+    assert np.array_equal(wav.channel(1), samples[:, 1])
+    assert np.array_equal(wav.segment(0.25, 0.5), samples[250:500])
+    assert wav.bytes(10, 20) == samples[10:20].tobytes()
+    assert len(wav.frame_slice(990, 2000)) == 10
+
+
+def test_wavfile_without_known_size(tmp_path):
+    samples = np.arange(100, dtype=np.int16).reshape(100, 1)
+    path = tmp_path / 'live.wav'
+    # size placeholder and a half-written last frame: only whole frames on disk count
+    path.write_bytes(wav_bytes(samples, data_size=0xFFFFFFFF) + b'\x01')
+    wav = WavFile(str(path))
+    assert wav.n_frames == 100
+    assert np.array_equal(wav.frames, samples)
+
+
+def test_wavfile_rejects_unsupported(tmp_path):
+    path = tmp_path / 'bad.wav'
+    path.write_bytes(wav_bytes(np.zeros((4, 1), dtype=np.int16), format_tag=IEEE_FLOAT))
+    with pytest.raises(ValueError):
+        WavFile(str(path))
+    path.write_bytes(b'not a wav')
+    with pytest.raises(ValueError):
+        WavFile(str(path))
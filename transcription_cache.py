@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+persistent on-disk cache of recognizer responses
+
+entries are keyed on the sha256 of the wav bytes + speech_context + sample rate
++ language code, so re-running decode on an unchanged recording (e.g. after
+only the scoring logic changed) returns the stored response and never calls
+the recognizer. each entry is one pickle file in cache_dir; the least recently
+used entries are removed once the folder grows past max_bytes
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+CACHE_VERSION = 1
+
+
+def dump_pickle(obj, path):
+    # write to a temp file in the same folder and rename, readers see the old or the new file
+    tmp = path + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident) + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def update_pickle(obj, path):
+    """
+    dump_pickle, but leaves path (and its mtime) alone if it already holds obj;
+    returns True if the file was written
+    """
+    blob = pickle.dumps(obj)
+    try:
+        if os.path.getsize(path) == len(blob):
+            with open(path, 'rb') as f:
+                if f.read() == blob:
+                    return False
+    except (IOError, OSError):
+        pass
+    tmp = path + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident) + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+    os.replace(tmp, path)
+    return True
+
+
+def wav_sha(wav_file, block_size=1 << 20):
+    """
+    sha256 hex digest of the raw bytes of wav_file
+    """
+    h = hashlib.sha256()
+    with open(wav_file, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class TranscriptionCache(object):
+    """
+    Help: cache = TranscriptionCache('data/.transcripts')
+    key = cache.key('subj-0.wav', trial_stim, 44100, 'en-US')
+    (sha=wav_sha('subj-0.wav') if the caller already has it, the wav isn't read again)
+    cache.get(key) returns the stored response or None
+    cache.put(key, response) stores it and evicts old entries
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, wav_file, speech_context=None, sample_rate=44100, language_code='en-US', variant=None,
+            sha=None):
+        if sha is None:
+            sha = wav_sha(wav_file)
+        parts = {'v': CACHE_VERSION,
+                 'wav': sha,
+                 'context': list(speech_context) if speech_context is not None else None,
+                 'rate': sample_rate,
+                 'lang': language_code}
+        if variant is not None:
+            # a different way of decoding the same audio (e.g. vad) gets its own entry
+            parts['variant'] = variant
+        blob = json.dumps(parts, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(blob).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.p')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                response = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self.misses = self.misses + 1
+            return None
+        # touch entry so eviction sees it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits = self.hits + 1
+        return response
+
+    def put(self, key, response):
+        dump_pickle(response, self._path(key))
+        self.evict()
+
+    def size(self):
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if name[-2:] == '.p':
+                total = total + os.path.getsize(os.path.join(self.cache_dir, name))
+        return total
+
+    def evict(self):
+        """
+        removes least recently used entries until the cache fits in max_bytes
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if name[-2:] != '.p':
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total = total + st.st_size
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total = total - size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name[-2:] == '.p':
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def cached_decoder(decoder, cache=None, refresh=False, variant=None):
+    """
+    Help: decode_fn = cached_decoder(quail.decode_speech, TranscriptionCache(cache_dir))
+    wraps a quail.decode_speech-like decoder so it always returns the raw response
+    cache=None  : no caching, every call goes to the recognizer (--no-cache)
+    refresh=True: ignore stored entries but store the new responses (--refresh)
+    save=True writes the response pickle next to the wav (wav + '.p') like quail does,
+    also on a cache hit, so the unpickle stage finds every trial (a wav + '.p' that
+    already holds the response is left as it is)
+    variant     : label of the decoding setup (e.g. 'vad'), part of the cache key
+    decode_fn(wav_file, ..., sha=file_sha(wav_file)) reuses a hash the caller already
+    computed instead of reading the wav again for the cache key
+    """
+    def decode_cached(wav_file, speech_context=None, save=False, sample_rate=44100,
+                      language_code='en-US', sha=None, **kwargs):
+        response = None
+        key = None
+        if cache is not None:
+            key = cache.key(wav_file, speech_context, sample_rate, language_code, variant, sha=sha)
+            if not refresh:
+                response = cache.get(key)
+        if response is None:
+            kwargs['return_raw'] = True
+            response = decoder(wav_file, speech_context=speech_context, save=False,
+                               sample_rate=sample_rate, language_code=language_code, **kwargs)
+            if cache is not None:
+                cache.put(key, response)
+        if save:
+            update_pickle(response, wav_file + '.p')
+        return response
+    return decode_cached
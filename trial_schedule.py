@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+compiled trial schedule of a catFmri_eeg_sound session
+
+everything the presentation loop used to work out between frames (practice
+or not, list length, task condition, isi per item, which math problem comes
+next and which answer is shown, stimulus image/sound, frame counts, the
+NetStation codes of each item) is compiled from the subject's stimuli.csv,
+math_dist.csv and the experiment parameters before the session starts,
+checked, and saved as json (+ a flat csv, one row per item, for diffing):
+
+    schedule = compile_schedule(stim_file, math_csv, params, frame_rate=60, seed=7)
+    problems = validate(schedule)       # [] if fine
+    save_schedule(schedule, 'data/s1/events/s1_schedule')
+
+the loop then walks flat_items(schedule), every item of the session in
+order (its list is schedule['trials'][item['trial']]), takes math problems
+from schedule['math'] one after another over the whole session (one
+counter, like the old math_cnt; every item and final math holds at most
+math_max / final_math_max of them, so the deck is long enough) and sends
+only the NetStation codes the schedule holds, at the frames it holds them:
+item['ns'] is a list of (code, frame from the item start; None = on a key
+press) and trial['ns'] the codes of the list's final math and recall (both
+empty for practice).
+the randomization (isi, math deck order, shown answers) is drawn from the
+seed, so the same seed gives the same session and
+compile_schedule(..., frame_rate=144) only changes frames
+
+batch (thousands of subjects, no window needed):
+python trial_schedule.py ../stimuli/export_stim/*stimuli.csv --math ../stimuli/math_dist.csv --out schedules
+"""
+import json
+import math
+import os
+import random
+
+import pandas as pd
+
+from frame_timing import FrameTiming
+from wav_mmap import parse_header
+
+SCHEDULE_VERSION = 3
+
+DEFAULT_PARAMS = {'n_trials': 9, 'n_trains': 9, 'n_per_train': 3, 'n_practice_trials': 3, 'n_practice_items': 6,
+                  'dur_stim': 2.5, 'dur_FR': 90, 'dur_digit': 0.7, 'dur_blank': 0.2, 'dur_question': 2,
+                  'dur_finalmath': 10, 'isi_low': 5, 'isi_high': 8, 'isi_mean': 7, 'first_item': 0}
+
+INSTRUCTIONS = {0: 'instrText0', 1: 'instrText1', 2: 'instrText2'}
+TRIAL_NS = ['finS', 'finK', 'finE', 'recS', 'recE']
+ITEM_COLUMNS = ['trial', 'item', 'index', 'practice', 'cond', 'cat', 'name', 'image', 'sound', 'sound_dur',
+                'isi', 'isi_frames', 'stim_frames', 'sound_on', 'sound_off', 'math_max', 'ns_codes']
+
+
+def pseudo_randomISI(low, high, k, n_items, rng=random):
+    """
+    Creates n_items number of isi with range low and high with resulted numbers
+    averaging around mean k
+    """
+    assert k < high
+    rand_isi = [low] * n_items
+    to_add = (k - low) * n_items
+    for _ in range(to_add):
+        i = rng.randint(0, n_items-1)
+        while rand_isi[i] == high:
+            i = rng.randint(0, n_items-1)
+        rand_isi[i] += 1
+    return rand_isi
+
+
+def sound_path(sound_dir, image):
+    # get just the stim name and {} ie. acorn{}
+    return sound_dir + os.path.basename(image)[:-4] + '.wav'
+
+
+def sound_duration(path):
+    """
+    seconds of a wav from its header alone (any sample type psychopy plays,
+    e.g. 24 bit; the samples aren't read), None if the header can't be parsed
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = parse_header(f.read(4096))
+        data_size = header.data_size if header is not None else None
+        if header is not None and data_size is None:
+            data_size = os.path.getsize(path) - header.data_offset
+    except (IOError, OSError):
+        return None
+    if header is None or header.n_channels * header.sample_width * header.sample_rate <= 0:
+        return None
+    return data_size / float(header.n_channels * header.sample_width * header.sample_rate)
+
+
+def math_problem(row, rng):
+    """
+    one math_dist row as {'nums': 2 or 3 numbers, 'shown': answer shown with '?', 'correct': shown is the sum}
+    (columns 0-2 numbers, third is 0 for 2-number problems; 3 and 4 the two answers, one picked at random)
+    """
+    values = [int(v) for v in row[:5]]
+    nums = values[:2] if values[2] == 0 else values[:3]
+    shown = values[rng.randint(3, 4)]
+    return {'nums': nums, 'shown': shown, 'correct': shown == sum(nums)}
+
+
+def max_problems(seconds, params):
+    # upper bound of problems that start within seconds (2 digits + blanks each, at the least)
+    return int(math.ceil(seconds / (2 * (params['dur_digit'] + params['dur_blank'])))) + 1
+
+
+def compile_schedule(stim_file, math_csv, params=None, frame_rate=60, seed=None, sound_dir='', subj=None):
+    """
+    Help: schedule = compile_schedule(pd.read_csv('s1stimuli.csv'), pd.read_csv('math_dist.csv'), seed=7)
+    the session as a dict (json serializable); see the module doc
+    """
+    p = dict(DEFAULT_PARAMS)
+    p.update(params or {})
+    if seed is None:
+        seed = random.SystemRandom().randint(0, 2 ** 31 - 1)
+    rng = random.Random(seed)
+    timing = FrameTiming(frame_rate)
+
+    rows = math_csv.values.tolist()
+    deck = []
+    order = []
+
+    def draw_math(n):
+        # n more problems of the shuffled math file, reshuffled every time it is used up (like the old loop)
+        for _ in range(n):
+            if not order:
+                order.extend(range(len(rows)))
+                rng.shuffle(order)
+            deck.append(math_problem(rows[order.pop()], rng))
+        return n
+
+    trials = []
+    i = p['first_item']
+    n_total = p['n_practice_trials'] + p['n_trials']
+    for t in range(n_total):
+        practice = t < p['n_practice_trials']
+        n_items = p['n_practice_items'] if practice else p['n_trains'] * p['n_per_train']
+        isi_list = pseudo_randomISI(p['isi_low'], p['isi_high'], p['isi_mean'], n_items, rng)
+        trial_cond = int(stim_file['cond'][i]) if i < len(stim_file) else None
+        items = []
+        for s in range(n_items):
+            k = i + s
+            if k >= len(stim_file):
+                break
+            cond = int(stim_file['cond'][k])
+            image = stim_file['stimImg'][k]
+            sound = sound_path(sound_dir, image)
+            sound_dur = sound_duration(sound)
+            stim_frames = timing.frames(p['dur_stim'])
+            isi_frames = timing.frames(isi_list[s])
+            if sound_dur is not None:
+                # center align sound (truncated, the frames the loop always used at 60 Hz)
+                sound_on = timing.frames(p['dur_stim'] / 2 - sound_dur / 2, truncate=True)
+                sound_off = timing.frames(p['dur_stim'] / 2 + sound_dur / 2, truncate=True)
+            else:
+                sound_on = sound_off = None
+            n_math = max_problems(isi_list[s], p) if cond != 0 else 0
+            ns = [('bgin', 0), ('disS', 0)] + ([('disE', isi_frames)] if cond != 0 else [])
+            ns = ns + [('imgS', isi_frames)]
+            if sound_on is not None:
+                ns = ns + [('sndS', isi_frames + sound_on), ('sndE', isi_frames + sound_off)]
+            ns = ns + [('imgK', None), ('imgE', isi_frames + stim_frames - 1)]
+            items.append({'trial': t, 'item': s + 1, 'index': k, 'cond': cond, 'cat': int(stim_file['cat'][k]),
+                          'name': stim_file['stimName'][k], 'image': image, 'sound': sound, 'sound_dur': sound_dur,
+                          'isi': isi_list[s], 'isi_frames': isi_frames, 'stim_frames': stim_frames,
+                          'sound_on': sound_on, 'sound_off': sound_off,
+                          'math_max': draw_math(n_math),
+                          'ns': [] if practice else ns})
+        trial = {'t': t, 'practice': practice, 'n_items': n_items, 'cond': trial_cond,
+                 'instruction': INSTRUCTIONS.get(trial_cond), 'items': items,
+                 'ns': [] if practice else list(TRIAL_NS)}
+        if not practice:
+            n_final = max_problems(p['dur_finalmath'], p)
+            trial['final_math_max'] = draw_math(n_final)
+        trials.append(trial)
+        i = i + n_items
+
+    return {'version': SCHEDULE_VERSION, 'subj': subj, 'seed': seed, 'frame_rate': timing.rate,
+            'params': p, 'n_stim': int(len(stim_file)),
+            'frames': {'stim': timing.frames(p['dur_stim']), 'digit': timing.frames(p['dur_digit']),
+                       'question': timing.frames(p['dur_question'])},
+            'trials': trials, 'math': deck}
+
+
+def flat_items(schedule):
+    """
+    every item of the session in presentation order (list after list)
+    """
+    return [item for trial in schedule['trials'] for item in trial['items']]
+
+
+def validate(schedule, check_files=True):
+    """
+    list of problems with a compiled schedule (empty if it can be run)
+    """
+    problems = []
+    p = schedule['params']
+    if not p['isi_low'] <= p['isi_mean'] < p['isi_high']:
+        problems.append('isi_mean must be within [isi_low, isi_high)')
+    n_needed = p['first_item'] + sum(trial['n_items'] for trial in schedule['trials'])
+    if schedule['n_stim'] < n_needed:
+        problems.append('stimuli.csv has ' + str(schedule['n_stim']) + ' rows, the session needs ' + str(n_needed))
+    for trial in schedule['trials']:
+        label = 'trial ' + str(trial['t'])
+        if len(trial['items']) != trial['n_items']:
+            problems.append(label + ': ' + str(len(trial['items'])) + ' of ' + str(trial['n_items']) + ' items')
+        if trial['cond'] not in INSTRUCTIONS:
+            problems.append(label + ': unknown cond ' + str(trial['cond']))
+        for item in trial['items']:
+            where = label + ' item ' + str(item['item'])
+            if item['cond'] != trial['cond']:
+                problems.append(where + ': cond ' + str(item['cond']) + ' differs from the list cond ' + str(trial['cond']))
+            if item['isi_frames'] <= 0 or item['stim_frames'] <= 0:
+                problems.append(where + ': empty isi or stimulus')
+            if item['sound_on'] is not None and item['sound_off'] <= item['sound_on']:
+                problems.append(where + ': empty sound window')
+            ns = dict(item['ns'])
+            expected = {'imgS': item['isi_frames'], 'imgE': item['isi_frames'] + item['stim_frames'] - 1}
+            if item['sound_on'] is not None:
+                expected['sndS'] = item['isi_frames'] + item['sound_on']
+                expected['sndE'] = item['isi_frames'] + item['sound_off']
+            for code in expected:
+                if ns and ns.get(code) != expected[code]:
+                    problems.append(where + ': NetStation ' + code + ' at frame ' + str(ns.get(code)) +
+                                    ', the item has it at ' + str(expected[code]))
+            if trial['practice'] and (ns or trial['ns']):
+                problems.append(where + ': practice items send no NetStation codes')
+            if check_files:
+                if not os.path.isfile(item['image']):
+                    problems.append(where + ': missing image ' + item['image'])
+                if not os.path.isfile(item['sound']):
+                    problems.append(where + ': missing sound ' + item['sound'])
+                elif item['sound_dur'] is None:
+                    problems.append(where + ': no wav header in ' + item['sound'])
+    n_math = sum(item['math_max'] for trial in schedule['trials'] for item in trial['items'])
+    n_math = n_math + sum(trial.get('final_math_max', 0) for trial in schedule['trials'])
+    if len(schedule['math']) < n_math:
+        problems.append(str(len(schedule['math'])) + ' math problems, the session can use ' + str(n_math))
+    for k, problem in enumerate(schedule['math']):
+        if len(problem['nums']) not in (2, 3):
+            problems.append('math problem ' + str(k) + ': ' + str(problem['nums']))
+    return problems
+
+
+def schedule_table(schedule):
+    """
+    one row per item (flat, for diffing and checking many subjects at once)
+    """
+    rows = []
+    for trial in schedule['trials']:
+        for item in trial['items']:
+            row = dict(item)
+            row['practice'] = trial['practice']
+            row['ns_codes'] = ' '.join(code if frame is None else code + '@' + str(frame) for code, frame in item['ns'])
+            rows.append(row)
+    return pd.DataFrame(rows, columns=ITEM_COLUMNS).astype({'sound_on': 'Int64', 'sound_off': 'Int64'})
+
+
+def save_schedule(schedule, stem):
+    """
+    writes stem.json (the schedule) and stem.csv (schedule_table), returns the paths
+    """
+    with open(stem + '.json', 'w') as f:
+        json.dump(schedule, f, indent=1)
+    schedule_table(schedule).to_csv(stem + '.csv', index=False)
+    return [stem + '.json', stem + '.csv']
+
+
+def load_schedule(path):
+    with open(path, 'r') as f:
+        schedule = json.load(f)
+    if schedule.get('version') != SCHEDULE_VERSION:
+        raise ValueError('schedule ' + path + ' has version ' + str(schedule.get('version')) +
+                         ', expected ' + str(SCHEDULE_VERSION))
+    return schedule
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='compile and check catFmri trial schedules')
+    parser.add_argument('stim_files', nargs='+', help='<subj>stimuli.csv files')
+    parser.add_argument('--math', required=True, help='math_dist.csv')
+    parser.add_argument('--sound-dir', default='', help='stimSound folder (with trailing /)')
+    parser.add_argument('--frame-rate', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=None, help='same seed for every subject (default: random)')
+    parser.add_argument('--out', default=None, help='folder for <subj>_schedule.json/.csv (default: only check)')
+    parser.add_argument('--no-files', action='store_true', help="don't check that images/sounds exist")
+    args = parser.parse_args()
+
+    math_csv = pd.read_csv(args.math, sep=None, engine='python')
+    n_bad = 0
+    for fn in args.stim_files:
+        subj = os.path.basename(fn)[:-len('stimuli.csv')] if fn.endswith('stimuli.csv') else os.path.basename(fn)
+        schedule = compile_schedule(pd.read_csv(fn, sep=None, engine='python'), math_csv, frame_rate=args.frame_rate,
+                                    seed=args.seed, sound_dir=args.sound_dir, subj=subj)
+        problems = validate(schedule, check_files=not args.no_files)
+        for problem in problems:
+            print(subj + ': ' + problem)
+        n_bad = n_bad + (1 if problems else 0)
+        if args.out is not None:
+            if not os.path.isdir(args.out):
+                os.makedirs(args.out)
+            save_schedule(schedule, os.path.join(args.out, subj + '_schedule'))
+    print(str(len(args.stim_files)) + ' schedule(s), ' + str(n_bad) + ' with problems')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+memory-mapped access to the recall wavs in record/
+
+the RIFF header is parsed once and the PCM payload is opened as a read-only
+numpy.memmap of shape (n_frames, n_channels). channel and segment accessors
+return views into that map, so the decode, vad and streaming stages (and
+worker processes) read the same page-cached file instead of each loading
+its own copy of the samples
+
+supports integer PCM (8/16/32 bit) and 32/64 bit float wavs
+"""
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+WavHeader = namedtuple('WavHeader', ['sample_rate', 'n_channels', 'sample_width', 'format_tag',
+                                     'data_offset', 'data_size'])
+
+PCM = 1
+IEEE_FLOAT = 3
+EXTENSIBLE = 0xFFFE
+SAMPLE_TYPES = {(PCM, 1): np.uint8, (PCM, 2): np.int16, (PCM, 4): np.int32,
+                (IEEE_FLOAT, 4): np.float32, (IEEE_FLOAT, 8): np.float64}
+
+
+def parse_header(head):
+    """
+    WavHeader from the first bytes of a wav file (4 kB is plenty), or None if
+    head doesn't hold a complete header yet (e.g. a file still being written)
+    data_size is None when the header doesn't know it (placeholder 0 / 0xFFFFFFFF)
+    """
+    if len(head) < 12 or head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+        return None
+    pos = 12
+    fmt = None
+    while pos + 8 <= len(head):
+        chunk_id = head[pos:pos + 4]
+        size = struct.unpack('<I', head[pos + 4:pos + 8])[0]
+        if chunk_id == b'fmt ' and pos + 24 <= len(head):
+            format_tag, n_channels, sample_rate = struct.unpack('<HHI', head[pos + 8:pos + 16])
+            bits = struct.unpack('<H', head[pos + 22:pos + 24])[0]
+            if format_tag == EXTENSIBLE and pos + 34 <= len(head):
+                # real format is the first two bytes of the sub-format guid
+                format_tag = struct.unpack('<H', head[pos + 32:pos + 34])[0]
+            fmt = (sample_rate, n_channels, bits // 8, format_tag)
+        if chunk_id == b'data':
+            if fmt is None:
+                return None
+            data_size = size if size not in (0, 0xFFFFFFFF) else None
+            return WavHeader(*(fmt + (pos + 8, data_size)))
+        pos = pos + 8 + size + (size % 2)
+    return None
+
+
+class WavFile(object):
+    """
+    Help: wav = WavFile('record/subj-0.wav')
+    wav.sample_rate, wav.n_channels, wav.sample_width, wav.n_frames, wav.duration
+    wav.frames                : (n_frames, n_channels) read-only memmap of the samples
+    wav.channel(0)            : view of one channel
+    wav.segment(1.5, 3.0)     : view of the frames between two times (seconds)
+    wav.frame_slice(a, b)     : view of frames a..b
+    wav.bytes(a, b)           : raw PCM bytes of frames a..b (for recognizers)
+    """
+
+    def __init__(self, wav_file):
+        self.path = wav_file
+        with open(wav_file, 'rb') as f:
+            header = parse_header(f.read(4096))
+        if header is None:
+            raise ValueError('not a (complete) wav file: ' + wav_file)
+        dtype = SAMPLE_TYPES.get((header.format_tag, header.sample_width))
+        if dtype is None:
+            raise ValueError('unsupported wav format (tag ' + str(header.format_tag) + ', ' +
+                             str(8 * header.sample_width) + ' bit): ' + wav_file)
+        self.header = header
+        self.sample_rate = header.sample_rate
+        self.n_channels = header.n_channels
+        self.sample_width = header.sample_width
+        self.dtype = np.dtype(dtype)
+
+        frame_bytes = self.n_channels * self.sample_width
+        available = os.path.getsize(wav_file) - header.data_offset
+        data_size = available if header.data_size is None else min(header.data_size, available)
+        self.n_frames = max(0, data_size) // frame_bytes
+        if self.n_frames:
+            self.frames = np.memmap(wav_file, dtype=self.dtype, mode='r', offset=header.data_offset,
+                                    shape=(self.n_frames, self.n_channels))
+        else:
+            self.frames = np.zeros((0, self.n_channels), dtype=self.dtype)
+
+    @property
+    def duration(self):
+        return self.n_frames / float(self.sample_rate)
+
+    def channel(self, k):
+        return self.frames[:, k]
+
+    def frame_slice(self, start, end):
+        return self.frames[max(0, int(start)):min(self.n_frames, int(end))]
+
+    def segment(self, start_sec, end_sec):
+        return self.frame_slice(int(round(start_sec * self.sample_rate)),
+                                int(round(end_sec * self.sample_rate)))
+
+    def bytes(self, start=0, end=None):
+        if end is None:
+            end = self.n_frames
+        return np.ascontiguousarray(self.frame_slice(start, end)).tobytes()
+
@@ -4,64 +4,77 @@
 speech decoding for all wav files in a given subject folder
 """
 import os
-import sys
-import quail
+from transcription_cache import TranscriptionCache, cached_decoder
+from recall_decoders import BACKENDS, get_decoder
+from stim_table import get_pool
 
-if sys.version_info[0] < 3:
-    ls = os.listdir('.')
-else:
-    ls = os.listdir()
-print('Subject data file in pwd: \n ' + str(ls))
-print("TYPE: decode_all_wav('subj name in strings')")
+# nothing is read at import: the stim pool is loaded on first use (get_pool,
+# memoized per stimuli folder) and the working directory is never changed
+DEFAULT_STIM_DIR = '../stimuli'
 
-dataDir = os.getcwd()
-stimDir = os.path.join(dataDir, '../stimuli')
-os.chdir(stimDir)
 
-with open('cel_names.txt', 'r') as f:
-    cel_list = f.read().splitlines()
-with open('loc_names.txt', 'r') as f:
-    loc_list = f.read().splitlines()
-with open('obj_names.txt', 'r') as f:
-    obj_list = f.read().splitlines()
+def __getattr__(name):
+    # old module level names (cel_list, total_list, ...) for interactive use,
+    # resolved lazily from ../stimuli relative to the current folder
+    if name in ('cel_list', 'loc_list', 'obj_list', 'total_list'):
+        return getattr(get_pool(os.path.join(os.getcwd(), DEFAULT_STIM_DIR)), name)
+    raise AttributeError(name)
 
-total_list = cel_list + loc_list + obj_list
 
-os.chdir(dataDir)
-
-def decode_all_wav(subj):
+def decode_all_wav(subj, cache=True, refresh=False, cache_dir=None, data_dir=None, stim_dir=None,
+                   backend='quail', model_path=None, fixture_dir=None):
     """
     Help: type decode_all_wav('subj name in strings')
     decode_all_wav.py needs to be inside data folder
+    (or pass data_dir='path/to/data', stim_dir defaults to data_dir/../stimuli)
     Code is based on quail's decode_speech.py
     You need Google Cloud account setup with key.json file + quail setup on your computer to run this
+    recognizer responses are cached in data/.transcripts (or cache_dir):
+    cache=False skips the cache, refresh=True re-decodes and overwrites the cache
+    backend: 'quail', 'google-stream', 'vosk' (offline, model_path) or 'fixture' (see recall_decoders)
     """
     subj = subj.lower()
-    pwdDir = os.getcwd()
-    filename = os.path.join(pwdDir, '' + str(subj))
-    if not os.path.isdir(filename):
+    if data_dir is None:
+        data_dir = os.getcwd()
+    dataDir = os.path.abspath(data_dir)
+    if stim_dir is None:
+        stim_dir = os.path.join(dataDir, DEFAULT_STIM_DIR)
+    total_list = get_pool(stim_dir).total_list
+    if cache_dir is None:
+        cache_dir = os.path.join(dataDir, '.transcripts')
+    transcript_cache = TranscriptionCache(cache_dir) if cache else None
+    keypath = '/Users/Jin/documents/matlab/research/recall-0fa1a5e0555b.json'
+    base_decoder = get_decoder(backend, keypath=keypath, model_path=model_path, fixture_dir=fixture_dir)
+    variant = {'quail': None, 'google-stream': 'stream'}.get(backend, backend)
+    decoder = cached_decoder(base_decoder, transcript_cache, refresh=refresh, variant=variant)
+    subjDir = os.path.join(dataDir, str(subj))
+    if not os.path.isdir(subjDir):
         print('No such subject name/data file')
-    os.chdir(filename)
-    pwdDir = os.getcwd()
-    filename = os.path.join(pwdDir + '/record')
-    os.chdir(filename)
-
-    # check if python 2 or 3
-    if sys.version_info[0] < 3:
-        ls = os.listdir('.')
-    else:
-        ls = os.listdir()
+        raise IOError('No such subject name/data file: ' + subjDir)
+    recordDir = os.path.join(subjDir, 'record')
 
+    ls = sorted(os.listdir(recordDir))
     for i in range(0,len(ls)):
         #double check if wav file
         if ls[i][-3:] == 'wav':
-            recall_data = quail.decode_speech(ls[i], save=True,speech_context=total_list,keypath='/Users/Jin/documents/matlab/research/recall-0fa1a5e0555b.json')
+            recall_data = decoder(os.path.join(recordDir, ls[i]), save=True,speech_context=total_list,keypath=keypath)
             print(recall_data)
             print('end of wav file ' + str(i+1))
-    filename = os.path.join(pwdDir + '/..')
-    os.chdir(filename)
 
 
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='decode all recall wav files of a subject to pickles')
+    parser.add_argument('subj')
+    parser.add_argument('--no-cache', action='store_true', help='always call the recognizer')
+    parser.add_argument('--refresh', action='store_true', help='re-decode and overwrite cached responses')
+    parser.add_argument('--backend', default='quail', choices=BACKENDS)
+    parser.add_argument('--model', default=None, help='vosk model folder (--backend vosk)')
+    parser.add_argument('--fixtures', default=None, help='fixture folder (--backend fixture)')
+    args = parser.parse_args()
+    decode_all_wav(args.subj, cache=not args.no_cache, refresh=args.refresh, backend=args.backend,
+                   model_path=args.model, fixture_dir=args.fixtures)
+
 
 """
 https://github.com/ContextLab/quail/blob/master/quail/decode_speech.py